@@ -45,8 +45,12 @@ class QueryResponse:
     provider: ProviderType
     model: str
     tokens_used: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
     cost: Optional[float] = None
     response_time: Optional[float] = None
+    time_to_first_token: Optional[float] = None
     success: bool = True
     error: Optional[str] = None
 
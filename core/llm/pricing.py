@@ -0,0 +1,56 @@
+"""
+Pricing - Approximate per-token prices used to estimate the cost of a call
+
+Prices are USD per million tokens (input, output) from the providers' public
+price lists; OpenRouter ids match on the underlying model name. Unknown models
+yield None rather than a guess.
+"""
+
+from typing import Optional
+
+# (model id fragment, input, output) - first match wins, so specific ids go first
+PRICES = (
+    ("gpt-4o-mini", 0.15, 0.60),
+    ("gpt-4o", 2.50, 10.00),
+    ("gpt-4.1-mini", 0.40, 1.60),
+    ("gpt-4.1", 2.00, 8.00),
+    ("gpt-4-turbo", 10.00, 30.00),
+    ("gpt-3.5-turbo", 0.50, 1.50),
+    ("claude-3-5-haiku", 0.80, 4.00),
+    ("claude-3-haiku", 0.25, 1.25),
+    ("claude-3-opus", 15.00, 75.00),
+    ("claude-3-5-sonnet", 3.00, 15.00),
+    ("claude-3-7-sonnet", 3.00, 15.00),
+    ("gemini-2.5-flash", 0.30, 2.50),
+    ("gemini-2.5-pro", 1.25, 10.00),
+    ("gemini-pro", 1.25, 10.00),
+)
+
+# Share of the input price charged for prompt-cache reads
+CACHED_INPUT_RATE = {
+    "anthropic": 0.10,
+    "openai": 0.50,
+    "openrouter": 0.50,
+    "google": 0.25,
+}
+
+# Local inference costs nothing per token
+FREE_PROVIDERS = {"ollama"}
+
+
+def estimate_cost(provider: str, model: str, prompt_tokens: int, completion_tokens: int,
+                  cached_tokens: int = 0) -> Optional[float]:
+    """Cost of one call in USD, None when the model's price is unknown"""
+    if provider in FREE_PROVIDERS:
+        return 0.0
+    model_id = (model or "").lower()
+    for fragment, input_price, output_price in PRICES:
+        if fragment in model_id:
+            cached = min(cached_tokens or 0, prompt_tokens)
+            cached_rate = CACHED_INPUT_RATE.get(provider, 1.0)
+            return (
+                (prompt_tokens - cached) * input_price
+                + cached * input_price * cached_rate
+                + completion_tokens * output_price
+            ) / 1_000_000
+    return None
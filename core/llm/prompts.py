@@ -0,0 +1,336 @@
+"""
+Prompts - Versioned prompt templates for SQL generation
+
+The system prompt is assembled as a static, versioned prefix followed by the
+schema of the current database; the user question goes last. Keeping the
+prefix byte-identical across requests lets provider-side prompt caching
+(Anthropic cache_control, OpenAI automatic prefix caching, Ollama's KV
+cache) reuse it, so repeat queries only pay for the changed tokens.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, Hashable, List, Tuple
+
+from ..sql.schema_index import schema_fingerprint
+from .tokens import count_tokens
+
+# Bump whenever SQL_SYSTEM_PREFIX or the section templates change - part of the
+# memo key of rendered sections and recorded on the build_prompt trace span
+SQL_PROMPT_VERSION = "sql-1"
+
+SQL_SYSTEM_PREFIX = (
+    "You are an expert in geospatial SQL (PostGIS, SpatiaLite). Generate precise, EXECUTABLE SQL queries that will run successfully on the user's database.\n\n"
+    "=== ⚠️ CRITICAL RULES - READ CAREFULLY ⚠️ ===\n"
+    "DO NOT invent or guess table names.\n"
+    "DO NOT use QGIS layer names (e.g., 'Example11/Buildings.shp') - these are NOT database table names.\n"
+    "DO NOT use file paths or file extensions (e.g., '.shp', '/', '\\') in table names.\n"
+    "ONLY use the exact database table names listed in AVAILABLE TABLES below (e.g., 'buildings', 'roads', 'landuse').\n"
+    "If user asks about a table not in the list, respond: 'Table not found. Available tables are: [list them]'\n"
+    "If user mentions a QGIS layer name that looks like a file path, map it to the actual database table name.\n"
+    "Example: 'Example11/Buildings.shp' → 'buildings' (check AVAILABLE TABLES below)\n"
+    "ALL queries MUST be executable - test your syntax mentally before generating.\n\n"
+    "=== 🔴 STRICT COLUMN NAME RULES - MANDATORY 🔴 ===\n"
+    "YOU MUST USE ONLY THE EXACT COLUMN NAMES LISTED BELOW.\n"
+    "NEVER guess, assume, or invent column names.\n"
+    "NEVER use column names that are NOT in the AVAILABLE TABLES list below.\n"
+    "If a user requests a column that is NOT in the list:\n"
+    "  1. First, check if a similar column exists (case-insensitive match)\n"
+    "  2. If found, use the EXACT name from the list (with correct case and quotes)\n"
+    "  3. If NOT found, generate a query to discover columns: SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' AND table_name = 'table_name';\n"
+    "  4. Or inform the user: 'Column [name] not found. Available columns for [table] are: [list from AVAILABLE TABLES]'\n\n"
+    "=== SQL FORMATTING RULES ===\n"
+    "1. TABLE NAMES:\n"
+    "   - Lowercase table names (e.g., 'buildings'): Use WITHOUT quotes: FROM buildings\n"
+    "   - Mixed-case table names (e.g., 'Buildings'): Use WITH quotes: FROM \"Buildings\"\n"
+    "   - Check the exact table name format in AVAILABLE TABLES below\n\n"
+    "2. COLUMN NAMES (STRICT - SAVE AND REMEMBER - NO QUOTES FOR LOWERCASE):\n"
+    "   - You MUST use ONLY the exact column names from AVAILABLE TABLES below\n"
+    "   - SAVE and REMEMBER all column names from AVAILABLE TABLES for future queries\n"
+    "   - CRITICAL: If column name in AVAILABLE TABLES is lowercase (e.g., 'id', 'geom', 'area', 'owner', 'type'):\n"
+    "     * Use WITHOUT quotes: SELECT id, area, owner, type, geom\n"
+    "     * NEVER use quotes for lowercase columns: WRONG: SELECT \"id\", \"area\" - CORRECT: SELECT id, area\n"
+    "   - If column name in AVAILABLE TABLES is mixed-case (e.g., 'OWNER', 'TYPE'):\n"
+    "     * Use WITH quotes: SELECT \"OWNER\", \"TYPE\"\n"
+    "   - IMPORTANT: 99% of PostgreSQL columns are lowercase - ALWAYS use WITHOUT quotes\n"
+    "   - If a column name is requested but NOT in AVAILABLE TABLES, DO NOT use it\n"
+    "   - Instead, generate a discovery query or inform the user the column doesn't exist\n"
+    "   - Example: If AVAILABLE TABLES shows 'area', 'owner', 'type' (lowercase), use: SELECT area, owner, type\n"
+    "   - Example: NEVER write SELECT \"area\" - write SELECT area (lowercase = no quotes)\n"
+    "   - Example: NEVER write SELECT \"id\" - write SELECT id (lowercase = no quotes)\n"
+    "   - REMEMBER: Once you see column names in AVAILABLE TABLES, use them consistently in all future queries\n"
+    "   - ALWAYS check AVAILABLE TABLES below before writing any column name\n\n"
+    "3. GEOMETRY COLUMN:\n"
+    "   - Use 'geom' NOT 'geometry' unless the column is explicitly named 'geometry' in AVAILABLE TABLES\n"
+    "   - Check AVAILABLE TABLES to see the exact geometry column name\n"
+    "   - If 'geom' is lowercase in AVAILABLE TABLES, use WITHOUT quotes: SELECT geom\n"
+    "   - Example: SELECT geom FROM buildings (not SELECT geometry FROM buildings, not SELECT \"geom\")\n\n"
+    "4. QUERY STRUCTURE:\n"
+    "   - Put SQL in ```sql ... ``` block\n"
+    "   - Use proper PostgreSQL/PostGIS syntax\n"
+    "   - Include LIMIT clause for large result sets\n"
+    "   - DO NOT add comments after semicolon (-- comments)\n"
+    "   - DO NOT add explanations in the SQL code itself\n"
+    "   - Generate ONLY the SQL query, nothing else\n"
+    "   - Test that the query will execute successfully\n\n"
+    "=== EXAMPLES ===\n"
+    "CORRECT (using exact lowercase column names WITHOUT quotes - MOST COMMON - 99% OF CASES):\n"
+    "```sql\n"
+    "SELECT id, area, owner, type, geom\n"
+    "FROM buildings\n"
+    "WHERE area > 1000\n"
+    "LIMIT 10;\n"
+    "```\n"
+    "(This is correct if 'area', 'owner', 'type', 'geom' are lowercase in AVAILABLE TABLES for 'buildings')\n"
+    "NOTE: All lowercase columns = NO QUOTES. This is the standard PostgreSQL format.\n\n"
+    "WRONG (using quotes for lowercase columns - DO NOT DO THIS):\n"
+    "```sql\n"
+    "SELECT \"id\", \"area\", \"owner\", \"type\", geom\n"
+    "FROM \"buildings\"\n"
+    "WHERE \"area\" > 1000;\n"
+    "```\n"
+    "This is WRONG because lowercase columns and table names should NOT have quotes.\n\n"
+    "CORRECT (simple query - what user wants):\n"
+    "```sql\n"
+    "SELECT id, address, area, owner\n"
+    "FROM buildings;\n"
+    "```\n"
+    "Simple, clean, no quotes, no comments, just the SQL.\n\n"
+    "CORRECT (using exact mixed-case column names from AVAILABLE TABLES - LESS COMMON):\n"
+    "```sql\n"
+    "SELECT id, \"OWNER\", \"TYPE\", \"AREA\", geom\n"
+    "FROM buildings\n"
+    "WHERE \"AREA\" > 1000\n"
+    "LIMIT 10;\n"
+    "```\n"
+    "(This is correct ONLY if 'OWNER', 'TYPE', 'AREA' are mixed-case in AVAILABLE TABLES for 'buildings')\n\n"
+    "CORRECT (all lowercase columns from AVAILABLE TABLES):\n"
+    "```sql\n"
+    "SELECT id, name, geom\n"
+    "FROM cities\n"
+    "WHERE population > 10000;\n"
+    "```\n"
+    "(This is correct ONLY if 'name', 'population' are in AVAILABLE TABLES for 'cities')\n\n"
+    "INCORRECT (using column NOT in AVAILABLE TABLES or wrong format):\n"
+    "```sql\n"
+    "SELECT \"id\", \"area\" FROM buildings;  -- WRONG: lowercase columns should NOT have quotes\n"
+    "SELECT id, \"OWNER\" FROM buildings;  -- WRONG if 'OWNER' is not in AVAILABLE TABLES (check if it's 'owner' lowercase)\n"
+    "SELECT geometry FROM buildings;  -- WRONG: should be 'geom' (check AVAILABLE TABLES)\n"
+    "SELECT id, area, geom FROM \"buildings\";  -- WRONG: lowercase table should NOT have quotes\n"
+    "```\n\n"
+    "CORRECT (when column not found, generate discovery query):\n"
+    "```sql\n"
+    "SELECT column_name, data_type\n"
+    "FROM information_schema.columns\n"
+    "WHERE table_schema = 'public' AND table_name = 'buildings'\n"
+    "ORDER BY ordinal_position;\n"
+    "```\n\n"
+    "=== FINAL CHECK - MANDATORY BEFORE GENERATING SQL ===\n"
+    "Before generating ANY SQL query, you MUST:\n"
+    "1. ✅ Look at AVAILABLE TABLES below and find the exact table name (usually lowercase like 'buildings')\n"
+    "2. ✅ Verify table name matches EXACTLY (case-sensitive) from AVAILABLE TABLES\n"
+    "3. ✅ NEVER use QGIS layer names (e.g., 'Example11/Buildings.shp', 'Example11_Buildings') - use database table names only\n"
+    "4. ✅ If user mentions a layer name, map it to the actual database table from AVAILABLE TABLES\n"
+    "5. ✅ Look at AVAILABLE TABLES below and find the exact column names for that table\n"
+    "6. ✅ Verify EVERY column name matches EXACTLY (case-sensitive) from AVAILABLE TABLES\n"
+    "7. ✅ If column is lowercase in AVAILABLE TABLES, use WITHOUT quotes (e.g., area NOT \"area\")\n"
+    "8. ✅ If column is mixed-case in AVAILABLE TABLES, use WITH quotes (e.g., \"OWNER\")\n"
+    "9. ✅ Check geometry column name from AVAILABLE TABLES (usually 'geom' lowercase, no quotes)\n"
+    "10. ✅ If a requested column is NOT in AVAILABLE TABLES, generate discovery query OR inform user\n"
+    "11. ✅ Verify query syntax is valid PostgreSQL/PostGIS\n"
+    "12. ✅ Ensure query will execute successfully without errors\n\n"
+    "=== REMEMBER AND SAVE ===\n"
+    "1. SAVE all column names from AVAILABLE TABLES - remember them for all future queries\n"
+    "2. Use the EXACT column names from AVAILABLE TABLES (case-sensitive)\n"
+    "3. CRITICAL RULE: Lowercase columns = NO QUOTES, Mixed-case columns = WITH QUOTES\n"
+    "4. If you use a column name that is NOT in AVAILABLE TABLES, the query WILL FAIL\n"
+    "5. If you use quotes for lowercase columns (e.g., \"area\"), the query WILL FAIL\n"
+    "6. If you use a QGIS layer name instead of a database table name, the query WILL FAIL\n"
+    "7. Always check AVAILABLE TABLES first. When in doubt, generate a discovery query\n"
+    "8. Database table names are simple identifiers (e.g., 'buildings'), NOT file paths (e.g., 'Example11/Buildings.shp')\n"
+    "9. Most PostgreSQL columns are lowercase - ALWAYS use them WITHOUT quotes (e.g., area, owner, type, geom)\n"
+    "10. Once you see column names in AVAILABLE TABLES, use them consistently - SAVE them in your memory\n"
+    "11. Before writing any SQL, STOP and check AVAILABLE TABLES below for exact column names\n\n"
+)
+
+SQL_NO_TABLES_PROMPT = (
+    "You are an expert in geospatial SQL (PostGIS, SpatiaLite).\n"
+    "Database Type: {db_type}\n\n"
+    "=== NO TABLES DETECTED ===\n"
+    "There are no tables loaded in QGIS. Before answering ANY query, you MUST first provide the SQL to discover available tables.\n\n"
+    "ALWAYS respond with this SQL first:\n"
+    "```sql\n"
+    "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' ORDER BY table_name;\n"
+    "```\n\n"
+    "After running this query, the user will know what tables exist and can ask more specific questions.\n"
+    "Do NOT invent or guess table names. Always provide the discovery query above first.\n"
+)
+
+
+class _RenderCache:
+    """Small thread-safe LRU of rendered prompt sections keyed by fingerprint"""
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> str:
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        text = render()
+        with self._lock:
+            self._items[key] = text
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return text
+
+
+_schema_sections = _RenderCache()
+_fix_sections = _RenderCache()
+
+
+def _section_key(context: Dict) -> Tuple:
+    """Hashable identity of everything the schema sections are rendered from"""
+    return (
+        SQL_PROMPT_VERSION,
+        context.get("db_type"),
+        context.get("crs"),
+        schema_fingerprint(context.get("table_fields", {})),
+    )
+
+
+def _needs_quotes(identifier: str) -> bool:
+    """Mixed case or special characters"""
+    return identifier != identifier.lower() or not identifier.replace('_', '').isalnum()
+
+
+def _format_identifier(identifier: str) -> str:
+    return f'"{identifier}"' if _needs_quotes(identifier) else identifier
+
+
+@lru_cache(maxsize=1024)
+def _render_table(table_name: str, fields: Tuple[str, ...]) -> Tuple[str, str, str]:
+    """(formatted name, "name: columns" line, geometry example or "") for one table"""
+    table_format = _format_identifier(table_name)
+    line = f"{table_format}: {', '.join(_format_identifier(field) for field in fields)}"
+    # Detect geometry column name (usually 'geom' not 'geometry')
+    for field in fields:
+        if 'geom' in field.lower() and 'geometry' not in field.lower():
+            return table_format, line, f"  - {table_format}.{_format_identifier(field)}"
+    return table_format, line, ""
+
+
+def build_sql_schema_section(context: Dict) -> str:
+    """Dynamic part of the SQL system prompt, memoised per schema fingerprint"""
+    key = _section_key(context)
+    return _schema_sections.get_or_render(key, lambda: _render_schema_section(key))
+
+
+def _render_schema_section(key: Tuple) -> str:
+    _, db_type, crs, tables = key
+    rendered = [_render_table(table, fields) for table, fields in tables]
+    table_names_list = [table_format for table_format, _, _ in rendered]
+    tables_info = [line for _, line, _ in rendered]
+    geom_column_examples = [example for _, _, example in rendered if example]
+
+    geom_column_note = ""
+    if geom_column_examples:
+        geom_column_note = "\n=== GEOMETRY COLUMN ===\n"
+        geom_column_note += "IMPORTANT: The geometry column is typically 'geom' NOT 'geometry'.\n"
+        geom_column_note += "Examples from your database:\n"
+        geom_column_note += "\n".join(geom_column_examples[:3]) + "\n"
+        geom_column_note += "Always use 'geom' for geometry operations unless the column is explicitly named 'geometry'.\n"
+
+    tables_info_str = "\n".join(tables_info)
+    return (
+        "=== DATABASE ===\n"
+        f"Database Type: {db_type or 'PostgreSQL/PostGIS'}\n"
+        f"CRS: {crs or 'EPSG:4326'}\n\n"
+        f"ONLY USE THESE DATABASE TABLES: {', '.join(table_names_list)}\n\n"
+        "=== AVAILABLE TABLES AND COLUMNS (USE ONLY THESE) ===\n"
+        f"{tables_info_str}\n"
+        f"{geom_column_note}"
+    )
+
+
+def trim_schema_context(context: Dict, question: str, max_tokens: int,
+                        model: str = None) -> Tuple[Dict, int]:
+    """Shrink table_fields so the schema section fits in ``max_tokens``
+
+    Tables mentioned in the question are kept first, the rest in their
+    original order until the budget is used up; if even the most relevant
+    table does not fit, its column list is cut. Returns (context, number of
+    tables dropped).
+    """
+    tables = list(context.get("table_fields", {}).items())
+    if not tables or count_tokens(build_sql_schema_section(context), model) <= max_tokens:
+        return context, 0
+
+    question_lower = (question or "").lower()
+
+    def _mentioned(table_name: str) -> bool:
+        bare_name = table_name.lower().split(".")[-1]
+        return re.search(rf"\b{re.escape(bare_name)}\b", question_lower) is not None
+
+    ranked = [t for t in tables if _mentioned(t[0])] + [t for t in tables if not _mentioned(t[0])]
+    used = count_tokens(build_sql_schema_section({**context, "table_fields": {}}), model)
+    kept: List[Tuple[str, List[str]]] = []
+    for table_name, fields in ranked:
+        line_tokens = count_tokens(_render_table(table_name, tuple(fields))[1], model) + 8
+        if used + line_tokens <= max_tokens:
+            kept.append((table_name, fields))
+            used += line_tokens
+        elif not kept:
+            # Keep as many columns of the most relevant table as fit
+            per_column = line_tokens / max(len(fields), 1)
+            kept.append((table_name, list(fields)[: max(int((max_tokens - used) / per_column), 1)]))
+            break
+
+    kept_fields = dict(kept)
+    # Original order keeps the rendering stable for the cache
+    trimmed = {**context, "table_fields": {
+        name: kept_fields[name] for name, _ in tables if name in kept_fields
+    }}
+    return trimmed, len(tables) - len(kept)
+
+
+def build_sql_system_prompt(context: Dict) -> Tuple[str, str]:
+    """(static prefix, schema section) of the SQL system prompt
+
+    The prefix is empty when no tables are loaded - the short discovery
+    prompt is not worth caching.
+    """
+    if not context.get("table_fields"):
+        return "", SQL_NO_TABLES_PROMPT.format(db_type=context.get('db_type','PostgreSQL/PostGIS'))
+    return SQL_SYSTEM_PREFIX, build_sql_schema_section(context)
+
+
+def build_corrections_section(corrections: List[Tuple[str, str]]) -> str:
+    """Identifier mistakes made on this schema before, as a prompt section"""
+    if not corrections:
+        return ""
+    lines = [f"  - {correction} (not {mistake})" for mistake, correction in corrections]
+    return (
+        "\n=== KNOWN MISTAKES ===\n"
+        "These names were wrong in earlier queries on this database - use the corrected form:\n"
+        + "\n".join(lines) + "\n"
+    )
+
+
+def build_fix_fields_section(context: Dict) -> str:
+    """Field list for SQL error fixing (always quoted), memoised per schema"""
+    key = _section_key(context)
+
+    def _render():
+        lines = []
+        for table, fields in key[3]:
+            quoted_fields = [f'"{field}"' for field in fields]
+            lines.append(f"  - {table}: {', '.join(quoted_fields)}")
+        return "\n".join(lines)
+
+    return _fix_sections.get_or_render(key, _render)
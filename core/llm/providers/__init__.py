@@ -2,3 +2,23 @@
 LLM Provider implementations
 """
 
+from .base_provider import BaseProvider
+from .ollama_provider import OllamaProvider
+from .openai_provider import OpenAIProvider
+from .openrouter_provider import OpenRouterProvider
+from .anthropic_provider import AnthropicProvider
+from .google_provider import GoogleProvider
+from .huggingface_provider import HuggingFaceProvider
+from .registry import ProviderRegistry, get_registry
+
+__all__ = [
+    "BaseProvider",
+    "OllamaProvider",
+    "OpenAIProvider",
+    "OpenRouterProvider",
+    "AnthropicProvider",
+    "GoogleProvider",
+    "HuggingFaceProvider",
+    "ProviderRegistry",
+    "get_registry",
+]
@@ -0,0 +1,100 @@
+"""
+Anthropic Provider Implementation
+"""
+
+import time
+from typing import List
+from .base_provider import BaseProvider
+
+
+class AnthropicProvider(BaseProvider):
+    """Anthropic messages API provider"""
+    
+    name = "anthropic"
+    default_model = "claude-3-5-sonnet-20241022"
+    default_vision_model = "claude-3-5-sonnet-20241022"
+    default_max_tokens = 4000
+    
+    def _create_client(self):
+        try:
+            import anthropic
+        except ImportError:
+            raise ValueError("Anthropic SDK not installed. Install with: pip install anthropic")
+        connect, read = self.timeout
+        timeout = read
+        try:
+            import httpx
+            timeout = httpx.Timeout(read, connect=connect)
+        except ImportError:
+            pass
+        # Retries are handled by the shared resilience layer
+        return anthropic.Anthropic(api_key=self.api_key, max_retries=0, timeout=timeout)
+    
+    def query(self, prompt: str, system_prompt: str = None, 
+              model: str = None, **kwargs) -> str:
+        """Query messages API
+        
+        A static system prefix and the dynamic system prompt are sent as
+        separate blocks with cache_control breakpoints, so both are read from
+        Anthropic's prompt cache while they stay unchanged. The answer is
+        streamed to measure time to first token.
+        """
+        system_prefix = kwargs.get("system_prefix")
+        if system_prefix:
+            system = [
+                {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+                for text in (system_prefix, system_prompt) if text
+            ]
+        else:
+            system = system_prompt or ""
+        start = time.time()
+        parts = []
+        with self.client.messages.stream(
+            model=model or self.default_model,
+            max_tokens=kwargs.get("max_tokens") or self.default_max_tokens,
+            system=system,
+            messages=[{"role": "user", "content": prompt}],
+        ) as stream:
+            for text in stream.text_stream:
+                if not parts:
+                    self._record_usage(time_to_first_token=time.time() - start)
+                parts.append(text)
+            usage = stream.get_final_message().usage
+        # Cached prefix tokens are reported separately from fresh input
+        cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        self._record_usage(
+            prompt_tokens=usage.input_tokens + cache_read + cache_write,
+            completion_tokens=usage.output_tokens,
+            cached_tokens=cache_read,
+        )
+        return "".join(parts)
+    
+    def vision_query(self, prompt: str, image_data: str, media_type: str,
+                     image_path: str = None, model: str = None) -> str:
+        """Query with a base64 image block"""
+        response = self.client.messages.create(
+            model=model or self.default_vision_model,
+            max_tokens=4000,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image",
+                            "source": {
+                                "type": "base64",
+                                "media_type": media_type,
+                                "data": image_data,
+                            },
+                        },
+                        {"type": "text", "text": prompt},
+                    ],
+                }
+            ],
+        )
+        return response.content[0].text
+    
+    def get_models(self) -> List[str]:
+        """Get common Anthropic models"""
+        return ["claude-3-5-sonnet-20241022", "claude-3-opus-20240229"]
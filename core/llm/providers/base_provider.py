@@ -2,17 +2,44 @@
 Base Provider - Abstract base class for all LLM providers
 """
 
-from abc import ABC, abstractmethod
+import threading
+from abc import abstractmethod
 from typing import Dict, Optional
 from ..interfaces import ILLMProvider
+from ..resilience import get_timeouts
+from ..tokens import DEFAULT_OUTPUT_TOKENS
 
 
 class BaseProvider(ILLMProvider):
     """Base implementation for all providers"""
     
+    name = "base"
+    default_model = None
+    default_vision_model = None
+    # Answer length used when the caller sets no max_tokens
+    default_max_tokens = DEFAULT_OUTPUT_TOKENS
+    
     def __init__(self, api_key: Optional[str] = None, **kwargs):
         self.api_key = api_key
         self.config = kwargs
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.timeout = kwargs.get("timeout") or get_timeouts(self.name)
+        # Token usage of the last call, per thread (calls may run concurrently)
+        self._usage = threading.local()
+    
+    @property
+    def client(self):
+        """SDK client, created (and the SDK imported) on first use"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+    
+    def _create_client(self):
+        """Import the SDK and build a configured client"""
+        return None
     
     @abstractmethod
     def query(self, prompt: str, system_prompt: str = None, 
@@ -20,6 +47,37 @@ class BaseProvider(ILLMProvider):
         """Execute a query"""
         pass
     
+    @staticmethod
+    def _system_text(system_prompt: str = None, system_prefix: str = None) -> str:
+        """Full system prompt: cacheable static prefix first, then the dynamic part"""
+        return "".join(part for part in (system_prefix, system_prompt) if part)
+    
+    def vision_query(self, prompt: str, image_data: str, media_type: str,
+                     image_path: str = None, model: str = None) -> str:
+        """Query with a base64 encoded image"""
+        raise ValueError(
+            f"Image analysis not supported for {self.name}. Use Anthropic, OpenAI, or Google."
+        )
+    
+    def _record_usage(self, **usage):
+        """Store metrics reported by the API for the current call
+        
+        Keys: prompt_tokens, completion_tokens, cached_tokens, time_to_first_token.
+        """
+        current = getattr(self._usage, "value", None) or {}
+        current.update({key: value for key, value in usage.items() if value is not None})
+        self._usage.value = current
+    
+    def pop_usage(self) -> Dict:
+        """Metrics of this thread's last call (empty when nothing was reported)"""
+        value = getattr(self._usage, "value", None) or {}
+        self._usage.value = None
+        return value
+    
+    def friendly_error(self, error: Exception) -> Optional[str]:
+        """User-facing message for a final failure, None to keep the original"""
+        return None
+    
     def is_available(self) -> bool:
         """Check if provider is available"""
         return self.api_key is not None
@@ -28,4 +86,3 @@ class BaseProvider(ILLMProvider):
     def get_models(self) -> list:
         """Get available models"""
         pass
-
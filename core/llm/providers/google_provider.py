@@ -0,0 +1,204 @@
+"""
+Google Gemini Provider Implementation
+"""
+
+from typing import Dict, List, Optional
+from .base_provider import BaseProvider
+from ..resilience import is_throttled, retry_after
+from ....infrastructure.logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+HARM_CATEGORIES = [
+    "HARM_CATEGORY_HATE_SPEECH",
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+    "HARM_CATEGORY_HARASSMENT",
+    "HARM_CATEGORY_DANGEROUS_CONTENT",
+]
+
+
+class GoogleProvider(BaseProvider):
+    """Google Generative AI (Gemini) provider"""
+
+    name = "google"
+    default_model = "models/gemini-pro-latest"
+    default_vision_model = "models/gemini-2.5-flash-image"
+
+    def __init__(self, api_key: str = None, **kwargs):
+        super().__init__(api_key=api_key, **kwargs)
+        self._models: Dict[str, object] = {}
+        self._safety_settings = None
+
+    def _create_client(self):
+        try:
+            import google.generativeai as genai
+        except ImportError:
+            raise ValueError(
+                "Google Generative AI SDK not installed. Install with: pip install google-generativeai"
+            )
+        genai.configure(api_key=self.api_key)
+        return genai
+
+    def _model(self, model: str):
+        """Cached GenerativeModel instance"""
+        if model not in self._models:
+            self._models[model] = self.client.GenerativeModel(model)
+        return self._models[model]
+
+    @property
+    def safety_settings(self) -> List[Dict]:
+        """Most permissive safety settings"""
+        if self._safety_settings is None:
+            try:
+                from google.generativeai.types import HarmCategory, HarmBlockThreshold
+                self._safety_settings = [
+                    {"category": getattr(HarmCategory, c), "threshold": HarmBlockThreshold.BLOCK_NONE}
+                    for c in HARM_CATEGORIES
+                ]
+            except ImportError:
+                # Fallback to string format if enums not available
+                self._safety_settings = [
+                    {"category": c, "threshold": "BLOCK_NONE"} for c in HARM_CATEGORIES
+                ]
+        return self._safety_settings
+
+    @staticmethod
+    def _candidate_text(response):
+        """Partial text from a blocked response, None if unavailable"""
+        if hasattr(response, 'candidates') and response.candidates:
+            candidate = response.candidates[0]
+            if hasattr(candidate, 'content') and candidate.content:
+                try:
+                    return candidate.content.parts[0].text
+                except (AttributeError, IndexError, KeyError):
+                    pass
+        return None
+
+    @staticmethod
+    def _block_reason(response) -> str:
+        safety_feedback = (
+            response.prompt_feedback.safety_ratings if hasattr(response, 'prompt_feedback') else None
+        )
+        block_reason = "Content blocked due to safety policies."
+        if safety_feedback:
+            block_reason += f" Feedback: {safety_feedback}"
+        return block_reason
+
+    def query(self, prompt: str, system_prompt: str = None,
+              model: str = None, **kwargs) -> str:
+        """Query Gemini, falling back from pro to flash on safety blocks
+
+        Quota/transient errors are raised unchanged for the resilience layer.
+        """
+        genai = self.client
+        model = model or self.default_model
+        original_model = model
+        system_prompt = self._system_text(system_prompt, kwargs.get("system_prefix"))
+
+        while True:
+            response = self._model(model).generate_content(
+                [system_prompt, prompt] if system_prompt else [prompt],
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.7, top_p=0.0, top_k=1,
+                    max_output_tokens=kwargs.get("max_tokens") or self.default_max_tokens,
+                ),
+                safety_settings=self.safety_settings,
+                request_options={"timeout": self.timeout[1]},
+            )
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None:
+                self._record_usage(
+                    prompt_tokens=usage.prompt_token_count,
+                    completion_tokens=usage.candidates_token_count,
+                    cached_tokens=getattr(usage, "cached_content_token_count", None),
+                )
+            try:
+                return response.text
+            except ValueError:
+                if not hasattr(response, 'prompt_feedback'):
+                    # Not a safety issue, re-raise
+                    raise
+
+                partial = self._candidate_text(response)
+                if partial is not None:
+                    return partial
+
+                logger.warning(f"⚠️ Gemini API Blocked: {self._block_reason(response)}")
+
+                # Try automatic fallback to a different model
+                if model == "models/gemini-2.5-pro":
+                    logger.info("🔄 Auto-fallback: Trying gemini-2.5-flash instead...")
+                    model = "models/gemini-2.5-flash"
+                    continue
+
+                raise ValueError(self._blocked_message(original_model, model))
+
+    def friendly_error(self, error: Exception) -> Optional[str]:
+        """Explain quota exhaustion once retries are used up"""
+        if not is_throttled(error):
+            return None
+        wait = retry_after(error)
+        wait_text = f"{wait:.0f} seconds" if wait else "a minute"
+        return (
+            f"❌ Google Gemini API quota exceeded.\n\n"
+            f"SOLUTIONS:\n"
+            f"1. Wait {wait_text} and try again\n"
+            f"2. Switch to a different model:\n"
+            f"   - models/gemini-2.5-flash (faster, better free tier)\n"
+            f"   - models/gemini-pro-latest (alternative)\n"
+            f"3. Switch to a different provider (Ollama, OpenAI, etc.)\n"
+            f"4. Upgrade your Google API plan\n\n"
+            f"Free tier limits: https://ai.google.dev/gemini-api/docs/rate-limits"
+        )
+
+    @staticmethod
+    def _blocked_message(original_model: str, model: str) -> str:
+        if original_model != model and "flash" in model:
+            return (
+                "❌ Google Gemini blocked the response (even with flash model).\n\n"
+                "RECOMMENDED SOLUTIONS:\n"
+                "1. ⭐ Use Ollama provider (no restrictions, local)\n"
+                "2. Switch to OpenAI or Anthropic provider\n"
+                "3. Rephrase query with more neutral language\n"
+                "4. Break query into smaller, simpler parts\n\n"
+                "Note: Google has hard-coded safety filters that cannot be disabled,\n"
+                "even with BLOCK_NONE settings. This is a Google API limitation."
+            )
+        return (
+            "❌ Google Gemini blocked the response.\n\n"
+            "QUICK FIX:\n"
+            "1. ⭐ Switch to 'gemini-2.5-flash' model (less strict)\n"
+            "   → Select in model dropdown\n\n"
+            "OTHER OPTIONS:\n"
+            "2. Use Ollama provider (no restrictions)\n"
+            "3. Switch to OpenAI or Anthropic\n"
+            "4. Rephrase query with neutral language\n\n"
+            "Note: Safety settings are already most permissive.\n"
+            "Google has hard-coded filters that cannot be disabled."
+        )
+
+    def vision_query(self, prompt: str, image_data: str, media_type: str,
+                     image_path: str = None, model: str = None) -> str:
+        """Query Gemini with an uploaded image"""
+        genai = self.client
+        response = self._model(model or self.default_vision_model).generate_content(
+            [prompt, genai.upload_file(image_path)],
+            generation_config=genai.types.GenerationConfig(
+                temperature=0.4, top_p=0.0, top_k=1, max_output_tokens=3000
+            ),
+            safety_settings=self.safety_settings,
+            request_options={"timeout": self.timeout[1]},
+        )
+        try:
+            return response.text
+        except ValueError:
+            partial = self._candidate_text(response)
+            if partial is not None:
+                return partial
+            block_reason = self._block_reason(response)
+            logger.warning(f"⚠️ Gemini API Blocked (Vision): {block_reason}")
+            raise ValueError(f"AI response blocked (Vision): {block_reason}")
+
+    def get_models(self) -> List[str]:
+        """Get common Gemini models"""
+        return ["models/gemini-pro-latest", "models/gemini-2.5-pro", "models/gemini-2.5-flash"]
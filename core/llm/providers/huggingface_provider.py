@@ -0,0 +1,50 @@
+"""
+HuggingFace Inference API Provider Implementation
+"""
+
+import requests
+from typing import List
+from .base_provider import BaseProvider
+
+HF_INFERENCE_URL = "https://api-inference.huggingface.co/models"
+
+
+class HuggingFaceProvider(BaseProvider):
+    """HuggingFace Inference API provider"""
+    
+    name = "huggingface"
+    default_model = "HuggingFaceH4/zephyr-7b-beta"
+    default_vision_model = ""
+    
+    def _create_client(self):
+        # A pooled session reuses TLS connections between calls
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {self.api_key}"
+        return session
+    
+    def query(self, prompt: str, system_prompt: str = None, 
+              model: str = None, **kwargs) -> str:
+        """Query Inference API"""
+        system_text = self._system_text(system_prompt, kwargs.get("system_prefix"))
+        full_prompt = f"{system_text}\n\n{prompt}" if system_text else prompt
+        payload = {"inputs": full_prompt}
+        if kwargs.get("max_tokens"):
+            payload["parameters"] = {"max_new_tokens": kwargs["max_tokens"]}
+        response = self.client.post(
+            f"{HF_INFERENCE_URL}/{model or self.default_model}",
+            json=payload,
+            timeout=self.timeout,
+        )
+        if response.status_code != 200:
+            # HTTPError keeps the response (status, Retry-After) for the retry layer
+            raise requests.exceptions.HTTPError(
+                f"Hugging Face error ({response.status_code}): {response.text}", response=response
+            )
+        data = response.json()
+        if isinstance(data, list) and len(data) and "generated_text" in data[0]:
+            return data[0]["generated_text"]
+        return str(data)
+    
+    def get_models(self) -> List[str]:
+        """Get common HuggingFace models"""
+        return ["HuggingFaceH4/zephyr-7b-beta", "mistralai/Mistral-7B-Instruct-v0.2"]
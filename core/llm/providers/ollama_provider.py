@@ -2,44 +2,174 @@
 Ollama Provider Implementation
 """
 
+import os
+import threading
 import requests
-from typing import List
+from typing import Dict, List, Optional
 from .base_provider import BaseProvider
+from ..tokens import count_tokens
+from ....infrastructure.logging.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 class OllamaProvider(BaseProvider):
     """Ollama local LLM provider"""
     
+    name = "ollama"
+    default_model = "phi3"
+    default_vision_model = "phi3"
+    # Tokens kept free for the answer when sizing the context window
+    default_max_tokens = 1024
+    
+    # Context window sizes tried in order; changing num_ctx reloads the model
+    CTX_SIZES = (2048, 4096, 8192, 16384, 32768)
+    
     def __init__(self, base_url: str = "http://localhost:11434", **kwargs):
         super().__init__(**kwargs)
-        self.base_url = base_url
-        self.default_model = kwargs.get("default_model", "phi3")
+        self.base_url = (base_url or "http://localhost:11434").rstrip("/")
+        self.default_model = kwargs.get("default_model", self.default_model)
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        try:
+            self.max_ctx = int(os.getenv("OLLAMA_MAX_CTX", "8192"))
+        except ValueError:
+            self.max_ctx = 8192
+        self._ctx_sizes: Dict[str, int] = {}
+        self._ctx_lock = threading.Lock()
+        # Last load/generation timings per model, in seconds
+        self.last_timings: Dict[str, Dict[str, float]] = {}
+    
+    def _create_client(self):
+        # Keep-alive session: no new TCP connection per request
+        return requests.Session()
+    
+    def num_ctx_for(self, model: str, prompt_tokens: int, max_tokens: int = None) -> int:
+        """Smallest context size that fits the prompt plus the answer
+        
+        Never shrinks below the size the model is already loaded with, so a
+        short prompt after a long one does not trigger a reload.
+        """
+        needed = prompt_tokens + (max_tokens or self.default_max_tokens)
+        limit = max(self.max_ctx, self.CTX_SIZES[0])
+        size = next((s for s in self.CTX_SIZES if s >= needed and s <= limit), limit)
+        with self._ctx_lock:
+            size = max(size, self._ctx_sizes.get(model, 0))
+            self._ctx_sizes[model] = size
+        return size
+    
+    def _record_timings(self, model: str, data: Dict) -> Dict[str, float]:
+        """Split Ollama's nanosecond durations into load / prompt / generation"""
+        timings = {
+            "load": data.get("load_duration", 0) / 1e9,
+            "prompt_eval": data.get("prompt_eval_duration", 0) / 1e9,
+            "eval": data.get("eval_duration", 0) / 1e9,
+            "total": data.get("total_duration", 0) / 1e9,
+            "prompt_tokens": data.get("prompt_eval_count", 0),
+            "completion_tokens": data.get("eval_count", 0),
+        }
+        self.last_timings[model] = timings
+        rate = timings["completion_tokens"] / timings["eval"] if timings["eval"] else 0
+        logger.info(
+            f"Ollama {model}: load {timings['load']:.2f}s, "
+            f"prompt eval {timings['prompt_eval']:.2f}s, generation {timings['eval']:.2f}s "
+            f"({timings['completion_tokens']} tokens, {rate:.1f} tok/s)"
+        )
+        return timings
+    
+    def warm_up(self, model: str = None) -> Dict[str, float]:
+        """Load the model into memory and keep it there for the session
+        
+        A generate request without a prompt only loads the model. It is loaded
+        with the largest context (OLLAMA_MAX_CTX): the SQL prompt alone needs
+        more than the smallest size, and a later, larger num_ctx would reload
+        the model and waste the warm-up.
+        """
+        model = model or self.default_model
+        payload = {
+            "model": model,
+            "keep_alive": self.keep_alive,
+            "options": {"num_ctx": self.num_ctx_for(model, self.max_ctx)},
+        }
+        response = self.client.post(f"{self.base_url}/api/generate", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return self._record_timings(model, response.json())
     
     def query(self, prompt: str, system_prompt: str = None, 
-              model: str = None, **kwargs) -> str:
-        """Query Ollama API"""
+              model: str = None, images: Optional[List[str]] = None, **kwargs) -> str:
+        """Query Ollama API
+        
+        The system prompt (static prefix first) is sent as ``system`` so the
+        rendered template starts with the same tokens on every call and
+        Ollama can reuse the KV cache of the loaded model for that prefix.
+        """
         if model is None:
             model = self.default_model
+        system_prompt = self._system_text(system_prompt, kwargs.get("system_prefix"))
         
         url = f"{self.base_url}/api/generate"
         payload = {
             "model": model,
             "prompt": prompt,
-            "stream": False
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "num_ctx": self.num_ctx_for(
+                    model, count_tokens(prompt) + count_tokens(system_prompt), kwargs.get("max_tokens")
+                )
+            },
         }
+        if kwargs.get("max_tokens"):
+            payload["options"]["num_predict"] = kwargs["max_tokens"]
         if system_prompt:
             payload["system"] = system_prompt
+        if images:
+            payload["images"] = images
+        
+        logger.info(f"Calling Ollama API: {url} | Model: {model} | Prompt length: {len(prompt)} chars")
+        
+        # Keep the requests exception types so the resilience layer can classify them
+        try:
+            response = self.client.post(url, json=payload, timeout=self.timeout)
+        except requests.exceptions.Timeout as e:
+            raise type(e)(
+                f"Ollama request timed out after {self.timeout[1]:.0f} seconds. "
+                f"Model {model} may be too slow or not responding."
+            )
+        except requests.exceptions.ConnectionError as e:
+            raise type(e)(
+                f"Could not connect to Ollama at {self.base_url}. Make sure Ollama is running."
+            )
         
-        response = requests.post(url, json=payload, timeout=120)
         if response.status_code != 200:
-            raise Exception(f"Ollama error: {response.text}")
+            raise requests.exceptions.HTTPError(
+                f"Ollama error (status {response.status_code}): {response.text[:500]}",
+                response=response,
+            )
         
-        return response.json().get("response", "").strip()
+        data = response.json()
+        timings = self._record_timings(model, data)
+        self._record_usage(
+            prompt_tokens=timings["prompt_tokens"],
+            completion_tokens=timings["completion_tokens"],
+            # Server-side: model load plus prompt evaluation precede the first token
+            time_to_first_token=timings["load"] + timings["prompt_eval"],
+        )
+        result = data.get("response", "").strip()
+        if result:
+            logger.info(f"Ollama response received: {len(result)} characters")
+        else:
+            logger.warning("Ollama returned empty response")
+        return result
+    
+    def vision_query(self, prompt: str, image_data: str, media_type: str,
+                     image_path: str = None, model: str = None) -> str:
+        """Query a multimodal Ollama model (llava...)"""
+        return self.query(prompt, model=model or self.default_vision_model, images=[image_data])
     
     def is_available(self) -> bool:
         """Check if Ollama is running"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self.client.get(f"{self.base_url}/api/tags", timeout=(self.timeout[0], 5))
             return response.status_code == 200
         except Exception:
             return False
@@ -47,11 +177,10 @@ class OllamaProvider(BaseProvider):
     def get_models(self) -> List[str]:
         """Get available Ollama models"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self.client.get(f"{self.base_url}/api/tags", timeout=(self.timeout[0], 5))
             if response.status_code == 200:
                 models = response.json().get("models", [])
                 return [m.get("name", "") for m in models if m.get("name")]
         except Exception:
             pass
         return ["phi3", "mistral", "llama2", "llama3"]
-
@@ -0,0 +1,102 @@
+"""
+OpenAI Provider Implementation
+"""
+
+import time
+from typing import List
+from .base_provider import BaseProvider
+
+
+class OpenAIProvider(BaseProvider):
+    """OpenAI chat completions provider"""
+    
+    name = "openai"
+    default_model = "gpt-4o-mini"
+    default_vision_model = "gpt-4o"
+    
+    def __init__(self, api_key: str = None, base_url: str = None, **kwargs):
+        super().__init__(api_key=api_key, **kwargs)
+        self.base_url = base_url
+    
+    def _client_kwargs(self) -> dict:
+        connect, read = self.timeout
+        # Retries are handled by the shared resilience layer
+        kwargs = {"api_key": self.api_key, "max_retries": 0, "timeout": read}
+        try:
+            import httpx
+            kwargs["timeout"] = httpx.Timeout(read, connect=connect)
+        except ImportError:
+            pass
+        if self.base_url:
+            kwargs["base_url"] = self.base_url
+        return kwargs
+    
+    def _create_client(self):
+        try:
+            import openai
+        except ImportError:
+            raise ValueError("OpenAI SDK not installed. Install with: pip install openai")
+        return openai.OpenAI(**self._client_kwargs())
+    
+    def query(self, prompt: str, system_prompt: str = None, 
+              model: str = None, **kwargs) -> str:
+        """Query chat completions API
+        
+        The static prefix leads the system message so OpenAI's automatic
+        prefix caching can reuse it across requests. The answer is streamed
+        to measure time to first token; usage arrives in the last chunk.
+        """
+        messages = []
+        system_text = self._system_text(system_prompt, kwargs.get("system_prefix"))
+        if system_text:
+            messages.append({"role": "system", "content": system_text})
+        messages.append({"role": "user", "content": prompt})
+        
+        extra = {"max_tokens": kwargs["max_tokens"]} if kwargs.get("max_tokens") else {}
+        start = time.time()
+        stream = self.client.chat.completions.create(
+            model=model or self.default_model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **extra,
+        )
+        parts = []
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if not parts:
+                    self._record_usage(time_to_first_token=time.time() - start)
+                parts.append(chunk.choices[0].delta.content)
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                details = getattr(usage, "prompt_tokens_details", None)
+                self._record_usage(
+                    prompt_tokens=usage.prompt_tokens,
+                    completion_tokens=usage.completion_tokens,
+                    cached_tokens=getattr(details, "cached_tokens", None),
+                )
+        return "".join(parts)
+    
+    def vision_query(self, prompt: str, image_data: str, media_type: str,
+                     image_path: str = None, model: str = None) -> str:
+        """Query with an inline base64 image"""
+        response = self.client.chat.completions.create(
+            model=model or self.default_vision_model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
+                        {
+                            "type": "image_url",
+                            "image_url": {"url": f"data:{media_type};base64,{image_data}"},
+                        },
+                    ],
+                }
+            ],
+        )
+        return response.choices[0].message.content
+    
+    def get_models(self) -> List[str]:
+        """Get common OpenAI models"""
+        return ["gpt-4o-mini", "gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo"]
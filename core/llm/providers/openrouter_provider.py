@@ -0,0 +1,32 @@
+"""
+OpenRouter Provider Implementation (OpenAI-compatible API)
+"""
+
+import os
+from typing import List
+from .openai_provider import OpenAIProvider
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+
+class OpenRouterProvider(OpenAIProvider):
+    """OpenRouter provider"""
+    
+    name = "openrouter"
+    default_model = "mistralai/mistral-7b-instruct"
+    default_vision_model = "openai/gpt-4o"
+    
+    def __init__(self, api_key: str = None, base_url: str = None, **kwargs):
+        super().__init__(api_key=api_key, base_url=base_url or OPENROUTER_BASE_URL, **kwargs)
+    
+    def _client_kwargs(self) -> dict:
+        kwargs = super()._client_kwargs()
+        kwargs["default_headers"] = {
+            "HTTP-Referer": os.getenv("OPENROUTER_SITE_URL", "https://qgis.local"),
+            "X-Title": os.getenv("OPENROUTER_APP_NAME", "GeoAI Assistant"),
+        }
+        return kwargs
+    
+    def get_models(self) -> List[str]:
+        """Get common OpenRouter models"""
+        return ["mistralai/mistral-7b-instruct", "openai/gpt-4o-mini"]
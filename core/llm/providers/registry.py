@@ -0,0 +1,108 @@
+"""
+Provider Registry - Lazily created, cached provider instances
+
+SDKs are only imported when a provider is first used, and configured
+clients are reused per (provider, api_key, base_url) instead of being
+rebuilt on every call.
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple, Type
+
+from ..interfaces import ILLMProviderFactory
+from .base_provider import BaseProvider
+from .ollama_provider import OllamaProvider
+from .openai_provider import OpenAIProvider
+from .openrouter_provider import OpenRouterProvider
+from .anthropic_provider import AnthropicProvider
+from .google_provider import GoogleProvider
+from .huggingface_provider import HuggingFaceProvider
+
+PROVIDER_CLASSES: Dict[str, Type[BaseProvider]] = {
+    "ollama": OllamaProvider,
+    "openai": OpenAIProvider,
+    "openrouter": OpenRouterProvider,
+    "anthropic": AnthropicProvider,
+    "google": GoogleProvider,
+    "huggingface": HuggingFaceProvider,
+}
+
+# Environment variables holding API keys (first one found wins)
+API_KEY_ENV = {
+    "openai": ("OPENAI_API_KEY",),
+    "openrouter": ("OPENROUTER_API_KEY",),
+    "anthropic": ("ANTHROPIC_API_KEY",),
+    "google": ("GOOGLE_API_KEY",),
+    "huggingface": ("HUGGINGFACE_API_KEY", "HF_API_KEY"),
+}
+
+
+class ProviderRegistry(ILLMProviderFactory):
+    """Registry of configured provider instances"""
+
+    def __init__(self):
+        self._providers: Dict[Tuple[str, Optional[str], Optional[str]], BaseProvider] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def provider_class(provider_name: str) -> Type[BaseProvider]:
+        """Provider class for a name, ValueError if unknown"""
+        provider_class = PROVIDER_CLASSES.get((provider_name or "").lower())
+        if provider_class is None:
+            raise ValueError(f"Unsupported provider: {provider_name}")
+        return provider_class
+
+    @staticmethod
+    def api_key_for(provider_name: str) -> Optional[str]:
+        """API key from the environment"""
+        for env_name in API_KEY_ENV.get(provider_name, ()):
+            value = os.getenv(env_name)
+            if value:
+                return value
+        return None
+
+    def create_provider(self, provider_name: str) -> BaseProvider:
+        """Provider configured from the environment"""
+        return self.get(provider_name)
+
+    def get(self, provider_name: str, api_key: str = None, base_url: str = None) -> BaseProvider:
+        """Cached provider instance; ValueError if the API key is missing"""
+        provider_name = (provider_name or "").lower()
+        provider_class = self.provider_class(provider_name)
+
+        if provider_name == "ollama":
+            base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        elif api_key is None:
+            api_key = self.api_key_for(provider_name)
+            if not api_key:
+                raise ValueError(f"{API_KEY_ENV[provider_name][0]} not found in .env")
+
+        key = (provider_name, api_key, base_url)
+        provider = self._providers.get(key)
+        if provider is None:
+            with self._lock:
+                provider = self._providers.get(key)
+                if provider is None:
+                    kwargs = {"api_key": api_key}
+                    if base_url:
+                        kwargs["base_url"] = base_url
+                    provider = provider_class(**kwargs)
+                    self._providers[key] = provider
+        return provider
+
+    def clear(self):
+        """Drop cached providers (e.g. after API keys changed in settings)"""
+        with self._lock:
+            self._providers.clear()
+
+
+_registry = None
+
+
+def get_registry() -> ProviderRegistry:
+    """Shared provider registry"""
+    global _registry
+    if _registry is None:
+        _registry = ProviderRegistry()
+    return _registry
@@ -0,0 +1,247 @@
+"""
+Resilience - Retry with backoff, circuit breakers and timeouts for LLM calls
+
+Shared by every provider: transient failures (connection errors, 5xx) are
+retried with exponential backoff and full jitter; rate limiting (429) is only
+retried when the server says when to come back, and exhausted quotas fail
+fast. Read timeouts are not retried - a stalled generation would otherwise
+hold a worker for several read timeouts in a row - but they count towards the
+per-provider circuit breaker, which fails fast while a backend is down or
+stalled instead of tying up a worker until the read timeout.
+"""
+
+import email.utils
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+RETRYABLE_STATUS = {500, 502, 503, 504, 529}
+# Exception class name fragments used by requests / httpx / openai / anthropic / google
+# (connect failures only - ReadTimeout, APITimeoutError, DeadlineExceeded are left out)
+TRANSIENT_NAMES = (
+    "ConnectTimeout", "ConnectError", "ConnectionError", "APIConnectionError",
+    "ServiceUnavailable", "InternalServerError", "Overloaded",
+)
+# Failures that say nothing about backend health (quota, throttling)
+THROTTLE_NAMES = ("RateLimit", "ResourceExhausted")
+# Message fragments of quota / billing exhaustion - retrying within seconds cannot help
+QUOTA_EXHAUSTED_MARKERS = (
+    "insufficient_quota", "exceeded your current quota", "billing", "perday", "per day",
+)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_timeouts(provider: str = None) -> Tuple[float, float]:
+    """(connect, read) timeouts in seconds
+
+    Connect is short so an unreachable host fails in seconds; read stays long
+    enough for slow local generation.
+    """
+    connect = _env_float("LLM_CONNECT_TIMEOUT", 5.0)
+    read = _env_float("REQUEST_TIMEOUT", 180.0 if provider == "ollama" else 120.0)
+    return connect, read
+
+
+class CircuitOpenError(Exception):
+    """Raised when a provider's circuit breaker is open"""
+
+    def __init__(self, provider: str, retry_in: float):
+        self.provider = provider
+        self.retry_in = retry_in
+        super().__init__(
+            f"{provider} is currently unavailable (too many consecutive failures). "
+            f"Retrying automatically in {retry_in:.0f}s - or switch provider."
+        )
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after cooldown"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError while open; let one probe through after cooldown"""
+        with self._lock:
+            if self.state == self.OPEN:
+                elapsed = time.time() - self.opened_at
+                if elapsed < self.recovery_timeout:
+                    raise CircuitOpenError(self.name, self.recovery_timeout - elapsed)
+                self.state = self.HALF_OPEN
+            elif self.state == self.HALF_OPEN:
+                # A probe is already in flight
+                raise CircuitOpenError(self.name, self.recovery_timeout)
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+    def release(self):
+        """Call finished without saying anything about backend health"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+    max_attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number ``attempt`` (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    """HTTP status carried by the exception or its response, never parsed from the message"""
+    for source in (exc, getattr(exc, "response", None)):
+        for attribute in ("status_code", "status", "code"):
+            code = getattr(source, attribute, None)
+            if isinstance(code, int) and not isinstance(code, bool):
+                return code
+    return None
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Transient failure worth retrying"""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if is_throttled(exc):
+        # Short-term rate limit with a server hint; exhausted quotas fail fast
+        return retry_after(exc) is not None and not is_quota_exhausted(exc)
+    name = type(exc).__name__
+    if any(fragment in name for fragment in TRANSIENT_NAMES):
+        return True
+    if _status_code(exc) in RETRYABLE_STATUS:
+        return True
+    if is_timeout(exc):
+        # Read timeout (connect timeouts matched above)
+        return False
+    return "could not connect" in str(exc).lower()
+
+
+def is_timeout(exc: Exception) -> bool:
+    """Request timed out (connect or read)"""
+    return "Timeout" in type(exc).__name__ or "timed out" in str(exc).lower()
+
+
+def is_throttled(exc: Exception) -> bool:
+    """Rate limiting / quota - the backend is up"""
+    name = type(exc).__name__
+    return any(f in name for f in THROTTLE_NAMES) or _status_code(exc) == 429 or "quota" in str(exc).lower()
+
+
+def is_quota_exhausted(exc: Exception) -> bool:
+    """Hard quota or billing limit rather than a short-term rate limit"""
+    message = str(exc).lower()
+    return any(marker in message for marker in QUOTA_EXHAUSTED_MARKERS)
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    """Server-requested delay (Retry-After header or 'retry in Ns'), None if absent"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = None
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+    except AttributeError:
+        pass
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            parsed = email.utils.parsedate_to_datetime(value)
+            if parsed is not None:
+                return max(parsed.timestamp() - time.time(), 0.0)
+    match = re.search(r"retry in ([\d.]+)\s*s", str(exc), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Shared circuit breaker for a provider"""
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(
+                provider,
+                failure_threshold=int(_env_float("CIRCUIT_BREAKER_THRESHOLD", 5)),
+                recovery_timeout=_env_float("CIRCUIT_BREAKER_COOLDOWN", 30.0),
+            )
+        return _breakers[provider]
+
+
+def default_retry_policy() -> RetryPolicy:
+    return RetryPolicy(max_attempts=max(1, int(_env_float("LLM_MAX_RETRIES", 3))))
+
+
+def call_with_resilience(
+    provider: str,
+    func: Callable,
+    *args,
+    policy: RetryPolicy = None,
+    on_retry: Callable[[int, float, Exception], None] = None,
+    **kwargs,
+):
+    """Run ``func`` under the provider's circuit breaker with retries"""
+    policy = policy or default_retry_policy()
+    breaker = get_circuit_breaker(provider)
+
+    for attempt in range(1, policy.max_attempts + 1):
+        breaker.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            retryable = is_retryable(e)
+            if is_throttled(e):
+                breaker.release()
+            elif retryable or is_timeout(e):
+                # A backend that accepts connections but never answers is down too
+                breaker.record_failure()
+            else:
+                breaker.release()
+            if not retryable or attempt == policy.max_attempts:
+                raise
+            delay = retry_after(e)
+            delay = min(delay, policy.max_delay) if delay is not None else policy.backoff(attempt)
+            if on_retry:
+                on_retry(attempt, delay, e)
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
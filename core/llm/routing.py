@@ -0,0 +1,217 @@
+"""
+Routing - Latency/error tracking and hedged multi-provider routing
+
+Every provider call is recorded per (provider, model). The router uses the
+observed p50/p95 latency and error rate to order candidate routes, sends the
+request to the best one and, if it has not answered within the latency
+budget, hedges to the next one. The first successful answer wins.
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .resilience import get_circuit_breaker, CircuitBreaker
+
+Route = Tuple[str, str]  # (provider, model)
+
+
+@dataclass
+class RouteStats:
+    """Observed behaviour of one route"""
+    samples: int = 0
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    error_rate: float = 0.0
+
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class LatencyTracker:
+    """Sliding window of call latencies and outcomes per route"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._latencies: Dict[Route, Deque[float]] = {}
+        self._outcomes: Dict[Route, Deque[bool]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model: str, latency: float, success: bool):
+        """Record one call (latency in seconds)"""
+        route = (provider, model or "")
+        with self._lock:
+            outcomes = self._outcomes.setdefault(route, deque(maxlen=self.window))
+            outcomes.append(success)
+            if success:
+                self._latencies.setdefault(route, deque(maxlen=self.window)).append(latency)
+
+    def stats(self, provider: str, model: str) -> RouteStats:
+        route = (provider, model or "")
+        with self._lock:
+            latencies = sorted(self._latencies.get(route, ()))
+            outcomes = list(self._outcomes.get(route, ()))
+        if not outcomes:
+            return RouteStats()
+        return RouteStats(
+            samples=len(outcomes),
+            p50=_percentile(latencies, 0.50),
+            p95=_percentile(latencies, 0.95),
+            error_rate=outcomes.count(False) / len(outcomes),
+        )
+
+    def all_stats(self) -> Dict[Route, RouteStats]:
+        with self._lock:
+            routes = list(self._outcomes)
+        return {route: self.stats(*route) for route in routes}
+
+
+_tracker = None
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Shared latency tracker"""
+    global _tracker
+    if _tracker is None:
+        _tracker = LatencyTracker()
+    return _tracker
+
+
+class HedgedRouter:
+    """Send to the best route, hedge to the next one after a latency budget
+
+    Each attempt runs on its own daemon thread: a shared pool sized for a
+    few requests would queue hedges behind slow calls of concurrent
+    requests, so they would start after the budget they exist to beat.
+    """
+
+    MIN_SAMPLES = 5
+
+    def __init__(self, tracker: LatencyTracker = None, default_budget: float = 10.0):
+        self.tracker = tracker or get_latency_tracker()
+        self.default_budget = default_budget
+        self._closed = False
+
+    def _measured(self, route: Route) -> bool:
+        return self.tracker.stats(*route).samples >= self.MIN_SAMPLES
+
+    def _score(self, route: Route) -> float:
+        """Lower is better; routes without data score as the default budget"""
+        stats = self.tracker.stats(*route)
+        if stats.samples < self.MIN_SAMPLES:
+            return self.default_budget
+        if stats.p95 is None:
+            # Every recent call failed
+            return float("inf")
+        return stats.p95 * (1 + 4 * stats.error_rate)
+
+    def _rank(self, route: Route) -> Tuple[bool, float]:
+        """Sort key: measured routes first, then by score
+
+        An untested (possibly paid) route must not outrank a measured one
+        just because the default budget beats a slow local model's p50.
+        """
+        return not self._measured(route), self._score(route)
+
+    def order(self, routes: List[Route]) -> List[Route]:
+        """Primary first unless observed data says another route is healthier"""
+        def _blocked(route):
+            return get_circuit_breaker(route[0]).state == CircuitBreaker.OPEN
+
+        available = [r for r in routes if not _blocked(r)] or list(routes)
+        primary = available[0]
+        primary_stats = self.tracker.stats(*primary)
+        # Demote a primary that mostly fails
+        if primary_stats.samples >= self.MIN_SAMPLES and primary_stats.error_rate > 0.5:
+            return sorted(available, key=self._rank)
+        # Otherwise only swap when another measured route's p95 beats the primary's p50;
+        # untested routes are only ever hedged to
+        rest = sorted(available[1:], key=self._rank)
+        if (rest and primary_stats.p50 is not None and self._measured(rest[0])
+                and self._score(rest[0]) < primary_stats.p50):
+            return [rest[0], primary] + rest[1:]
+        return [primary] + rest
+
+    def budget(self, route: Route) -> float:
+        """Seconds to wait for a route before hedging"""
+        configured = os.getenv("LLM_HEDGE_BUDGET_MS")
+        if configured:
+            try:
+                return float(configured) / 1000.0
+            except ValueError:
+                pass
+        stats = self.tracker.stats(*route)
+        if stats.samples >= self.MIN_SAMPLES and stats.p95 is not None:
+            return max(stats.p95, 1.0)
+        return self.default_budget
+
+    def run(self, routes: List[Route], call: Callable[[Route], str],
+            on_hedge: Callable[[Route, Route, float], None] = None) -> Tuple[str, Route]:
+        """Return (result, winning route); raise the last error if all fail"""
+        ordered = self.order(routes)
+        pending = {}
+        errors = []
+        next_index = 0
+
+        if self._closed:
+            raise RuntimeError("Router is shut down")
+
+        def _launch():
+            nonlocal next_index
+            route = ordered[next_index]
+            next_index += 1
+            pending[self._start(call, route)] = route
+
+        _launch()
+        while pending:
+            hedge_possible = next_index < len(ordered)
+            timeout = self.budget(ordered[next_index - 1]) if hedge_possible else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Budget exceeded: hedge to the next route, keep the first running
+                if on_hedge:
+                    on_hedge(ordered[next_index - 1], ordered[next_index], timeout)
+                _launch()
+                continue
+
+            for future in done:
+                route = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                # Losers keep running on their daemon threads; their results are discarded
+                return result, route
+
+            if not pending and next_index < len(ordered):
+                _launch()
+
+        raise errors[-1]
+
+    @staticmethod
+    def _start(call: Callable[[Route], str], route: Route) -> Future:
+        """Run ``call(route)`` on a new daemon thread"""
+        future = Future()
+        future.set_running_or_notify_cancel()
+
+        def _target():
+            try:
+                future.set_result(call(route))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=_target, name=f"geoai-hedge-{route[0]}", daemon=True).start()
+        return future
+
+    def shutdown(self):
+        """Refuse new requests; attempts still running finish on their daemon threads"""
+        self._closed = True
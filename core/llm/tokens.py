@@ -0,0 +1,99 @@
+"""
+Tokens - Token estimation and per-model context-window budgets
+
+Uses tiktoken's BPE encodings when the package is installed and a fast
+character-based estimate otherwise. The estimate deliberately errs on the
+high side so budgets are never exceeded because of it.
+"""
+
+import math
+import os
+import threading
+from typing import Optional
+
+DEFAULT_CONTEXT_WINDOW = 8192
+# Tokens kept free for the answer when the provider sets no explicit limit
+DEFAULT_OUTPUT_TOKENS = 2000
+# Safety margin for chat templates / role markers added by the provider
+TEMPLATE_OVERHEAD = 64
+
+# (model id fragment, context window) - first match wins, so specific ids go first
+CONTEXT_WINDOWS = (
+    ("gpt-4o", 128000),
+    ("gpt-4-turbo", 128000),
+    ("gpt-4.1", 1047576),
+    ("gpt-3.5-turbo", 16385),
+    ("gpt-4", 8192),
+    ("claude", 200000),
+    ("gemini", 1048576),
+    ("mistral-7b", 32768),
+    ("mixtral", 32768),
+    ("zephyr", 8192),
+    ("llama3", 8192),
+    ("llama2", 4096),
+    ("phi3", 4096),
+)
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def _encoding(model: str = None):
+    """tiktoken encoding for a model, None when tiktoken is not installed"""
+    key = model or ""
+    with _encodings_lock:
+        if key in _encodings:
+            return _encodings[key]
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model.split("/")[-1]) if model else None
+        except KeyError:
+            encoding = None
+        if encoding is None:
+            encoding = tiktoken.get_encoding("o200k_base" if model and "4o" in model else "cl100k_base")
+    except Exception:
+        encoding = None
+    with _encodings_lock:
+        _encodings[key] = encoding
+    return encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast estimate: ~3.5 characters per token for SQL/code-heavy prompts"""
+    return math.ceil(len(text) / 3.5) if text else 0
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Tokens in ``text`` for ``model`` (BPE when available, estimate otherwise)"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def context_window(provider: str, model: str = None) -> int:
+    """Context window of a model in tokens
+
+    LLM_CONTEXT_WINDOW overrides the table; Ollama is bounded by the num_ctx
+    the plugin loads models with (OLLAMA_MAX_CTX).
+    """
+    configured = os.getenv("LLM_CONTEXT_WINDOW")
+    if configured and configured.isdigit():
+        return int(configured)
+    if provider == "ollama":
+        max_ctx = os.getenv("OLLAMA_MAX_CTX", "8192")
+        return int(max_ctx) if max_ctx.isdigit() else 8192
+    model_id = (model or "").lower()
+    for fragment, window in CONTEXT_WINDOWS:
+        if fragment in model_id:
+            return window
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def input_budget(provider: str, model: str = None, max_output_tokens: Optional[int] = None) -> int:
+    """Tokens available for the prompt once the answer is reserved"""
+    reserve = max_output_tokens or DEFAULT_OUTPUT_TOKENS
+    return max(context_window(provider, model) - reserve - TEMPLATE_OVERHEAD, 0)
@@ -0,0 +1,49 @@
+"""
+SQL lexing and schema lookup shared by the executor, validator, LLM handler and editor
+"""
+
+from .tokenizer import (
+    COMMENT,
+    QUOTED_IDENTIFIER,
+    RESERVED_WORDS,
+    SQL_KEYWORDS,
+    STRING,
+    WHITESPACE,
+    WORD,
+    Token,
+    tokenize,
+    split_statements,
+    strip_comments,
+    normalize,
+    mask_literals,
+    unquote_identifier,
+    quote_identifier,
+    identifiers,
+    statement_type,
+    returns_rows,
+)
+from .schema_index import SchemaIndex, is_case_sensitive, schema_index
+
+__all__ = [
+    "COMMENT",
+    "QUOTED_IDENTIFIER",
+    "RESERVED_WORDS",
+    "SQL_KEYWORDS",
+    "STRING",
+    "WHITESPACE",
+    "WORD",
+    "Token",
+    "tokenize",
+    "split_statements",
+    "strip_comments",
+    "normalize",
+    "mask_literals",
+    "unquote_identifier",
+    "quote_identifier",
+    "identifiers",
+    "statement_type",
+    "returns_rows",
+    "SchemaIndex",
+    "is_case_sensitive",
+    "schema_index",
+]
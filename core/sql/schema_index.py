@@ -0,0 +1,146 @@
+"""
+Schema Index - Precomputed table/column lookup with trigram fuzzy matching
+
+Built once per schema (cached by fingerprint) from a context's
+``table_fields``. Column checks are dictionary lookups, and suggestions for a
+misspelt name only score the columns sharing trigrams with it instead of
+every column of every table, which keeps them fast on schemas with tens of
+thousands of columns.
+"""
+
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .tokenizer import unquote_identifier
+
+
+def trigrams(word: str) -> Set[str]:
+    """pg_trgm-style trigrams of a lower-cased, padded word"""
+    padded = f"  {word.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SchemaIndex:
+    """Tables, their columns and a trigram index over all names"""
+
+    def __init__(self, table_fields: Dict[str, Iterable[str]]):
+        # lower-case "schema.table" and bare "table" -> table key as given
+        self.tables: Dict[str, str] = {}
+        # table key -> lower-case column -> column as given
+        self.columns: Dict[str, Dict[str, str]] = {}
+        self._column_tables: Dict[str, Set[str]] = defaultdict(set)
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+        # Names exactly as stored, for case-sensitive databases
+        self._exact_tables: Set[str] = set()
+        self._exact_columns: Dict[str, Set[str]] = defaultdict(set)
+
+        for table, fields in table_fields.items():
+            self.tables[table.lower()] = table
+            self.tables.setdefault(table.split(".")[-1].lower(), table)
+            self._exact_tables.update((table, table.split(".")[-1]))
+            columns = self.columns[table] = {}
+            for field in fields:
+                name = field.lower()
+                columns.setdefault(name, field)
+                self._exact_columns[field].add(table)
+                self._column_tables[name].add(table)
+                self._index(name)
+        for name in self.tables:
+            self._index(name)
+
+    def _index(self, name: str):
+        for gram in trigrams(name):
+            self._trigrams[gram].add(name)
+
+    def table(self, name: str) -> Optional[str]:
+        """Table key for a (possibly schema-qualified) name"""
+        name = name.lower()
+        if name in self.tables:
+            return self.tables[name]
+        return self.tables.get(name.split(".")[-1])
+
+    def has_column(self, column: str, table: str = None) -> bool:
+        """Column exists in ``table`` (in any table when None)"""
+        if table is None:
+            return column.lower() in self._column_tables
+        return column.lower() in self.columns.get(table, {})
+
+    def resolves(self, identifier: str, case_sensitive: bool = False, table: str = None) -> bool:
+        """Identifier as written (bare or "quoted") names a column - of ``table``
+        when given, else of any table - or, without ``table``, a table
+
+        With ``case_sensitive`` (PostgreSQL) a bare name folds to lower case
+        and a quoted one is kept as is; either must then match exactly.
+        """
+        name = unquote_identifier(identifier)
+        if not case_sensitive:
+            if table is not None:
+                return self.has_column(name, table)
+            return self.has_column(name) or self.table(name) is not None
+        tables = self._exact_columns.get(name, ())
+        if table is not None:
+            return table in tables
+        return bool(tables) or name in self._exact_tables
+
+    def suggest(self, name: str, n: int = 3, cutoff: float = 0.6,
+                tables: Iterable[str] = None) -> List[str]:
+        """Closest column names, best first (limited to ``tables`` when given)"""
+        allowed = None
+        if tables is not None:
+            allowed = set()
+            for table in tables:
+                allowed.update(self.columns.get(table, {}))
+        matches = self._closest(name, n, cutoff, lambda candidate: (
+            candidate in self._column_tables and (allowed is None or candidate in allowed)
+        ))
+        return [self._display_name(match) for match in matches]
+
+    def suggest_tables(self, name: str, n: int = 3, cutoff: float = 0.6) -> List[str]:
+        """Closest table names, best first"""
+        return [self.tables[match] for match in self._closest(name, n, cutoff, lambda t: t in self.tables)]
+
+    def _closest(self, name: str, n: int, cutoff: float, accept, shortlist: int = 50) -> List[str]:
+        """Lower-case indexed names accepted by ``accept``, best first"""
+        word = name.lower()
+        shared = Counter()
+        for gram in trigrams(word):
+            shared.update(self._trigrams.get(gram, ()))
+        # Only the names sharing the most trigrams get the exact (slower) score
+        candidates = [c for c, _ in shared.most_common() if accept(c)][:shortlist]
+        matcher = SequenceMatcher(b=word)
+        scored = []
+        for candidate in candidates:
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                ratio = matcher.ratio()
+                if ratio >= cutoff:
+                    scored.append((ratio, candidate))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [candidate for _, candidate in scored[:n]]
+
+    def _display_name(self, name: str) -> str:
+        """Column as spelled in the schema"""
+        tables = self._column_tables.get(name)
+        return self.columns[min(tables)][name] if tables else name
+
+
+def is_case_sensitive(db_type: Optional[str]) -> bool:
+    """PostgreSQL folds bare names to lower case and compares exactly; SQLite ignores case"""
+    return "postgres" in (db_type or "").lower()
+
+
+def schema_fingerprint(table_fields: Dict[str, Iterable[str]]) -> Tuple:
+    """Hashable identity of a schema"""
+    return tuple((table, tuple(fields)) for table, fields in table_fields.items())
+
+
+@lru_cache(maxsize=8)
+def _build(fingerprint: Tuple) -> SchemaIndex:
+    return SchemaIndex(dict(fingerprint))
+
+
+def schema_index(table_fields: Dict[str, Iterable[str]]) -> SchemaIndex:
+    """Index for ``table_fields``, shared while the schema is unchanged"""
+    return _build(schema_fingerprint(table_fields))
@@ -0,0 +1,222 @@
+"""
+SQL Tokenizer - Streaming lexer shared by SQL cleaning and analysis
+
+One pass over the text with a single compiled pattern yields tokens for
+whitespace, comments (-- and /* */), string literals ('...' with '' escapes,
+E'...' with backslash escapes, $tag$...$tag$ dollar quotes), quoted and bare
+identifiers, numbers, parameters and punctuation. Everything built on it -
+statement splitting, comment stripping, SELECT detection - is linear in the
+length of the SQL and never looks inside a literal. Unterminated literals and
+comments run to the end of the input instead of raising.
+"""
+
+import re
+from typing import Iterator, List, NamedTuple, Optional
+
+WHITESPACE = "whitespace"
+COMMENT = "comment"
+STRING = "string"
+QUOTED_IDENTIFIER = "quoted_identifier"
+WORD = "word"
+NUMBER = "number"
+PARAMETER = "parameter"
+PUNCTUATION = "punctuation"
+OPERATOR = "operator"
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<whitespace>\s+)
+    |(?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    |(?P<escape_string>[Ee]'(?:[^'\\]|\\.|'')*(?:'|\Z))
+    |(?P<string>(?:[BbXxNn]|[Uu]&)?'(?:[^']|'')*(?:'|\Z))
+    |(?P<dollar_string>\$(?P<tag>(?:[^\W\d]\w*)?)\$.*?(?:\$(?P=tag)\$|\Z))
+    |(?P<quoted_identifier>(?:[Uu]&)?"(?:[^"]|"")*(?:"|\Z))
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[Ee][+-]?\d+)?)
+    |(?P<parameter>\$\d+|:[^\W\d]\w*|\?)
+    |(?P<word>[^\W\d][\w$]*)
+    |(?P<punctuation>::|[;(),.\[\]])
+    |(?P<operator>[-+*/<>=~!@#%^&|`:]+|.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_KINDS = {"escape_string": STRING, "dollar_string": STRING}
+
+# Leading keyword of statements that return rows
+ROW_RETURNING = {"SELECT", "VALUES", "TABLE", "SHOW", "EXPLAIN", "PRAGMA"}
+# Reserved words that can't be used as bare identifiers
+RESERVED_WORDS = {
+    "ALL", "AND", "ANY", "AS", "ASC", "BETWEEN", "BY", "CASE", "CAST", "CHECK", "COLUMN",
+    "CONSTRAINT", "CREATE", "CROSS", "CURRENT_DATE", "CURRENT_USER", "DEFAULT", "DELETE", "DESC",
+    "DISTINCT", "DO", "ELSE", "END", "EXCEPT", "FALSE", "FETCH", "FOR", "FOREIGN", "FROM", "FULL",
+    "GRANT", "GROUP", "HAVING", "IN", "INNER", "INSERT", "INTERSECT", "INTO", "IS", "JOIN", "LEFT",
+    "LIKE", "LIMIT", "NATURAL", "NOT", "NULL", "OFFSET", "ON", "OR", "ORDER", "OUTER", "PRIMARY",
+    "REFERENCES", "RIGHT", "SELECT", "SET", "TABLE", "THEN", "TO", "TRUE", "UNION", "UNIQUE",
+    "UPDATE", "USER", "USING", "VALUES", "WHEN", "WHERE", "WINDOW", "WITH",
+}
+# Lower-case keywords (reserved or not), not treated as names by the validator and fix memory
+SQL_KEYWORDS = {
+    "all", "and", "any", "as", "asc", "between", "by", "case", "cast", "cross", "current_date",
+    "current_time", "current_timestamp", "default", "delete", "desc", "distinct", "else", "end",
+    "except", "exists", "false", "fetch", "filter", "first", "following", "for", "from", "full",
+    "group", "having", "ilike", "in", "inner", "insert", "intersect", "interval", "into", "is",
+    "join", "last", "lateral", "left", "like", "limit", "natural", "next", "not", "null", "nulls",
+    "offset", "on", "only", "or", "order", "outer", "over", "partition", "preceding", "range",
+    "recursive", "right", "row", "rows", "select", "set", "similar", "table", "then", "true",
+    "unbounded", "union", "update", "using", "values", "when", "where", "window", "with",
+}
+_PLAIN_IDENTIFIER_RE = re.compile(r"^[a-z_][a-z0-9_$]*$")
+# Statement keywords that can follow a WITH clause
+_MAIN_STATEMENTS = {"SELECT", "VALUES", "TABLE", "INSERT", "UPDATE", "DELETE", "MERGE"}
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    start: int
+
+    @property
+    def upper(self) -> str:
+        return self.text.upper()
+
+
+def tokenize(sql: str) -> Iterator[Token]:
+    """Tokens of ``sql`` in order; their texts concatenate back to ``sql``"""
+    for match in _TOKEN_RE.finditer(sql):
+        yield Token(_KINDS.get(match.lastgroup, match.lastgroup), match.group(), match.start())
+
+
+def _code_tokens(sql: str) -> Iterator[Token]:
+    """Tokens other than whitespace and comments"""
+    return (t for t in tokenize(sql) if t.kind not in (WHITESPACE, COMMENT))
+
+
+def split_statements(sql: str) -> List[str]:
+    """Statements separated by top-level semicolons (empty ones dropped)"""
+    statements = []
+    start = 0
+    has_code = False
+    for token in tokenize(sql):
+        if token.kind == PUNCTUATION and token.text == ";":
+            if has_code:
+                statements.append(sql[start:token.start].strip())
+            start = token.start + 1
+            has_code = False
+        elif token.kind not in (WHITESPACE, COMMENT):
+            has_code = True
+    if has_code:
+        statements.append(sql[start:].strip())
+    return statements
+
+
+def strip_comments(sql: str) -> str:
+    """SQL without comments; literals and line structure are left intact"""
+    parts = []
+    for token in tokenize(sql):
+        if token.kind != COMMENT:
+            parts.append(token.text)
+        elif token.text.startswith("/*"):
+            # Keep "a/**/b" two tokens
+            parts.append(" ")
+    return "".join(parts)
+
+
+def normalize(sql: str) -> str:
+    """Single-line SQL: comments dropped, whitespace collapsed, no trailing semicolon"""
+    parts = []
+    pending_space = False
+    for token in tokenize(sql):
+        if token.kind in (WHITESPACE, COMMENT):
+            pending_space = bool(parts)
+            continue
+        if pending_space:
+            parts.append(" ")
+            pending_space = False
+        parts.append(token.text)
+    while parts and parts[-1] in (";", " "):
+        parts.pop()
+    return "".join(parts)
+
+
+def mask_literals(sql: str, blank_identifiers: bool = False) -> str:
+    """Same-length SQL with the inside of string literals blanked
+
+    Keywords and punctuation inside literals can then be ignored by plain
+    regex searches; offsets still line up with ``sql``. With ``blank_identifiers``
+    quoted identifiers are blanked too.
+    """
+    parts = []
+    for token in tokenize(sql):
+        if token.kind == STRING or (blank_identifiers and token.kind == QUOTED_IDENTIFIER):
+            text = token.text
+            prefix = len(text) - len(text.lstrip("EeBbXxNnUu&"))
+            opening = text.index("$", prefix + 1) + 1 if text[prefix] == "$" else prefix + 1
+            delimiter = text[prefix:opening]
+            closing = len(delimiter) if len(text) >= opening + len(delimiter) and text.endswith(delimiter) else 0
+            parts.append(text[:opening] + " " * (len(text) - opening - closing) + text[len(text) - closing:])
+        else:
+            parts.append(token.text)
+    return "".join(parts)
+
+
+def unquote_identifier(text: str) -> str:
+    """Identifier as the database stores it (bare names fold to lower case)"""
+    if text.startswith('"'):
+        return text[1:-1].replace('""', '"')
+    return text.lower()
+
+
+def quote_identifier(name: str) -> str:
+    """Identifier as it must be written (quoted unless plain lower case)"""
+    if _PLAIN_IDENTIFIER_RE.match(name) and name.upper() not in RESERVED_WORDS:
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+def identifiers(sql: str) -> List[str]:
+    """Quoted identifiers and bare words that aren't function calls, in order
+
+    Keywords are not told apart from names here; callers filter the words
+    they care about.
+    """
+    names = []
+    tokens = list(_code_tokens(sql))
+    for i, token in enumerate(tokens):
+        if token.kind not in (WORD, QUOTED_IDENTIFIER):
+            continue
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+        if token.kind == WORD and following is not None and following.text == "(":
+            continue
+        names.append(unquote_identifier(token.text))
+    return names
+
+
+def statement_type(sql: str) -> Optional[str]:
+    """Upper-case leading keyword of the first statement
+
+    A WITH clause resolves to the statement that follows its CTEs, so
+    ``WITH x AS (...) DELETE ...`` is a DELETE.
+    """
+    depth = 0
+    with_clause = False
+    for token in _code_tokens(sql):
+        if token.text == "(":
+            depth += 1
+        elif token.text == ")":
+            depth -= 1
+        elif token.text == ";" and depth <= 0:
+            break
+        elif token.kind == WORD and not with_clause:
+            # "(SELECT ...) UNION ..." starts inside parentheses
+            if token.upper != "WITH":
+                return token.upper
+            with_clause = True
+        elif token.kind == WORD and depth <= 0 and token.upper in _MAIN_STATEMENTS:
+            return token.upper
+        elif not with_clause:
+            return None
+    return "WITH" if with_clause else None
+
+
+def returns_rows(sql: str) -> bool:
+    """First statement is a query (SELECT, WITH ... SELECT, VALUES, EXPLAIN...)"""
+    return statement_type(sql) in ROW_RETURNING
@@ -0,0 +1,32 @@
+"""
+Workflow intermediate representation for Model Builder conversion
+"""
+
+from .graph import (
+    WorkflowInput,
+    WorkflowStep,
+    WorkflowEdge,
+    WorkflowOutput,
+    WorkflowGraph,
+)
+from .model3_parser import (
+    Model3ParseError,
+    parse_model3,
+    parse_model3_file,
+    is_model_file,
+)
+from .code_emitter import CodeEmitter, EmitResult
+
+__all__ = [
+    "WorkflowInput",
+    "WorkflowStep",
+    "WorkflowEdge",
+    "WorkflowOutput",
+    "WorkflowGraph",
+    "Model3ParseError",
+    "parse_model3",
+    "parse_model3_file",
+    "is_model_file",
+    "CodeEmitter",
+    "EmitResult",
+]
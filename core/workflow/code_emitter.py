@@ -0,0 +1,436 @@
+"""
+Code Emitter - Template-based PyQGIS / PostGIS code generation from a WorkflowGraph
+
+Recognised processing algorithms are emitted directly as processing.run(...)
+calls or PostGIS CTEs. Steps that cannot be emitted are left as TODO blocks
+and reported in ``unresolved`` so only those need an LLM.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .graph import WorkflowGraph, WorkflowInput, WorkflowStep
+
+# Legacy qgis: ids that map onto native: equivalents
+ALGORITHM_ALIASES = {
+    "qgis:buffer": "native:buffer",
+    "qgis:clip": "native:clip",
+    "qgis:intersection": "native:intersection",
+    "qgis:difference": "native:difference",
+    "qgis:dissolve": "native:dissolve",
+    "qgis:centroids": "native:centroids",
+    "qgis:convexhull": "native:convexhull",
+    "qgis:fixgeometries": "native:fixgeometries",
+    "qgis:reprojectlayer": "native:reprojectlayer",
+    "qgis:simplifygeometries": "native:simplifygeometries",
+    "qgis:joinattributesbylocation": "native:joinattributesbylocation",
+    "qgis:extractbylocation": "native:extractbylocation",
+    "qgis:extractbyattribute": "native:extractbyattribute",
+    "qgis:mergevectorlayers": "native:mergevectorlayers",
+}
+
+# Default parameters for recognised algorithms (layer parameters come from edges)
+ALGORITHM_DEFAULTS = {
+    "native:buffer": {"DISTANCE": 10, "SEGMENTS": 5, "END_CAP_STYLE": 0, "JOIN_STYLE": 0,
+                      "MITER_LIMIT": 2, "DISSOLVE": False},
+    "native:clip": {},
+    "native:intersection": {},
+    "native:difference": {},
+    "native:dissolve": {"FIELD": []},
+    "native:centroids": {"ALL_PARTS": False},
+    "native:convexhull": {},
+    "native:fixgeometries": {},
+    "native:reprojectlayer": {"TARGET_CRS": "EPSG:4326"},
+    "native:simplifygeometries": {"METHOD": 0, "TOLERANCE": 1},
+    "native:joinattributesbylocation": {"PREDICATE": [0], "METHOD": 0,
+                                        "DISCARD_NONMATCHING": False},
+    "native:extractbylocation": {"PREDICATE": [0]},
+    "native:extractbyattribute": {"FIELD": "", "OPERATOR": 0, "VALUE": ""},
+    "native:mergevectorlayers": {},
+}
+
+# native:joinattributesbylocation PREDICATE enum -> PostGIS function
+JOIN_PREDICATES = {
+    0: "ST_Intersects",
+    1: "ST_Contains",
+    2: "ST_Equals",
+    3: "ST_Touches",
+    4: "ST_Overlaps",
+    5: "ST_Within",
+    6: "ST_Crosses",
+}
+# native:extractbylocation PREDICATE enum -> PostGIS function (disjoint is
+# emitted as NOT EXISTS ... ST_Intersects)
+DISJOINT = 2
+EXTRACT_PREDICATES = {
+    0: "ST_Intersects",
+    1: "ST_Contains",
+    DISJOINT: "ST_Intersects",
+    3: "ST_Equals",
+    4: "ST_Touches",
+    5: "ST_Overlaps",
+    6: "ST_Within",
+    7: "ST_Crosses",
+}
+
+# native:extractbyattribute OPERATOR enum -> SQL comparison
+ATTRIBUTE_OPERATORS = {0: "=", 1: "<>", 2: ">", 3: ">=", 4: "<", 5: "<="}
+
+# Model parameter types that are plain values rather than layers
+SCALAR_INPUT_TYPES = {
+    "number", "distance", "field", "string", "enum", "boolean", "expression", "crs",
+    "extent", "point", "range", "matrix", "datetime", "scale", "duration", "area", "volume",
+}
+
+PROVIDER_ID = re.compile(r"^[a-z0-9_]+:[a-z0-9_]+$", re.IGNORECASE)
+
+
+@dataclass
+class EmitResult:
+    """Generated code plus the ids of steps that still need an LLM"""
+    code: str
+    unresolved: List[str] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        return not self.unresolved
+
+
+def canonical_algorithm(algorithm: str) -> str:
+    """Normalise an algorithm id (lower case, legacy aliases resolved)"""
+    algorithm = (algorithm or "").strip().lower()
+    return ALGORITHM_ALIASES.get(algorithm, algorithm)
+
+
+def _identifier(name: str) -> str:
+    """Safe Python/SQL identifier for a step or input name"""
+    ident = re.sub(r"\W+", "_", name or "").strip("_").lower()
+    if not ident or ident[0].isdigit():
+        ident = f"_{ident}"
+    return ident
+
+
+def _sql_literal(value: Any) -> str:
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class CodeEmitter:
+    """Emit PyQGIS and PostGIS code for a WorkflowGraph without an LLM"""
+
+    def __init__(self, geometry_column: str = "geom"):
+        self.geometry_column = geometry_column
+
+    def emit(self, graph: WorkflowGraph, target: str) -> EmitResult:
+        """Emit code for 'python' or 'sql'"""
+        if target == "python":
+            return self.emit_python(graph)
+        return self.emit_sql(graph)
+
+    # ------------------------------------------------------------------ python
+
+    def _python_supported(self, graph: WorkflowGraph, step: WorkflowStep) -> bool:
+        algorithm = canonical_algorithm(step.algorithm)
+        if not PROVIDER_ID.match(algorithm):
+            return False
+        # Parameters parsed from a .model3 file are exact for any algorithm
+        return algorithm in ALGORITHM_DEFAULTS or graph.source == "model3"
+
+    def _python_value(self, value: Any, imports: set) -> str:
+        if isinstance(value, dict) and "expression" in value:
+            imports.add("QgsProperty")
+            return f"QgsProperty.fromExpression({value['expression']!r})"
+        if isinstance(value, dict) and "expression_text" in value:
+            imports.add("QgsProperty")
+            return f"QgsProperty.fromExpression({value['expression_text']!r})"
+        if isinstance(value, list):
+            return "[" + ", ".join(self._python_value(v, imports) for v in value) + "]"
+        return repr(value)
+
+    def emit_python(self, graph: WorkflowGraph) -> EmitResult:
+        """Standalone PyQGIS script chaining processing.run calls"""
+        imports = set()
+        unresolved = []
+        body = []
+        input_names = {i.name for i in graph.inputs}
+
+        for step in graph.ordered_steps():
+            step_var = _identifier(step.id)
+            body.append(f"# {step.label} ({step.algorithm})" if step.label else f"# {step.algorithm}")
+
+            if not self._python_supported(graph, step):
+                unresolved.append(step.id)
+                body.append(f"# TODO({step.id}): implement '{step.algorithm}'")
+                body.append(f'results["{step_var}"] = {{"OUTPUT": None}}')
+                body.append("")
+                continue
+
+            algorithm = canonical_algorithm(step.algorithm)
+            params = dict(ALGORITHM_DEFAULTS.get(algorithm, {}))
+            params.update(step.parameters)
+            rendered = {k: self._python_value(v, imports) for k, v in params.items()}
+
+            linked = {}
+            for edge in graph.incoming(step.id):
+                if edge.source in input_names:
+                    ref = _identifier(edge.source)
+                else:
+                    ref = f'results["{_identifier(edge.source)}"]["{edge.output or "OUTPUT"}"]'
+                linked.setdefault(edge.parameter, []).append(ref)
+            for name, refs in linked.items():
+                # Multi-layer parameters (e.g. LAYERS) take a list
+                rendered[name] = refs[0] if len(refs) == 1 and name != "LAYERS" else f"[{', '.join(refs)}]"
+
+            outputs = {o.output for o in graph.outputs if o.source == step.id}
+            outputs.update(
+                e.output for e in graph.edges if e.source == step.id and e.output
+            )
+            if algorithm in ALGORITHM_DEFAULTS:
+                outputs.add("OUTPUT")
+            for output in sorted(outputs):
+                rendered.setdefault(output, repr("TEMPORARY_OUTPUT"))
+
+            body.append(f'results["{step_var}"] = processing.run("{algorithm}", {{')
+            for key, value in rendered.items():
+                body.append(f'    "{key}": {value},')
+            body.append("})")
+            body.append("")
+
+        lines = ['"""', f"Generated from QGIS model: {graph.name}", '"""', ""]
+        lines.append("import processing")
+        if imports:
+            lines.append(f"from qgis.core import {', '.join(sorted(imports))}")
+        lines.append("")
+
+        if graph.inputs:
+            lines.append("# Model inputs - set layers to a layer id, name or file path")
+            for model_input in graph.inputs:
+                if model_input.type in SCALAR_INPUT_TYPES:
+                    value = repr(model_input.default)
+                else:
+                    value = repr(model_input.default or model_input.name)
+                lines.append(f"{_identifier(model_input.name)} = {value}")
+            lines.append("")
+
+        lines.append("results = {}")
+        lines.append("")
+        lines.extend(body)
+
+        if graph.outputs:
+            lines.append("# Model outputs")
+            for output in graph.outputs:
+                lines.append(
+                    f'{_identifier(output.name)} = '
+                    f'results["{_identifier(output.source)}"]["{output.output}"]'
+                )
+
+        return EmitResult(code="\n".join(lines).rstrip() + "\n", unresolved=unresolved)
+
+    # --------------------------------------------------------------------- sql
+
+    def emit_sql(self, graph: WorkflowGraph) -> EmitResult:
+        """PostGIS query with one CTE per step
+
+        Rows are normalised to (attrs jsonb, geom) so attributes survive every
+        step without knowing the table columns.
+        """
+        geom = self.geometry_column
+        inputs = {i.name: i for i in graph.inputs}
+        ctes = []
+        unresolved = []
+
+        layer_inputs = [i for i in graph.inputs if i.type not in SCALAR_INPUT_TYPES]
+        # OCR/vision graphs may reference inputs that were not declared
+        declared = {i.name for i in layer_inputs}
+        for edge in graph.edges:
+            if edge.source not in declared and edge.source not in inputs and not graph.get_step(edge.source):
+                declared.add(edge.source)
+                layer_inputs.append(WorkflowInput(name=edge.source))
+        for model_input in layer_inputs:
+            table = model_input.default if isinstance(model_input.default, str) else model_input.name
+            ctes.append(
+                f"{self._cte_name(model_input.name)} AS (\n"
+                f"    SELECT to_jsonb(t) - '{geom}' AS attrs, t.{geom} AS geom FROM {table} t\n"
+                f")"
+            )
+
+        for step in graph.ordered_steps():
+            body = self._sql_step(graph, step, inputs)
+            name = self._cte_name(step.id)
+            if body is None:
+                unresolved.append(step.id)
+                first = next(iter(self._layer_refs(graph, step)), None)
+                fallback = f"SELECT attrs, geom FROM {first}" if first else "SELECT NULL::jsonb AS attrs, NULL::geometry AS geom"
+                body = f"-- TODO({step.id}): implement '{step.algorithm}'\n    {fallback}"
+            title = f"{step.label} ({step.algorithm})" if step.label else step.algorithm
+            ctes.append(f"{name} AS (\n    -- {title}\n    {body}\n)")
+
+        final_sources = [o.source for o in graph.outputs if graph.get_step(o.source)]
+        if not final_sources and graph.steps:
+            final_sources = [graph.ordered_steps()[-1].id]
+
+        lines = [f"-- Generated from QGIS model: {graph.name}"]
+        if ctes:
+            lines.append("WITH " + ",\n".join(ctes))
+        if final_sources:
+            lines.append(
+                "\nUNION ALL\n".join(
+                    f"SELECT attrs, geom FROM {self._cte_name(s)}" for s in dict.fromkeys(final_sources)
+                ) + ";"
+            )
+        return EmitResult(code="\n".join(lines) + "\n", unresolved=unresolved)
+
+    def _cte_name(self, name: str) -> str:
+        return _identifier(name)
+
+    def _layer_refs(self, graph: WorkflowGraph, step: WorkflowStep, parameter: str = None) -> List[str]:
+        """CTE names feeding the step's layer parameters"""
+        refs = []
+        for edge in graph.incoming(step.id):
+            if parameter and edge.parameter != parameter:
+                continue
+            source_input = next((i for i in graph.inputs if i.name == edge.source), None)
+            if source_input is not None and source_input.type in SCALAR_INPUT_TYPES:
+                continue
+            refs.append(self._cte_name(edge.source))
+        return refs
+
+    def _param(self, graph: WorkflowGraph, step: WorkflowStep, inputs: Dict, name: str) -> Any:
+        """Static parameter value, scalar model input default, or algorithm default"""
+        if name in step.parameters:
+            return step.parameters[name]
+        for edge in graph.incoming(step.id):
+            if edge.parameter == name and edge.source in inputs:
+                return inputs[edge.source].default
+        return ALGORITHM_DEFAULTS.get(canonical_algorithm(step.algorithm), {}).get(name)
+
+    def _sql_step(self, graph: WorkflowGraph, step: WorkflowStep, inputs: Dict) -> Optional[str]:
+        """SELECT body for one step, None if it has no template"""
+        algorithm = canonical_algorithm(step.algorithm)
+        if algorithm not in ALGORITHM_DEFAULTS:
+            return None
+
+        def param(name):
+            return self._param(graph, step, inputs, name)
+
+        def layer(name):
+            refs = self._layer_refs(graph, step, name)
+            return refs[0] if refs else None
+
+        source = layer("INPUT")
+        if algorithm == "native:mergevectorlayers":
+            refs = self._layer_refs(graph, step, "LAYERS")
+            if not refs:
+                return None
+            return "\n    UNION ALL\n    ".join(f"SELECT attrs, geom FROM {r}" for r in refs)
+        if source is None:
+            return None
+
+        if algorithm == "native:buffer":
+            distance = param("DISTANCE")
+            if isinstance(distance, dict) or distance is None:
+                return None
+            if param("DISSOLVE"):
+                return f"SELECT '{{}}'::jsonb AS attrs, ST_Union(ST_Buffer(geom, {distance})) AS geom FROM {source}"
+            return f"SELECT attrs, ST_Buffer(geom, {distance}) AS geom FROM {source}"
+
+        if algorithm in ("native:centroids", "native:convexhull", "native:fixgeometries"):
+            func = {
+                "native:centroids": "ST_Centroid",
+                "native:convexhull": "ST_ConvexHull",
+                "native:fixgeometries": "ST_MakeValid",
+            }[algorithm]
+            return f"SELECT attrs, {func}(geom) AS geom FROM {source}"
+
+        if algorithm == "native:simplifygeometries":
+            tolerance = param("TOLERANCE")
+            if not isinstance(tolerance, (int, float)):
+                return None
+            return f"SELECT attrs, ST_Simplify(geom, {tolerance}) AS geom FROM {source}"
+
+        if algorithm == "native:reprojectlayer":
+            match = re.search(r"(\d+)", str(param("TARGET_CRS") or ""))
+            if not match:
+                return None
+            return f"SELECT attrs, ST_Transform(geom, {match.group(1)}) AS geom FROM {source}"
+
+        if algorithm == "native:dissolve":
+            fields = [f for f in (param("FIELD") or []) if isinstance(f, str)]
+            if isinstance(param("FIELD"), str) and param("FIELD"):
+                fields = [param("FIELD")]
+            if not fields:
+                return f"SELECT '{{}}'::jsonb AS attrs, ST_Union(geom) AS geom FROM {source}"
+            keys = ", ".join(f"{_sql_literal(f)}, attrs->{_sql_literal(f)}" for f in fields)
+            group = ", ".join(f"attrs->{_sql_literal(f)}" for f in fields)
+            return f"SELECT jsonb_build_object({keys}) AS attrs, ST_Union(geom) AS geom FROM {source} GROUP BY {group}"
+
+        if algorithm == "native:extractbyattribute":
+            field_name, operator, value = param("FIELD"), param("OPERATOR"), param("VALUE")
+            if not field_name or operator not in ATTRIBUTE_OPERATORS:
+                return None
+            column = f"attrs->>{_sql_literal(field_name)}"
+            try:
+                float(value)
+                column, literal = f"({column})::numeric", str(value)
+            except (TypeError, ValueError):
+                literal = _sql_literal(value)
+            return f"SELECT attrs, geom FROM {source} WHERE {column} {ATTRIBUTE_OPERATORS[operator]} {literal}"
+
+        overlay_param = {
+            "native:clip": "OVERLAY",
+            "native:intersection": "OVERLAY",
+            "native:difference": "OVERLAY",
+            "native:joinattributesbylocation": "JOIN",
+            "native:extractbylocation": "INTERSECT",
+        }[algorithm]
+        overlay = layer(overlay_param)
+        if overlay is None:
+            return None
+
+        if algorithm == "native:clip":
+            return (
+                f"SELECT a.attrs, ST_Intersection(a.geom, o.geom) AS geom FROM {source} a\n"
+                f"    JOIN (SELECT ST_Union(geom) AS geom FROM {overlay}) o ON ST_Intersects(a.geom, o.geom)"
+            )
+        if algorithm == "native:intersection":
+            return (
+                f"SELECT a.attrs || b.attrs AS attrs, ST_Intersection(a.geom, b.geom) AS geom FROM {source} a\n"
+                f"    JOIN {overlay} b ON ST_Intersects(a.geom, b.geom)"
+            )
+        if algorithm == "native:difference":
+            return (
+                f"SELECT a.attrs, COALESCE(ST_Difference(a.geom, o.geom), a.geom) AS geom FROM {source} a\n"
+                f"    LEFT JOIN (SELECT ST_Union(geom) AS geom FROM {overlay}) o ON ST_Intersects(a.geom, o.geom)"
+            )
+
+        predicates = param("PREDICATE")
+        predicates = [p for p in (predicates if isinstance(predicates, list) else [predicates]) if p is not None]
+        mapping = EXTRACT_PREDICATES if algorithm == "native:extractbylocation" else JOIN_PREDICATES
+        if not predicates or any(p not in mapping for p in predicates):
+            return None
+
+        if algorithm == "native:extractbylocation":
+            functions = [mapping[p] for p in predicates if p != DISJOINT]
+            conditions = []
+            if functions:
+                condition = " OR ".join(f"{f}(a.geom, b.geom)" for f in functions)
+                conditions.append(f"EXISTS (SELECT 1 FROM {overlay} b WHERE {condition})")
+            if DISJOINT in predicates:
+                conditions.append(f"NOT EXISTS (SELECT 1 FROM {overlay} b WHERE ST_Intersects(a.geom, b.geom))")
+            return (
+                f"SELECT a.attrs, a.geom FROM {source} a\n"
+                f"    WHERE {' OR '.join(conditions)}"
+            )
+
+        condition = " OR ".join(f"{mapping[p]}(a.geom, b.geom)" for p in predicates)
+
+        # native:joinattributesbylocation (one-to-many)
+        join = "JOIN" if param("DISCARD_NONMATCHING") else "LEFT JOIN"
+        return (
+            f"SELECT a.attrs || COALESCE(b.attrs, '{{}}'::jsonb) AS attrs, a.geom FROM {source} a\n"
+            f"    {join} {overlay} b ON {condition}"
+        )
@@ -0,0 +1,216 @@
+"""
+Workflow Graph - Intermediate representation of a QGIS Model Builder workflow
+
+The graph is extracted once (from an image, OCR output or a model file) and
+then reused for every code target, so no extraction work is repeated.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class WorkflowInput:
+    """Model input (layer, field, number...)"""
+    name: str
+    type: str = "vector"
+    description: str = ""
+    default: Any = None
+
+
+@dataclass
+class WorkflowStep:
+    """Processing step (one algorithm call)"""
+    id: str
+    algorithm: str
+    label: str = ""
+    parameters: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class WorkflowEdge:
+    """Connection from an input or step output to a step parameter"""
+    source: str
+    target: str
+    output: str = "OUTPUT"
+    parameter: str = "INPUT"
+
+
+@dataclass
+class WorkflowOutput:
+    """Final model output"""
+    name: str
+    source: str
+    output: str = "OUTPUT"
+
+
+@dataclass
+class WorkflowGraph:
+    """Structured model: inputs, algorithms, parameters and edges"""
+    name: str = "model"
+    inputs: List[WorkflowInput] = field(default_factory=list)
+    steps: List[WorkflowStep] = field(default_factory=list)
+    edges: List[WorkflowEdge] = field(default_factory=list)
+    outputs: List[WorkflowOutput] = field(default_factory=list)
+    source: str = "unknown"
+    # "provider/model" of the vision model that produced the graph
+    extracted_by: str = ""
+    notes: str = ""
+
+    def is_empty(self) -> bool:
+        """True when nothing usable was extracted"""
+        return not self.steps and not self.inputs
+
+    def get_step(self, step_id: str) -> Optional[WorkflowStep]:
+        """Find a step by id"""
+        for step in self.steps:
+            if step.id == step_id:
+                return step
+        return None
+
+    def incoming(self, step_id: str) -> List[WorkflowEdge]:
+        """Edges feeding the given step"""
+        return [e for e in self.edges if e.target == step_id]
+
+    def ordered_steps(self) -> List[WorkflowStep]:
+        """Steps in dependency order (Kahn's algorithm, stable on ties)"""
+        step_ids = [s.id for s in self.steps]
+        pending = {
+            sid: {e.source for e in self.edges if e.target == sid and e.source in step_ids}
+            for sid in step_ids
+        }
+        ordered = []
+        while pending:
+            ready = [sid for sid in step_ids if sid in pending and not pending[sid]]
+            if not ready:
+                # Cycle or dangling reference - keep remaining steps in declared order
+                ready = [sid for sid in step_ids if sid in pending]
+            for sid in ready:
+                del pending[sid]
+                for deps in pending.values():
+                    deps.discard(sid)
+                ordered.append(self.get_step(sid))
+        return ordered
+
+    def to_dict(self) -> Dict:
+        """Serialize to plain dict"""
+        return asdict(self)
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        """Serialize to JSON"""
+        return json.dumps(self.to_dict(), indent=indent, default=str)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "WorkflowGraph":
+        """Build graph from a dict, tolerating missing or extra keys"""
+        def _items(key):
+            value = data.get(key) or []
+            return [v for v in value if isinstance(v, dict)]
+
+        inputs = [
+            WorkflowInput(
+                name=str(i.get("name", "")),
+                type=str(i.get("type", "vector")),
+                description=str(i.get("description", "")),
+                default=i.get("default"),
+            )
+            for i in _items("inputs")
+        ]
+        steps = []
+        for index, s in enumerate(_items("steps"), 1):
+            params = s.get("parameters") or {}
+            steps.append(
+                WorkflowStep(
+                    id=str(s.get("id") or f"step_{index}"),
+                    algorithm=str(s.get("algorithm", "")),
+                    label=str(s.get("label", "")),
+                    parameters=params if isinstance(params, dict) else {},
+                )
+            )
+        edges = [
+            WorkflowEdge(
+                source=str(e.get("source", "")),
+                target=str(e.get("target", "")),
+                # Empty output means the source is a model input, not a step
+                output="" if e.get("output") == "" else str(e.get("output") or "OUTPUT"),
+                parameter=str(e.get("parameter") or "INPUT"),
+            )
+            for e in _items("edges")
+        ]
+        outputs = [
+            WorkflowOutput(
+                name=str(o.get("name", "")),
+                source=str(o.get("source", "")),
+                output=str(o.get("output") or "OUTPUT"),
+            )
+            for o in _items("outputs")
+        ]
+        return cls(
+            name=str(data.get("name") or "model"),
+            inputs=inputs,
+            steps=steps,
+            edges=edges,
+            outputs=outputs,
+            source=str(data.get("source") or "unknown"),
+            extracted_by=str(data.get("extracted_by") or ""),
+            notes=str(data.get("notes") or ""),
+        )
+
+    @classmethod
+    def from_json(cls, text: str) -> "WorkflowGraph":
+        """Build graph from JSON text"""
+        return cls.from_dict(json.loads(text))
+
+    @classmethod
+    def from_llm_response(cls, content: str) -> Optional["WorkflowGraph"]:
+        """Parse the JSON object embedded in an LLM response, None if absent"""
+        if not content:
+            return None
+
+        candidates = re.findall(r"```(?:json)?\s*\n?(.*?)\n?```", content, re.DOTALL)
+        start, end = content.find("{"), content.rfind("}")
+        if start != -1 and end > start:
+            candidates.append(content[start : end + 1])
+
+        for candidate in candidates:
+            try:
+                data = json.loads(candidate)
+            except (ValueError, TypeError):
+                continue
+            if isinstance(data, dict):
+                return cls.from_dict(data)
+        return None
+
+    def to_prompt(self) -> str:
+        """Compact textual description used for text-only code generation"""
+        lines = [f"MODEL: {self.name}"]
+
+        if self.inputs:
+            lines.append("INPUTS:")
+            for i in self.inputs:
+                desc = f" - {i.description}" if i.description else ""
+                default = f" = {i.default!r}" if i.default is not None else ""
+                lines.append(f"  - {i.name} ({i.type}){default}{desc}")
+
+        if self.steps:
+            lines.append("STEPS (in execution order):")
+            for step in self.ordered_steps():
+                label = f" [{step.label}]" if step.label else ""
+                lines.append(f"  - {step.id}: {step.algorithm}{label}")
+                for key, value in step.parameters.items():
+                    lines.append(f"      {key} = {value!r}")
+                for edge in self.incoming(step.id):
+                    ref = f"{edge.source}.{edge.output}" if edge.output else edge.source
+                    lines.append(f"      {edge.parameter} <- {ref}")
+
+        if self.outputs:
+            lines.append("OUTPUTS:")
+            for o in self.outputs:
+                lines.append(f"  - {o.name} <- {o.source}.{o.output}")
+
+        if self.notes:
+            lines.append(f"NOTES: {self.notes}")
+
+        return "\n".join(lines)
@@ -0,0 +1,181 @@
+"""
+Model3 Parser - Deterministic WorkflowGraph extraction from QGIS .model3 files
+
+A .model3 file is the XML serialisation of a QgsProcessingModelAlgorithm
+(nested <Option> Map/List elements), so the algorithm graph can be read
+exactly without any OCR or vision model.
+"""
+
+import xml.etree.ElementTree as ET
+from typing import Any, List, Optional
+
+from .graph import WorkflowGraph, WorkflowInput, WorkflowStep, WorkflowEdge, WorkflowOutput
+
+# QgsProcessingModelChildParameterSource::Source
+SOURCE_MODEL_PARAMETER = 0
+SOURCE_CHILD_OUTPUT = 1
+SOURCE_STATIC_VALUE = 2
+SOURCE_EXPRESSION = 3
+SOURCE_EXPRESSION_TEXT = 4
+SOURCE_MODEL_OUTPUT = 5
+
+# Parameter types that are model outputs, not inputs
+DESTINATION_TYPES = {
+    "sink",
+    "vectorDestination",
+    "rasterDestination",
+    "fileDestination",
+    "folderDestination",
+    "pointcloudDestination",
+    "vectorTileDestination",
+}
+
+
+class Model3ParseError(ValueError):
+    """Raised when a file is not a readable QGIS model"""
+
+
+def _option_value(element: ET.Element) -> Any:
+    """Convert an <Option> element to a Python value"""
+    option_type = element.get("type", "")
+
+    if option_type == "Map":
+        return {
+            child.get("name"): _option_value(child)
+            for child in element
+            if child.tag == "Option" and child.get("name") is not None
+        }
+    if option_type in ("List", "StringList"):
+        return [_option_value(child) for child in element if child.tag == "Option"]
+
+    value = element.get("value")
+    if value is None or option_type == "invalid":
+        return None
+    if option_type == "bool":
+        return value.lower() == "true"
+    if option_type in ("int", "uint", "qlonglong", "qulonglong"):
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    if option_type == "double":
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _as_list(value: Any) -> List:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def parse_model3(text: str) -> WorkflowGraph:
+    """Parse .model3 XML text into a WorkflowGraph"""
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError as e:
+        raise Model3ParseError(f"Invalid model XML: {e}")
+
+    if root.tag != "Option":
+        root = root.find("Option")
+    if root is None:
+        raise Model3ParseError("No model definition found")
+
+    model = _option_value(root)
+    if not isinstance(model, dict) or "children" not in model:
+        raise Model3ParseError("File is not a QGIS Processing model")
+
+    graph = WorkflowGraph(name=model.get("model_name") or "model", source="model3")
+    if model.get("model_group"):
+        graph.notes = f"Group: {model['model_group']}"
+
+    for name, definition in (model.get("parameterDefinitions") or {}).items():
+        definition = definition or {}
+        param_type = definition.get("parameter_type", "")
+        if param_type in DESTINATION_TYPES:
+            continue
+        graph.inputs.append(
+            WorkflowInput(
+                name=definition.get("name") or name,
+                type=param_type or "vector",
+                description=definition.get("description", ""),
+                default=definition.get("default"),
+            )
+        )
+
+    for child_id, child in (model.get("children") or {}).items():
+        child = child or {}
+        if child.get("active") is False:
+            continue
+        step_id = child.get("id") or child_id
+        step = WorkflowStep(
+            id=step_id,
+            algorithm=child.get("alg_id", ""),
+            label=child.get("component_description", ""),
+        )
+
+        for param_name, sources in (child.get("params") or {}).items():
+            static_values = []
+            for source in _as_list(sources):
+                if not isinstance(source, dict):
+                    continue
+                kind = source.get("source")
+                if kind == SOURCE_MODEL_PARAMETER:
+                    graph.edges.append(
+                        WorkflowEdge(
+                            source=source.get("parameter_name", ""),
+                            target=step_id,
+                            output="",
+                            parameter=param_name,
+                        )
+                    )
+                elif kind == SOURCE_CHILD_OUTPUT:
+                    graph.edges.append(
+                        WorkflowEdge(
+                            source=source.get("child_id", ""),
+                            target=step_id,
+                            output=source.get("output_name") or "OUTPUT",
+                            parameter=param_name,
+                        )
+                    )
+                elif kind == SOURCE_STATIC_VALUE:
+                    static_values.append(source.get("static_value"))
+                elif kind == SOURCE_EXPRESSION:
+                    static_values.append({"expression": source.get("expression", "")})
+                elif kind == SOURCE_EXPRESSION_TEXT:
+                    static_values.append({"expression_text": source.get("expression_text", "")})
+                elif kind == SOURCE_MODEL_OUTPUT:
+                    static_values.append({"model_output": source.get("output_name", "")})
+
+            if static_values:
+                step.parameters[param_name] = (
+                    static_values[0] if len(static_values) == 1 else static_values
+                )
+
+        for output_key, output in (child.get("outputs") or {}).items():
+            output = output or {}
+            graph.outputs.append(
+                WorkflowOutput(
+                    name=output.get("name") or output_key,
+                    source=step_id,
+                    output=output.get("output_name") or "OUTPUT",
+                )
+            )
+
+        graph.steps.append(step)
+
+    return graph
+
+
+def parse_model3_file(path: str) -> WorkflowGraph:
+    """Read and parse a .model3 file"""
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_model3(f.read())
+
+
+def is_model_file(path: Optional[str]) -> bool:
+    """True for QGIS Processing model files"""
+    return bool(path) and path.lower().endswith(".model3")
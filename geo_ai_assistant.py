@@ -16,7 +16,8 @@ from .modules.error_fixer import ErrorFixer
 from .modules.smart_assistant import SmartAssistant
 from .ui.main_window import MainWindow
 from .infrastructure.config.config_manager import ConfigManager
-from .infrastructure.logging.logger import get_logger
+from .services.metrics_service import get_metrics_service
+from .infrastructure.logging.logger import get_logger, shutdown_logging
 
 logger = get_logger(__name__)
 
@@ -134,6 +135,8 @@ class GeoAIAssistant:
                 self.smart_assistant
             )
             self.iface.addDockWidget(Qt.RightDockWidgetArea, self.main_window)
+        else:
+            self.main_window.model_selector.warm_up_model()
         
         self.main_window.show()
         logger.info("Main window opened")
@@ -161,9 +164,15 @@ class GeoAIAssistant:
             self.iface.removeToolBarIcon(action)
         
         if self.main_window:
+            self.main_window.model_selector.shutdown()
             self.iface.removeDockWidget(self.main_window)
             self.main_window.deleteLater()
             self.main_window = None
+
+        if self.llm_handler:
+            self.llm_handler.close()
+        get_metrics_service().close()
         
         del self.toolbar
         logger.info("Plugin unloaded")
+        shutdown_logging()
@@ -1,15 +1,46 @@
 """
 Structured logging system
+
+Records are handed to a queue and written by a background listener thread,
+so a log call on a hot path costs a level check plus an enqueue instead of a
+synchronous QgsMessageLog round-trip to the GUI thread. Large messages are
+cut down before they are queued, and DEBUG records repeated from the same
+call site (per-table discovery, per-row parsing) are rate-limited.
+
+Settings (.env):
+    GEOAI_LOG_LEVEL      DEBUG / INFO / WARNING / ERROR (default INFO,
+                         DEBUG when DEBUG_MODE=true)
+    GEOAI_LOG_MAX_CHARS  longest message kept intact (default 2000)
+    GEOAI_LOG_DEBUG_RATE DEBUG records kept per call site every 10 s
+                         (default 20, 0 keeps all)
+    GEOAI_LOG_FILE       optional rotating log file
+    GEOAI_LOG_MAX_BYTES  size at which the file rotates (default 5 MB)
+    GEOAI_LOG_BACKUPS    rotated files kept (default 3)
 """
 
+import atexit
 import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from qgis.core import QgsMessageLog, Qgis
 
+try:
+    from dotenv import load_dotenv
+    load_dotenv(Path(__file__).resolve().parents[2] / ".env")
+except ImportError:
+    pass
+
+LOG_FORMAT = '%(name)s - %(levelname)s - %(message)s'
+FILE_LOG_FORMAT = '%(asctime)s - %(threadName)s - %(name)s - %(levelname)s - %(message)s'
+
 
 class QGISLogHandler(logging.Handler):
     """Custom handler that logs to QGIS message log"""
-    
+
     def emit(self, record):
         log_entry = self.format(record)
         level = Qgis.Info
@@ -17,23 +48,162 @@ class QGISLogHandler(logging.Handler):
             level = Qgis.Critical
         elif record.levelno >= logging.WARNING:
             level = Qgis.Warning
-        
+
         QgsMessageLog.logMessage(log_entry, "GeoAI Pro", level)
 
 
+class TruncatingQueueHandler(QueueHandler):
+    """Queue handler that renders and shortens the message in the caller
+
+    The message is rendered here because its arguments may be mutated once
+    the call returns; anything longer than ``max_chars`` keeps its head and
+    tail. DEBUG records beyond ``debug_rate`` per call site and ``window``
+    seconds are dropped; the next one kept says how many were skipped.
+    Formatting with the final layout happens on the listener thread.
+    """
+
+    def __init__(self, log_queue, max_chars: int = 2000, debug_rate: int = 20,
+                 window: float = 10.0):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+        self.debug_rate = debug_rate
+        self.window = window
+        self._window_start = time.monotonic()
+        # (logger, line, template) -> [kept, dropped] in the current window
+        self._sites = {}
+        self._sites_lock = threading.Lock()
+
+    def _sample(self, record) -> int:
+        """Records dropped at this call site since the last one kept, -1 to drop this one"""
+        if not self.debug_rate or record.levelno > logging.DEBUG:
+            return 0
+        key = (record.name, record.lineno, record.msg if isinstance(record.msg, str) else "")
+        with self._sites_lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.window:
+                self._window_start = now
+                # Carry only the drop counts over so they are still reported
+                self._sites = {k: [0, v[1]] for k, v in self._sites.items() if v[1]}
+            site = self._sites.setdefault(key, [0, 0])
+            if site[0] >= self.debug_rate:
+                site[1] += 1
+                return -1
+            site[0] += 1
+            dropped, site[1] = site[1], 0
+            return dropped
+
+    def emit(self, record):
+        dropped = self._sample(record)
+        if dropped < 0:
+            return
+        record.dropped_similar = dropped
+        super().emit(record)
+
+    def prepare(self, record):
+        message = record.getMessage()
+        if self.max_chars and len(message) > self.max_chars:
+            keep = self.max_chars // 2
+            message = (
+                f"{message[:keep]} ... [{len(message) - 2 * keep} chars omitted] ... "
+                f"{message[-keep:]}"
+            )
+        dropped = getattr(record, "dropped_similar", 0)
+        if dropped:
+            message = f"{message} [{dropped} similar debug messages skipped]"
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            # Tracebacks can't cross the queue; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _int_env(name: str, default: int) -> int:
+    value = os.getenv(name, "")
+    return int(value) if value.isdigit() else default
+
+
+def log_level() -> int:
+    """Configured level (GEOAI_LOG_LEVEL, DEBUG_MODE)"""
+    name = os.getenv("GEOAI_LOG_LEVEL")
+    if not name:
+        name = "DEBUG" if os.getenv("DEBUG_MODE", "false").lower() == "true" else "INFO"
+    level = logging.getLevelName(name.upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
+_queue_handler = None
+_listener = None
+_loggers = set()
+_lock = threading.Lock()
+
+
+def _shared_handler() -> QueueHandler:
+    """Queue handler shared by all plugin loggers; starts the listener once"""
+    global _queue_handler, _listener
+    with _lock:
+        if _queue_handler is None:
+            qgis_handler = QGISLogHandler()
+            qgis_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            handlers = [qgis_handler]
+
+            log_file = os.getenv("GEOAI_LOG_FILE")
+            if log_file:
+                try:
+                    Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+                    file_handler = RotatingFileHandler(
+                        log_file,
+                        maxBytes=_int_env("GEOAI_LOG_MAX_BYTES", 5 * 1024 * 1024),
+                        backupCount=_int_env("GEOAI_LOG_BACKUPS", 3),
+                        encoding="utf-8",
+                    )
+                    file_handler.setFormatter(logging.Formatter(FILE_LOG_FORMAT))
+                    handlers.append(file_handler)
+                except OSError as e:
+                    QgsMessageLog.logMessage(
+                        f"Could not open log file {log_file}: {e}", "GeoAI Pro", Qgis.Warning
+                    )
+
+            log_queue = queue.SimpleQueue()
+            _queue_handler = TruncatingQueueHandler(
+                log_queue,
+                _int_env("GEOAI_LOG_MAX_CHARS", 2000),
+                _int_env("GEOAI_LOG_DEBUG_RATE", 20),
+            )
+            _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            _listener.start()
+        return _queue_handler
+
+
+def shutdown_logging():
+    """Write out queued records and stop the listener thread"""
+    global _queue_handler, _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+        # Detached so a reloaded plugin configures its loggers afresh
+        for name in _loggers:
+            logging.getLogger(name).removeHandler(_queue_handler)
+        _loggers.clear()
+        _listener = None
+        _queue_handler = None
+
+
+atexit.register(shutdown_logging)
+
+
 def get_logger(name: str) -> logging.Logger:
     """Get a logger instance"""
     logger = logging.getLogger(name)
-    
+
     if not logger.handlers:
-        logger.setLevel(logging.INFO)
-        
-        # QGIS handler
-        qgis_handler = QGISLogHandler()
-        qgis_handler.setFormatter(
-            logging.Formatter('%(name)s - %(levelname)s - %(message)s')
-        )
-        logger.addHandler(qgis_handler)
-    
-    return logger
+        logger.setLevel(log_level())
+        logger.addHandler(_shared_handler())
+        _loggers.add(name)
+        # Records are delivered by the listener; don't repeat them via the root logger
+        logger.propagate = False
 
+    return logger
@@ -0,0 +1,7 @@
+"""
+Tracing system
+"""
+
+from .tracer import Span, Tracer, get_tracer, span
+
+__all__ = ["Span", "Tracer", "get_tracer", "span"]
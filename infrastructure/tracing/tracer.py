@@ -0,0 +1,203 @@
+"""
+Tracing - Lightweight spans exported in Chrome trace format
+
+Spans nest per thread (a span opened inside another becomes its child) and
+can be linked across threads by passing ``parent``. Finished spans are
+written as complete ("X") events to a JSON file that opens in
+chrome://tracing or https://ui.perfetto.dev. The file is rewritten by a
+background thread after a root span (one without a parent) finishes, so
+several roots finishing close together cost one write.
+
+Disabled by default (GEOAI_TRACE=true enables it); a disabled span is a
+shared no-op object, so instrumented code pays one attribute check.
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from ..logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+class Span:
+    """One timed operation"""
+
+    __slots__ = ("tracer", "name", "category", "args", "span_id", "parent_id", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, args: Dict,
+                 parent: Optional["Span"] = None):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.span_id = next(tracer._ids)
+        self.parent_id = parent.span_id if parent else None
+        self.start = 0.0
+
+    def set(self, **args):
+        """Attach attributes (rows, tokens, model...) to the span"""
+        self.args.update(args)
+        return self
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if self.parent_id is None and stack:
+            self.parent_id = stack[-1].span_id
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._finish(self, end)
+        return False
+
+
+class _NoopSpan:
+    """Returned while tracing is disabled"""
+
+    span_id = None
+    parent_id = None
+
+    def set(self, **args):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Collects spans and writes them as a Chrome trace"""
+
+    def __init__(self, enabled: bool = False, path: str = None, max_events: int = 20000):
+        self.enabled = enabled
+        self.path = path or os.path.join(PLUGIN_DIR, "traces", "trace.json")
+        self._events = deque(maxlen=max_events)
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._epoch = time.perf_counter()
+        self._pid = os.getpid()
+        self._export_lock = threading.Lock()
+        self._export_pending = threading.Event()
+        self._exporter: Optional[threading.Thread] = None
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name: str, category: str = "geoai", parent: Span = None, **args):
+        """Context manager timing a block; no-op while tracing is disabled"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, category, args, parent)
+
+    def current_span(self) -> Optional[Span]:
+        """Innermost open span of this thread (to pass as ``parent`` to workers)"""
+        if not self.enabled:
+            return None
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def _finish(self, span: Span, end: float):
+        args = dict(span.args, span_id=span.span_id)
+        if span.parent_id is not None:
+            args["parent_id"] = span.parent_id
+        event = {
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": (span.start - self._epoch) * 1e6,
+            "dur": (end - span.start) * 1e6,
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+            "args": {k: v if isinstance(v, (int, float, bool, str)) or v is None else str(v)
+                     for k, v in args.items()},
+        }
+        with self._lock:
+            self._events.append(event)
+            # Worker spans linked with ``parent`` are not roots even on an empty stack
+            if span.parent_id is None:
+                self._schedule_export()
+
+    def _schedule_export(self):
+        """Wake the exporter thread (called with _lock held)"""
+        self._export_pending.set()
+        if self._exporter is None:
+            self._exporter = threading.Thread(
+                target=self._export_loop, name="geoai-trace-export", daemon=True
+            )
+            self._exporter.start()
+
+    def _export_loop(self):
+        while True:
+            self._export_pending.wait()
+            self._export_pending.clear()
+            self.export()
+
+    def export(self, path: str = None) -> Optional[str]:
+        """Write all buffered spans to the trace file"""
+        path = path or self.path
+        with self._lock:
+            events = list(self._events)
+        thread_names = [
+            {"name": "thread_name", "ph": "M", "pid": self._pid, "tid": t.ident,
+             "args": {"name": t.name}}
+            for t in threading.enumerate() if t.ident is not None
+        ]
+        # Write a temp file and swap it in so readers never see a partial trace
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._export_lock:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp_path, "w") as f:
+                    json.dump({"traceEvents": thread_names + events, "displayTimeUnit": "ms"}, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Could not write trace file: {e}")
+                return None
+        return path
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+
+_tracer = None
+
+
+def get_tracer() -> Tracer:
+    """Shared tracer configured from GEOAI_TRACE / GEOAI_TRACE_FILE"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(
+            enabled=os.getenv("GEOAI_TRACE", "false").lower() in ("1", "true", "yes"),
+            path=os.getenv("GEOAI_TRACE_FILE") or None,
+        )
+    return _tracer
+
+
+def span(name: str, category: str = "geoai", parent: Span = None, **args):
+    """Shortcut for get_tracer().span(...)"""
+    return get_tracer().span(name, category, parent, **args)
@@ -0,0 +1,156 @@
+"""
+Cost Gate - Checks the planner's estimate before generated SQL is executed
+
+A read-only query is explained first (EXPLAIN (FORMAT JSON)); above the
+configured row/cost thresholds it is, depending on SQL_COST_GATE:
+    off     executed as is, no EXPLAIN
+    warn    executed; the result carries a warning and the plan
+    limit   executed with a LIMIT appended when too many rows are estimated
+    refuse  not executed; the error carries the plan
+"""
+
+import json
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+from ..core.sql import mask_literals, split_statements
+from ..services.result_cache_service import normalize_sql, is_write
+
+MODES = ("off", "warn", "limit", "refuse")
+# Joins whose filter calls one of these without an index condition are
+# the classic runaway spatial cross join
+SPATIAL_FUNCTIONS_RE = re.compile(r"st_(distance|dwithin|intersects|contains|within|touches)", re.IGNORECASE)
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def has_limit(sql: str) -> bool:
+    """Top-level LIMIT / FETCH FIRST present"""
+    statement = mask_literals(normalize_sql(sql), blank_identifiers=True)
+    depth = 0
+    top = []
+    for char in statement:
+        depth += char == "("
+        depth -= char == ")"
+        top.append(char if depth == 0 else " ")
+    return bool(re.search(r"\b(limit\s+\d+|fetch\s+(first|next))\b", "".join(top), re.IGNORECASE))
+
+
+def add_limit(sql: str, limit: int) -> str:
+    """SQL with a top-level LIMIT appended"""
+    return f"{normalize_sql(sql)} LIMIT {int(limit)}"
+
+
+def summarize_plan(plan: Dict, depth: int = 0, max_depth: int = 6) -> List[str]:
+    """Indented one-line-per-node description of a JSON plan"""
+    relation = f" on {plan['Relation Name']}" if plan.get("Relation Name") else ""
+    index = f" using {plan['Index Name']}" if plan.get("Index Name") else ""
+    line = (
+        f"{'  ' * depth}{plan.get('Node Type', '?')}{relation}{index} "
+        f"(cost={plan.get('Total Cost', 0):,.0f} rows={plan.get('Plan Rows', 0):,})"
+    )
+    lines = [line]
+    if depth < max_depth:
+        for child in plan.get("Plans", []):
+            lines.extend(summarize_plan(child, depth + 1, max_depth))
+    return lines
+
+
+def plan_hints(plan: Dict) -> List[str]:
+    """Likely causes of an expensive plan"""
+    hints = []
+    node = plan.get("Node Type", "")
+    join_filter = plan.get("Join Filter", "")
+    if node == "Nested Loop" and SPATIAL_FUNCTIONS_RE.search(join_filter):
+        hints.append(
+            "spatial join evaluated row by row - use ST_DWithin/ST_Intersects on indexed geometries"
+        )
+    if node == "Seq Scan" and plan.get("Plan Rows", 0) > 1_000_000:
+        hints.append(f"full scan of {plan.get('Relation Name', 'a large table')}")
+    for child in plan.get("Plans", []):
+        for hint in plan_hints(child):
+            if hint not in hints:
+                hints.append(hint)
+    return hints
+
+
+class CostGate:
+    """Planner-estimate thresholds for generated SQL"""
+
+    def __init__(self, mode: str = None, max_cost: float = None, max_rows: float = None,
+                 auto_limit: int = None):
+        mode = (mode or os.getenv("SQL_COST_GATE", "warn")).lower()
+        self.mode = mode if mode in MODES else "warn"
+        self.max_cost = max_cost if max_cost is not None else _float_env("SQL_MAX_COST", 1_000_000)
+        self.max_rows = max_rows if max_rows is not None else _float_env("SQL_MAX_ROWS", 100_000)
+        self.auto_limit = auto_limit if auto_limit is not None else int(_float_env("SQL_AUTO_LIMIT", 1000))
+
+    def applies_to(self, sql: str) -> bool:
+        """Only single read-only statements are explained"""
+        return self.mode != "off" and not is_write(sql) and len(split_statements(sql)) == 1
+
+    def check(self, sql: str, explain: Callable[[str], Optional[Dict]]) -> Dict:
+        """Decide how to run ``sql``
+
+        ``explain`` returns the root plan node of a statement (None when it
+        cannot be explained). The result holds the ``sql`` to execute and,
+        when a threshold was crossed, ``warning`` / ``plan`` - or ``error``
+        when the query is refused.
+        """
+        if not self.applies_to(sql):
+            return {"sql": sql}
+        plan = explain(sql)
+        if plan is None:
+            # Let the real execution report syntax errors
+            return {"sql": sql}
+
+        cost = plan.get("Total Cost", 0)
+        rows = plan.get("Plan Rows", 0)
+        too_costly = cost > self.max_cost
+        too_many_rows = rows > self.max_rows
+        if not (too_costly or too_many_rows):
+            return {"sql": sql, "estimate": {"cost": cost, "rows": rows}}
+
+        reasons = []
+        if too_costly:
+            reasons.append(f"estimated cost {cost:,.0f} exceeds {self.max_cost:,.0f}")
+        if too_many_rows:
+            reasons.append(f"estimated {rows:,} rows exceed {self.max_rows:,.0f}")
+        plan_text = "\n".join(summarize_plan(plan))
+        hints = plan_hints(plan)
+        message = "; ".join(reasons) + (f" ({'; '.join(hints)})" if hints else "")
+
+        if self.mode == "refuse":
+            return {
+                "error": f"Query refused: {message}.\n\nPlan:\n{plan_text}",
+                "plan": plan_text,
+            }
+
+        if self.mode == "limit" and too_many_rows and not has_limit(sql):
+            limited = add_limit(sql, self.auto_limit)
+            limited_plan = explain(limited) or plan
+            return {
+                "sql": limited,
+                "warning": f"{message} - LIMIT {self.auto_limit} added",
+                "plan": "\n".join(summarize_plan(limited_plan)),
+                "estimate": {"cost": limited_plan.get("Total Cost", 0),
+                             "rows": limited_plan.get("Plan Rows", 0)},
+            }
+
+        return {"sql": sql, "warning": message, "plan": plan_text,
+                "estimate": {"cost": cost, "rows": rows}}
+
+
+def parse_explain_json(value) -> Optional[Dict]:
+    """Root plan node from the single value returned by EXPLAIN (FORMAT JSON)"""
+    try:
+        data = json.loads(value) if isinstance(value, str) else value
+        return data[0]["Plan"]
+    except (TypeError, ValueError, KeyError, IndexError):
+        return None
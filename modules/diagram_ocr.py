@@ -0,0 +1,273 @@
+"""
+Diagram OCR - Offline extraction of Model Builder diagrams (Tesseract + OpenCV)
+
+Detects node boxes and connector lines locally and reads node labels with
+Tesseract, producing a WorkflowGraph that a text-only LLM can convert.
+Both pytesseract and opencv-python are optional dependencies.
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from qgis.core import QgsMessageLog, Qgis
+
+from ..core.workflow import WorkflowGraph, WorkflowInput, WorkflowStep, WorkflowEdge, WorkflowOutput
+
+# Common Model Builder node labels -> processing algorithm ids
+ALGORITHM_LABELS = {
+    "buffer": "native:buffer",
+    "clip": "native:clip",
+    "intersection": "native:intersection",
+    "difference": "native:difference",
+    "union": "native:union",
+    "dissolve": "native:dissolve",
+    "centroids": "native:centroids",
+    "reproject layer": "native:reprojectlayer",
+    "fix geometries": "native:fixgeometries",
+    "extract by attribute": "native:extractbyattribute",
+    "extract by expression": "native:extractbyexpression",
+    "extract by location": "native:extractbylocation",
+    "join attributes by location": "native:joinattributesbylocation",
+    "join attributes by field value": "native:joinattributestable",
+    "field calculator": "native:fieldcalculator",
+    "merge vector layers": "native:mergevectorlayers",
+    "simplify": "native:simplifygeometries",
+    "convex hull": "native:convexhull",
+}
+
+Box = Tuple[int, int, int, int]
+
+# Share of detected boxes whose label must be readable for the graph to be trusted
+MIN_LABELLED_RATIO = 0.6
+
+
+class DiagramOCR:
+    """Local OCR + box/arrow detection for Model Builder screenshots"""
+
+    def __init__(self, min_box_area: int = 1500, endpoint_tolerance: int = 25):
+        self.min_box_area = min_box_area
+        self.endpoint_tolerance = endpoint_tolerance
+        self._available = None
+
+    def is_available(self) -> bool:
+        """Check that pytesseract, OpenCV and the tesseract binary are present"""
+        if self._available is not None:
+            return self._available
+
+        try:
+            import cv2  # noqa: F401
+            import pytesseract
+
+            tesseract_cmd = os.getenv("TESSERACT_CMD")
+            if tesseract_cmd:
+                pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+            pytesseract.get_tesseract_version()
+            self._available = True
+        except Exception as e:
+            QgsMessageLog.logMessage(
+                f"Local OCR not available ({e}). Install with: pip install pytesseract opencv-python "
+                "and the Tesseract binary",
+                "GeoAI",
+                Qgis.Info,
+            )
+            self._available = False
+        return self._available
+
+    def extract_workflow(self, image_path: str) -> Optional[WorkflowGraph]:
+        """Extract nodes and connections from a diagram image, None on failure"""
+        if not self.is_available():
+            return None
+
+        try:
+            import cv2
+
+            image = cv2.imread(image_path)
+            if image is None:
+                return None
+
+            boxes = self._detect_boxes(image)
+            if not boxes:
+                QgsMessageLog.logMessage("Local OCR: no diagram nodes detected", "GeoAI", Qgis.Info)
+                return None
+
+            nodes = []
+            for index, box in enumerate(boxes, 1):
+                label = self._read_label(image, box)
+                if label:
+                    nodes.append({
+                        "id": f"node_{index}",
+                        "box": box,
+                        "label": label,
+                        "kind": self._classify_box(image, box),
+                    })
+
+            connections = self._detect_connections(image, [n["box"] for n in nodes])
+            graph = self._build_graph(nodes, connections)
+
+            QgsMessageLog.logMessage(
+                f"Local OCR extracted {len(graph.inputs)} inputs, {len(graph.steps)} steps, "
+                f"{len(graph.edges)} connections",
+                "GeoAI",
+                Qgis.Info,
+            )
+            if not self._is_reliable(graph, len(boxes), len(nodes)):
+                QgsMessageLog.logMessage(
+                    "Local OCR result too incomplete to use - falling back to the vision model",
+                    "GeoAI",
+                    Qgis.Info,
+                )
+                return None
+            return graph
+
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Local OCR failed: {e}", "GeoAI", Qgis.Warning)
+            return None
+
+    def _is_reliable(self, graph: WorkflowGraph, box_count: int, labelled_count: int) -> bool:
+        """Minimum quality before an OCR graph replaces a vision extraction
+
+        Most boxes must have a readable label, at least one step must map to
+        a known algorithm and a multi-node diagram must have connections.
+        """
+        if not graph.steps or labelled_count < MIN_LABELLED_RATIO * box_count:
+            return False
+        if not any(step.algorithm in ALGORITHM_LABELS.values() for step in graph.steps):
+            return False
+        if len(graph.steps) + len(graph.inputs) > 1 and not graph.edges:
+            return False
+        return True
+
+    def _detect_boxes(self, image) -> List[Box]:
+        """Find rectangular node outlines"""
+        import cv2
+
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        edges = cv2.Canny(gray, 50, 150)
+        edges = cv2.dilate(edges, None, iterations=1)
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        height, width = gray.shape[:2]
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if w * h < self.min_box_area or w * h > 0.5 * width * height:
+                continue
+            # Model Builder nodes are wide, short rectangles
+            if w < h or w > 12 * h:
+                continue
+            boxes.append((x, y, w, h))
+
+        # Reading order keeps node ids stable between runs
+        boxes.sort(key=lambda b: (b[1] // 20, b[0]))
+        return boxes
+
+    def _read_label(self, image, box: Box) -> str:
+        """OCR the text inside a node box"""
+        import cv2
+        import pytesseract
+
+        x, y, w, h = box
+        crop = image[y + 2 : y + h - 2, x + 2 : x + w - 2]
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        text = pytesseract.image_to_string(binary, config="--psm 6")
+        return re.sub(r"\s+", " ", text).strip(" |-_.,")
+
+    def _classify_box(self, image, box: Box) -> str:
+        """Guess node kind from fill colour: inputs are yellow, outputs green"""
+        import cv2
+
+        x, y, w, h = box
+        hsv = cv2.cvtColor(image[y : y + h, x : x + w], cv2.COLOR_BGR2HSV)
+        hue, saturation, _ = [float(v) for v in cv2.mean(hsv)[:3]]
+        if saturation < 40:
+            return "algorithm"
+        if 20 <= hue <= 35:
+            return "input"
+        if 40 <= hue <= 85:
+            return "output"
+        return "algorithm"
+
+    def _detect_connections(self, image, boxes: List[Box]) -> List[Tuple[int, int]]:
+        """Find line segments joining two boxes, returned as (source, target) indexes"""
+        import cv2
+        import numpy as np
+
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        edges = cv2.Canny(gray, 50, 150)
+        # Mask the boxes so only connectors remain
+        for x, y, w, h in boxes:
+            edges[y : y + h, x : x + w] = 0
+
+        segments = cv2.HoughLinesP(
+            edges, 1, np.pi / 180, threshold=30, minLineLength=20, maxLineGap=15
+        )
+        if segments is None:
+            return []
+
+        connections = set()
+        for x1, y1, x2, y2 in (s[0] for s in segments):
+            a = self._nearest_box((x1, y1), boxes)
+            b = self._nearest_box((x2, y2), boxes)
+            if a is None or b is None or a == b:
+                continue
+            # Model Builder flows left-to-right, then top-to-bottom
+            source, target = sorted((a, b), key=lambda i: (boxes[i][0], boxes[i][1]))
+            connections.add((source, target))
+        return sorted(connections)
+
+    def _nearest_box(self, point: Tuple[int, int], boxes: List[Box]) -> Optional[int]:
+        """Index of the box whose border is within tolerance of the point"""
+        px, py = point
+        best, best_distance = None, self.endpoint_tolerance
+        for index, (x, y, w, h) in enumerate(boxes):
+            dx = max(x - px, 0, px - (x + w))
+            dy = max(y - py, 0, py - (y + h))
+            distance = (dx * dx + dy * dy) ** 0.5
+            if distance <= best_distance:
+                best, best_distance = index, distance
+        return best
+
+    def _build_graph(self, nodes: List[Dict], connections: List[Tuple[int, int]]) -> WorkflowGraph:
+        """Turn labelled nodes and connections into a WorkflowGraph"""
+        graph = WorkflowGraph(source="local_ocr")
+
+        has_incoming = set()
+        for source, target in connections:
+            has_incoming.add(nodes[target]["id"])
+
+        for node in nodes:
+            label = node["label"]
+            algorithm = ALGORITHM_LABELS.get(label.lower())
+            kind = node["kind"]
+            if kind == "algorithm" and algorithm is None and node["id"] not in has_incoming:
+                kind = "input"
+
+            if kind == "input":
+                graph.inputs.append(WorkflowInput(name=label))
+            elif kind == "output":
+                graph.outputs.append(WorkflowOutput(name=label, source=""))
+            else:
+                graph.steps.append(
+                    WorkflowStep(id=node["id"], algorithm=algorithm or label, label=label)
+                )
+            node["kind"] = kind
+
+        def _ref(node):
+            return node["label"] if node["kind"] == "input" else node["id"]
+
+        for source, target in connections:
+            src, dst = nodes[source], nodes[target]
+            if dst["kind"] == "output":
+                for output in graph.outputs:
+                    if output.name == dst["label"]:
+                        output.source = _ref(src)
+            elif dst["kind"] == "algorithm":
+                # Two-layer algorithms (clip, intersection...) take a second OVERLAY input
+                parameter = "OVERLAY" if graph.incoming(dst["id"]) else "INPUT"
+                graph.edges.append(
+                    WorkflowEdge(source=_ref(src), target=dst["id"], parameter=parameter)
+                )
+
+        return graph
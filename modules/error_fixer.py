@@ -1,9 +1,29 @@
 """
 Error Fixer - Automatically detect and fix SQL errors with LLM assistance
+
+A failed statement is first looked up in the fix memory (fixes that made
+the same error go away on this schema before), then goes through the local
+rule engine (sql_repair), which fixes identifier errors from the schema
+without a model round-trip; only errors neither can resolve are sent to the
+LLM. Every fix is recorded in the metrics store (kind "fix", name "memory" /
+"rule" / "llm") with whether the fixed SQL then ran, and fixes that end in a
+successful run are added to the memory.
+
+With FIX_CANDIDATES > 1 each LLM round asks for several fixes at once
+(prompt variants, spread over FIX_CANDIDATE_ROUTES when set), dry-runs them
+in parallel with EXPLAIN / a rolled-back transaction and executes the first
+one that validates.
 """
 
-from typing import Dict, List
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
 from qgis.core import QgsMessageLog, Qgis
+from ..infrastructure.tracing import get_tracer, span
+from ..services.fix_memory_service import get_fix_memory, schema_key
+from ..services.metrics_service import get_metrics_service
+from .sql_repair import SqlRepairEngine, error_signature, parse_sql_error
 
 
 class ErrorFixer:
@@ -13,6 +33,17 @@ class ErrorFixer:
         self.llm = llm_handler
         self.sql_executor = sql_executor
         self.max_attempts = 3
+        # Local repairs (memory, rules) are cheap; they don't count against max_attempts
+        self.max_rule_fixes = 5
+        # Candidate fixes requested per LLM round (1 = one at a time)
+        candidates = os.getenv("FIX_CANDIDATES", "1")
+        self.fix_candidates = max(1, int(candidates)) if candidates.isdigit() else 1
+        # Optional "provider:model,provider:model" routes the candidates rotate over
+        self.fix_routes = [
+            tuple(route.strip().split(":", 1))
+            for route in os.getenv("FIX_CANDIDATE_ROUTES", "").split(",")
+            if ":" in route
+        ]
 
     def auto_fix_common_errors(self, sql: str) -> str:
         """Automatically fix common SQL column name errors before execution"""
@@ -77,9 +108,23 @@ class ErrorFixer:
     def execute_with_auto_fix(self, sql: str, layer_name: str = None, 
                               model_provider: str = None, model_name: str = None) -> Dict:
         """Execute SQL with automatic error fixing"""
+        with span("execute_with_auto_fix", layer=layer_name) as trace:
+            result = self._execute_with_auto_fix(sql, layer_name, model_provider, model_name)
+            trace.set(success=result.get("success", False), attempts=result.get("attempts"))
+            return result
 
+    def _execute_with_auto_fix(self, sql: str, layer_name: str = None,
+                               model_provider: str = None, model_name: str = None) -> Dict:
         context = self.sql_executor.get_context()
+        repair_engine = SqlRepairEngine(context)
+        memory = get_fix_memory()
+        table_fields = context.get("table_fields", {})
+        schema = schema_key(table_fields)
+        failures = []  # (error signature, SQL) of each failed attempt
         attempt = 0
+        llm_fixes = 0
+        rule_fixes = 0
+        pending_fix = None  # (source, milliseconds spent producing it) of the SQL being tried
         current_sql = sql
         history = []
 
@@ -89,11 +134,11 @@ class ErrorFixer:
             Qgis.Info
         )
 
-        while attempt < self.max_attempts:
+        while True:
             attempt += 1
 
             QgsMessageLog.logMessage(
-                f"Attempt {attempt}/{self.max_attempts}",
+                f"Attempt {attempt} ({rule_fixes} rule / {llm_fixes} LLM fixes so far)",
                 "GeoAI",
                 Qgis.Info
             )
@@ -104,7 +149,20 @@ class ErrorFixer:
             # Try to execute
             result = self.sql_executor.execute_sql(current_sql, layer_name)
 
+            if pending_fix:
+                get_metrics_service().record(
+                    "fix", pending_fix[0], value=pending_fix[1], success=bool(result.get("success"))
+                )
+
             if result.get("success"):
+                # Each failure is paired with the attempt right after it, so a
+                # fix only learns its own edits, not those made for later errors
+                for i, (signature, failed_sql) in enumerate(failures):
+                    following = failures[i + 1] if i + 1 < len(failures) else (None, current_sql)
+                    if following[0] != signature:
+                        memory.remember(
+                            table_fields, signature, failed_sql, following[1], context.get("db_type")
+                        )
                 QgsMessageLog.logMessage(
                     f"SQL executed successfully on attempt {attempt}",
                     "GeoAI",
@@ -115,7 +173,10 @@ class ErrorFixer:
                     "result": result,
                     "attempts": attempt,
                     "history": history,
-                    "final_sql": current_sql
+                    "final_sql": current_sql,
+                    "fixed_by": pending_fix[0] if pending_fix else None,
+                    "rule_fixes": rule_fixes,
+                    "llm_fixes": llm_fixes,
                 }
 
             # If error, record it
@@ -133,14 +194,56 @@ class ErrorFixer:
                 "error": error
             })
 
-            # If max attempts reached, return failure
-            if attempt >= self.max_attempts:
+            if result.get("cancelled"):
+                break
+
+            parsed = parse_sql_error(error, current_sql, result.get("sqlstate", ""))
+            signature = error_signature(parsed)
+            failures.append((signature, current_sql))
+
+            # Replay a fix that worked before
+            if rule_fixes < self.max_rule_fixes:
+                start = time.perf_counter()
+                remembered = memory.lookup(
+                    schema, signature, current_sql, table_fields, context.get("db_type")
+                )
+                if remembered and all(remembered[0] != entry["sql"] for entry in history):
+                    rule_fixes += 1
+                    pending_fix = ("memory", (time.perf_counter() - start) * 1000)
+                    history[-1]["fix"] = f"memory: {remembered[1]}"
+                    QgsMessageLog.logMessage(
+                        f"Fixed from memory: {remembered[1]}",
+                        "GeoAI",
+                        Qgis.Info
+                    )
+                    current_sql = remembered[0]
+                    continue
+
+            # Then the local rules
+            if rule_fixes < self.max_rule_fixes:
+                start = time.perf_counter()
+                repair = repair_engine.repair(current_sql, parsed)
+                if repair:
+                    rule_fixes += 1
+                    pending_fix = ("rule", (time.perf_counter() - start) * 1000)
+                    history[-1]["fix"] = f"{repair.rule}: {repair.description}"
+                    QgsMessageLog.logMessage(
+                        f"Fixed locally ({repair.rule}): {repair.description}",
+                        "GeoAI",
+                        Qgis.Info
+                    )
+                    current_sql = repair.sql
+                    continue
+
+            # If no LLM attempts are left, return failure
+            if llm_fixes >= self.max_attempts - 1:
                 QgsMessageLog.logMessage(
                     "Max attempts reached, giving up",
                     "GeoAI",
                     Qgis.Critical
                 )
                 break
+            llm_fixes += 1
 
             # Ask LLM to fix
             QgsMessageLog.logMessage(
@@ -149,7 +252,26 @@ class ErrorFixer:
                 Qgis.Info
             )
 
+            if self.fix_candidates > 1:
+                start = time.perf_counter()
+                fixed_sql, label = self._best_candidate(
+                    current_sql, error, context, layer_name, model_provider, model_name
+                )
+                if not fixed_sql:
+                    QgsMessageLog.logMessage(
+                        "LLM returned no usable candidate fix",
+                        "GeoAI",
+                        Qgis.Warning
+                    )
+                    get_metrics_service().record("fix", "llm", success=False)
+                    break
+                current_sql = fixed_sql
+                pending_fix = ("llm", (time.perf_counter() - start) * 1000)
+                history[-1]["fix"] = f"llm ({label})"
+                continue
+
             try:
+                start = time.perf_counter()
                 fix_result = self.llm.fix_sql_error(current_sql, error, context, model_provider, model_name)
 
                 if "error" in fix_result:
@@ -158,6 +280,7 @@ class ErrorFixer:
                         "GeoAI",
                         Qgis.Critical
                     )
+                    get_metrics_service().record("fix", "llm", success=False)
                     return {
                         "success": False,
                         "error": f"Could not generate fix: {fix_result['error']}",
@@ -180,9 +303,12 @@ class ErrorFixer:
                     if sql_match:
                         fixed_sql = sql_match.group(1).strip()
                     else:
+                        get_metrics_service().record("fix", "llm", success=False)
                         break
 
                 current_sql = fixed_sql
+                pending_fix = ("llm", (time.perf_counter() - start) * 1000)
+                history[-1]["fix"] = "llm"
                 QgsMessageLog.logMessage(
                     f"Trying fixed SQL: {current_sql[:100]}...",
                     "GeoAI",
@@ -204,11 +330,79 @@ class ErrorFixer:
         # All attempts failed
         return {
             "success": False,
-            "error": f"Failed after {self.max_attempts} attempts. Last error: {history[-1]['error'] if history else 'Unknown'}",
+            "error": f"Failed after {attempt} attempts. Last error: {history[-1]['error'] if history else 'Unknown'}",
             "history": history,
-            "final_sql": current_sql
+            "final_sql": current_sql,
+            "rule_fixes": rule_fixes,
+            "llm_fixes": llm_fixes,
         }
 
+    def _best_candidate(self, sql: str, error: str, context: Dict, layer_name: str,
+                        model_provider: str, model_name: str) -> Tuple[Optional[str], str]:
+        """(SQL, label) of the first candidate fix that validates
+
+        Candidates are generated concurrently and each one is dry-run as soon
+        as it arrives. When none validates the first candidate is returned so
+        its real error feeds the next round; (None, "") when there is none.
+        """
+        parent = get_tracer().current_span()
+        routes = self.fix_routes or [(model_provider, model_name)]
+
+        def generate(index: int) -> Optional[str]:
+            provider, model = routes[index % len(routes)]
+            with span("fix.candidate", parent=parent, provider=provider, model=model, variant=index):
+                try:
+                    fix = self.llm.fix_sql_error(sql, error, context, provider, model, variant=index)
+                except Exception as e:
+                    fix = {"error": str(e)}
+            if "error" in fix:
+                QgsMessageLog.logMessage(
+                    f"Candidate fix {index + 1} failed: {fix['error']}", "GeoAI", Qgis.Warning
+                )
+                return None
+            return fix.get("sql", "").strip() or None
+
+        def validate(candidate: str) -> Dict:
+            with span("fix.validate", parent=parent):
+                return self.sql_executor.validate_sql(self.auto_fix_common_errors(candidate), layer_name, context)
+
+        candidates: List[Tuple[str, str]] = []
+        pool = ThreadPoolExecutor(max_workers=self.fix_candidates * 2, thread_name_prefix="geoai-fix")
+        # future -> (index, None while generating / candidate SQL while validating)
+        pending = {}
+        try:
+            for index in range(self.fix_candidates):
+                pending[pool.submit(generate, index)] = (index, None)
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, candidate = pending.pop(future)
+                    provider, model = routes[index % len(routes)]
+                    label = f"candidate {index + 1}, {provider or 'default'}/{model or 'default'}"
+                    if candidate is None:
+                        candidate = future.result()
+                        if candidate and candidate != sql and all(candidate != c for _, c in candidates):
+                            candidates.append((label, candidate))
+                            pending[pool.submit(validate, candidate)] = (index, candidate)
+                        continue
+                    result = future.result()
+                    if result.get("success"):
+                        QgsMessageLog.logMessage(f"Using {label}", "GeoAI", Qgis.Info)
+                        return candidate, label
+                    QgsMessageLog.logMessage(
+                        f"{label} rejected: {result.get('error')}", "GeoAI", Qgis.Info
+                    )
+        finally:
+            # Slower candidates are not waited for (cancel_futures needs Python 3.9)
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+        if candidates:
+            label, candidate = candidates[0]
+            return candidate, label
+        return None, ""
+
     def fix_sql_error(self, sql: str, error_msg: str, context: Dict = None,
                      model_provider: str = None, model_name: str = None) -> Dict:
         """Try to fix a SQL error with LLM assistance"""
@@ -216,10 +410,35 @@ class ErrorFixer:
             # First try automatic fixes
             sql = self.auto_fix_common_errors(sql)
             
-            if not context:
-                context = self.sql_executor.get_context()
+            with span("fix_sql_error") as trace:
+                if not context:
+                    context = self.sql_executor.get_context()
+
+                parsed = parse_sql_error(error_msg, sql)
+                table_fields = context.get("table_fields", {})
+                remembered = get_fix_memory().lookup(
+                    schema_key(table_fields), error_signature(parsed), sql, table_fields, context.get("db_type")
+                )
+                if remembered:
+                    trace.set(fixed_by="memory")
+                    return {
+                        "sql": remembered[0],
+                        "explanation": f"Fixed from memory: {remembered[1]}",
+                        "fixed_by": "memory",
+                    }
+
+                # Errors the schema explains are fixed without the LLM
+                repair = SqlRepairEngine(context).repair(sql, parsed)
+                if repair:
+                    trace.set(fixed_by="rule", rule=repair.rule)
+                    return {
+                        "sql": repair.sql,
+                        "explanation": f"Fixed locally ({repair.rule}): {repair.description}",
+                        "fixed_by": "rule",
+                    }
 
-            fix_result = self.llm.fix_sql_error(sql, error_msg, context, model_provider, model_name)
+                trace.set(fixed_by="llm")
+                fix_result = self.llm.fix_sql_error(sql, error_msg, context, model_provider, model_name)
 
             if "error" in fix_result:
                 return {
@@ -228,7 +447,8 @@ class ErrorFixer:
 
             return {
                 "sql": fix_result.get("sql", sql),
-                "explanation": fix_result.get("explanation", "Fixed SQL syntax")
+                "explanation": fix_result.get("explanation", "Fixed SQL syntax"),
+                "fixed_by": "llm",
             }
 
         except Exception as e:
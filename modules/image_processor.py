@@ -1,10 +1,16 @@
 from PIL import Image
 import os
+import json
 import time
-from typing import Dict
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional
 from dotenv import load_dotenv
 from qgis.core import QgsMessageLog, Qgis
 
+from ..core.workflow import WorkflowGraph, Model3ParseError, parse_model3_file, is_model_file
+from .diagram_ocr import DiagramOCR
+
 # Load environment variables
 PLUGIN_DIR = os.path.dirname(os.path.dirname(__file__))
 env_path = os.path.join(PLUGIN_DIR, ".env")
@@ -17,6 +23,11 @@ class ImageProcessor:
     def __init__(self, llm_handler):
         self.llm = llm_handler
         self.azure_client = None
+        # Extracted workflow graphs keyed by image content hash
+        self._workflow_cache: Dict[str, WorkflowGraph] = {}
+        self.workflow_cache_dir = Path(PLUGIN_DIR) / "cache" / "workflows"
+        self.diagram_ocr = DiagramOCR()
+        self.local_ocr_enabled = os.getenv("LOCAL_OCR_ENABLED", "true").lower() != "false"
         self._initialize_azure_client()
     
     def _initialize_azure_client(self):
@@ -124,6 +135,87 @@ class ImageProcessor:
         
         return self.azure_client is not None
     
+    def _image_fingerprint(self, image_path: str) -> str:
+        """Content hash of an image, used as workflow cache key"""
+        digest = hashlib.sha1()
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _cache_key(self, image_path: str, local_ocr: bool = False) -> str:
+        """Local OCR results live next to, never in place of, vision extractions"""
+        key = self._image_fingerprint(image_path)
+        return f"{key}.ocr" if local_ocr else key
+
+    def get_cached_workflow(self, image_path: str, extracted_by: str = None,
+                            local_ocr: bool = False) -> Optional[WorkflowGraph]:
+        """Return the workflow previously extracted from this image, if any
+
+        With ``extracted_by`` ("provider/model") a vision extraction made by a
+        different model is ignored, so the new model extracts again and its
+        result replaces the entry. Local OCR graphs are only returned with
+        ``local_ocr`` set, so they never stand in for a vision extraction.
+        """
+        try:
+            key = self._cache_key(image_path, local_ocr)
+        except OSError:
+            return None
+
+        graph = self._workflow_cache.get(key)
+        cache_file = self.workflow_cache_dir / f"{key}.json"
+        if graph is None and cache_file.exists():
+            try:
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    graph = WorkflowGraph.from_dict(json.load(f))
+                self._workflow_cache[key] = graph
+            except Exception as e:
+                QgsMessageLog.logMessage(f"Error reading workflow cache: {e}", "GeoAI", Qgis.Warning)
+
+        # Entries written before empty extractions were rejected
+        if graph is None or graph.is_empty():
+            return None
+        if (graph.source == "local_ocr") != local_ocr:
+            return None
+        if extracted_by and graph.source == "vision" and graph.extracted_by != extracted_by:
+            return None
+        return graph
+
+    def cache_workflow(self, image_path: str, graph: WorkflowGraph):
+        """Persist an extracted workflow so later conversions skip extraction
+
+        Graphs without steps or inputs (e.g. a model that ignored the JSON
+        format) are not cached, so the next conversion tries again.
+        """
+        if graph.is_empty():
+            QgsMessageLog.logMessage(
+                "Extracted workflow has no steps or inputs - not caching it", "GeoAI", Qgis.Info
+            )
+            return
+        try:
+            key = self._cache_key(image_path, graph.source == "local_ocr")
+            self._workflow_cache[key] = graph
+            self.workflow_cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.workflow_cache_dir / f"{key}.json", "w", encoding="utf-8") as f:
+                f.write(graph.to_json())
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Error writing workflow cache: {e}", "GeoAI", Qgis.Warning)
+
+    def clear_workflow_cache(self) -> int:
+        """Forget all extracted workflows, returns the number of files removed"""
+        self._workflow_cache.clear()
+        removed = 0
+        if self.workflow_cache_dir.exists():
+            for cache_file in self.workflow_cache_dir.glob("*.json"):
+                try:
+                    cache_file.unlink()
+                    removed += 1
+                except OSError as e:
+                    QgsMessageLog.logMessage(
+                        f"Could not remove {cache_file.name}: {e}", "GeoAI", Qgis.Warning
+                    )
+        return removed
+
     def analyze_image_with_azure(self, image_path: str) -> Dict:
         """
         Analyze image using Azure Computer Vision to extract description, shapes, and colors
@@ -281,6 +373,56 @@ class ImageProcessor:
         
         return "\n".join(parts)
     
+    def process_model_file(self, model_path: str, output_type: str = 'sql', model_provider: str = 'ollama', model_name: str = 'phi3') -> Dict:
+        """
+        Convert a QGIS .model3 file to code
+        
+        The model XML is parsed deterministically into a WorkflowGraph, so no
+        OCR or vision call is needed - only a text-only code generation call.
+        """
+        if not os.path.exists(model_path):
+            error_msg = f"Model file not found: {model_path}"
+            QgsMessageLog.logMessage(error_msg, "GeoAI", Qgis.Critical)
+            return {"error": error_msg}
+        
+        try:
+            graph = parse_model3_file(model_path)
+        except (Model3ParseError, OSError, UnicodeDecodeError) as e:
+            error_msg = f"Invalid model file: {str(e)}"
+            QgsMessageLog.logMessage(error_msg, "GeoAI", Qgis.Critical)
+            return {"error": error_msg}
+        
+        QgsMessageLog.logMessage(
+            f"✅ Parsed model '{graph.name}': {len(graph.inputs)} inputs, "
+            f"{len(graph.steps)} steps, {len(graph.outputs)} outputs",
+            "GeoAI",
+            Qgis.Info
+        )
+        
+        result = self.llm.analyze_image_to_code(
+            model_path,
+            output_type,
+            model_provider,
+            model_name,
+            workflow_graph=graph,
+        )
+        if "error" in result:
+            QgsMessageLog.logMessage(
+                f"Code generation failed: {result.get('error')}", "GeoAI", Qgis.Critical
+            )
+            return result
+        
+        return {
+            "success": True,
+            "analysis_method": "model3",
+            "azure_description": None,
+            "sql_code": result.get("sql_code"),
+            "python_code": result.get("python_code"),
+            "raw_response": result.get("code", ""),
+            "extracted_info": result.get("extracted_info", ""),
+            "workflow_graph": result.get("workflow_graph"),
+        }
+    
     def process_model_image(self, image_path: str, output_type: str = 'sql', model_provider: str = 'ollama', model_name: str = 'phi3') -> Dict:
         """
         Process model builder screenshot and convert to code
@@ -297,6 +439,9 @@ class ImageProcessor:
             Qgis.Info
         )
         
+        if is_model_file(image_path):
+            return self.process_model_file(image_path, output_type, model_provider, model_name)
+        
         if not os.path.exists(image_path):
             error_msg = f"Image file not found: {image_path}"
             QgsMessageLog.logMessage(error_msg, "GeoAI", Qgis.Critical)
@@ -370,6 +515,7 @@ class ImageProcessor:
         
         # Step 2: Generate code using either Azure description or LLM direct processing
         result = None
+        analysis_method = "llm_direct"
         
         if azure_available and azure_description:
             # PREFERRED: Use Azure description to generate code with selected model
@@ -443,6 +589,34 @@ class ImageProcessor:
                 Qgis.Info
             )
             
+            # Reuse a previously extracted workflow so only text-only calls are made
+            cached_graph = self.get_cached_workflow(
+                image_path, self.llm.vision_extractor(model_provider, model_name)
+            )
+            if cached_graph is not None:
+                QgsMessageLog.logMessage(
+                    "Reusing extracted workflow for this image - skipping vision call",
+                    "GeoAI",
+                    Qgis.Info
+                )
+            elif self.local_ocr_enabled:
+                # Offline path: OCR + box/arrow detection on CPU, no vision model needed.
+                # Only graphs that pass DiagramOCR's quality check come back.
+                cached_graph = self.get_cached_workflow(image_path, local_ocr=True)
+                if cached_graph is None:
+                    cached_graph = self.diagram_ocr.extract_workflow(image_path)
+                    if cached_graph is not None:
+                        self.cache_workflow(image_path, cached_graph)
+                if cached_graph is not None:
+                    QgsMessageLog.logMessage(
+                        "✅ Local OCR extracted the workflow - using text-only code generation",
+                        "GeoAI",
+                        Qgis.Info
+                    )
+            
+            if cached_graph is not None and cached_graph.source == "local_ocr":
+                analysis_method = "local_ocr"
+
             # Check if LLM supports vision (only needed for fallback)
             try:
                 # For fallback, we need a vision-capable model
@@ -451,8 +625,13 @@ class ImageProcessor:
                     image_path,
                     output_type,
                     model_provider,
-                    model_name  # Try selected model first
+                    model_name,  # Try selected model first
+                    workflow_graph=cached_graph,
                 )
+                if cached_graph is None and result.get("workflow_graph"):
+                    self.cache_workflow(
+                        image_path, WorkflowGraph.from_dict(result["workflow_graph"])
+                    )
             except Exception as e:
                 error_msg = (
                     f"LLM direct image processing failed: {str(e)}\n\n"
@@ -510,37 +689,20 @@ class ImageProcessor:
                         Qgis.Info
                     )
         else:
-            # LLM direct path - already has code, just format it
+            # LLM direct path - already has code per target, just format it
             code = result.get("code", "")
-            code_type = result.get("type", output_type).lower()
             
             structured = {
                 "success": True,
-                "analysis_method": "llm_direct",
-                "azure_description": None
+                "analysis_method": analysis_method,
+                "azure_description": None,
+                "sql_code": result.get("sql_code"),
+                "python_code": result.get("python_code"),
             }
             
-            # Set code in appropriate field
-            if code_type == "sql":
-                structured["sql_code"] = code
-                structured["python_code"] = None
-            elif code_type == "python":
-                structured["sql_code"] = None
-                structured["python_code"] = code
-            else:
-                # Default to sql_code for output_type
-                if output_type.lower() == "sql":
-                    structured["sql_code"] = code
-                    structured["python_code"] = None
-                elif output_type.lower() == "python":
-                    structured["sql_code"] = None
-                    structured["python_code"] = code
-                else:
-                    structured["sql_code"] = code
-                    structured["python_code"] = None
-            
             structured["raw_response"] = code
             structured["extracted_info"] = result.get("extracted_info", "")
+            structured["workflow_graph"] = result.get("workflow_graph")
         
         # Log success with detailed info
         has_sql = structured.get("sql_code") is not None
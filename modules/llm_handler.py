@@ -5,125 +5,204 @@ Supports: OpenAI, OpenRouter, Anthropic, Google Gemini, Ollama, HuggingFace
 
 import os
 import re
+import time
 import base64
-import requests
-from typing import Dict, List, Optional
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from qgis.core import QgsMessageLog, Qgis
 from dotenv import load_dotenv
 
+from ..core.llm.providers import get_registry
+from ..core.llm.resilience import call_with_resilience, CircuitOpenError
+from ..core.llm.routing import HedgedRouter, get_latency_tracker
+from ..core.llm.models import ProviderType, QueryResponse
+from ..core.llm.prompts import (
+    SQL_PROMPT_VERSION, build_corrections_section, build_sql_system_prompt, build_fix_fields_section,
+    trim_schema_context,
+)
+from ..core.llm.tokens import count_tokens, context_window, input_budget
+from ..core.llm.pricing import estimate_cost
+from ..core.sql import QUOTED_IDENTIFIER, strip_comments, tokenize
+from ..core.workflow import WorkflowGraph, CodeEmitter
+from ..infrastructure.logging.logger import get_logger
+from ..infrastructure.tracing import get_tracer, span
+from ..services.fix_memory_service import get_fix_memory
+from ..services.metrics_service import get_metrics_service
+from .query_validator import QueryValidator
+
+logger = get_logger(__name__)
+
 PLUGIN_DIR = os.path.dirname(os.path.dirname(__file__))
 env_path = os.path.join(PLUGIN_DIR, ".env")
 load_dotenv(env_path)
 
+# Lowercase names that need no quoting in generated SQL
+SIMPLE_IDENTIFIER_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+# Extra instruction per candidate when several fixes are requested at once,
+# so samples from the same model don't all come back identical
+FIX_VARIANT_HINTS = (
+    "Prefer the smallest change that removes the error.",
+    "Re-check every table and column name against the field list first.",
+    "Consider rewriting the failing part of the query in a different way.",
+)
+
+WORKFLOW_EXTRACTION_PROMPT = (
+    "Analyze this QGIS Model Builder diagram and describe it as JSON with this shape:\n"
+    "{\n"
+    '  "name": "model name",\n'
+    '  "inputs": [{"name": "...", "type": "vector|raster|field|number|string", "description": "..."}],\n'
+    '  "steps": [{"id": "step_1", "algorithm": "native:buffer", "label": "Buffer", '
+    '"parameters": {"DISTANCE": 100}}],\n'
+    '  "edges": [{"source": "input name or step id", "target": "step id", '
+    '"output": "OUTPUT", "parameter": "INPUT"}],\n'
+    '  "outputs": [{"name": "...", "source": "step id", "output": "OUTPUT"}]\n'
+    "}\n"
+    "List every input layer, processing algorithm (use the QGIS algorithm id when "
+    "recognisable), parameter value, output and connection between steps. "
+    "Return ONLY the JSON in a ```json ... ``` block."
+)
+
 
 class LLMHandler:
     """Unified handler for all LLM interactions with multiple providers."""
 
     def __init__(self):
-        """Initialize LLM client based on selected provider (.env)"""
+        """Initialize handler for the default provider (.env)
+
+        Provider SDKs are not imported here: the registry creates and caches
+        clients lazily on first use.
+        """
         plugin_dir = os.path.dirname(os.path.dirname(__file__))
         load_dotenv(os.path.join(plugin_dir, ".env"))
 
+        self.registry = get_registry()
         self.provider = os.getenv("LLM_PROVIDER", "ollama").lower()
-        self.client = None
-        self.api_url = None
-        self.text_model = os.getenv("LLM_MODEL_TEXT")
-        self.vision_model = os.getenv("LLM_MODEL_VISION")
-        self.api_key = None
+        provider_class = self.registry.provider_class(self.provider)
+        self.text_model = os.getenv("LLM_MODEL_TEXT") or provider_class.default_model
+        self.vision_model = os.getenv("LLM_MODEL_VISION") or provider_class.default_vision_model
         self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-
-        # Initialize provider-specific clients
-        if self.provider == "openai":
-            import openai
-
-            self.api_key = os.getenv("OPENAI_API_KEY")
-            if not self.api_key:
-                raise ValueError("OPENAI_API_KEY not found in .env")
-            self.client = openai.OpenAI(api_key=self.api_key)
-            if not self.text_model:
-                self.text_model = "gpt-4o-mini"
-            if not self.vision_model:
-                self.vision_model = "gpt-4o"
-
-        elif self.provider == "openrouter":
-            import openai
-
-            self.api_key = os.getenv("OPENROUTER_API_KEY")
-            if not self.api_key:
-                raise ValueError("OPENROUTER_API_KEY not found in .env")
-            self.client = openai.OpenAI(
-                api_key=self.api_key,
-                base_url="https://openrouter.ai/api/v1",
-                default_headers={
-                    "HTTP-Referer": os.getenv(
-                        "OPENROUTER_SITE_URL", "https://qgis.local"
-                    ),
-                    "X-Title": os.getenv("OPENROUTER_APP_NAME", "GeoAI Assistant"),
-                },
+        self.latency_tracker = get_latency_tracker()
+        self.router = HedgedRouter(self.latency_tracker)
+        self._warmup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="geoai-warmup")
+        self._warm_models: Dict[str, float] = {}
+        max_output = os.getenv("LLM_MAX_OUTPUT_TOKENS", "")
+        self.max_output_tokens = int(max_output) if max_output.isdigit() else None
+        # Per-thread record of the last completion (calls may run in parallel)
+        self._local = threading.local()
+        self.metrics = get_metrics_service()
+
+    def close(self):
+        """Stop routing and warm-up threads (called when the plugin unloads)"""
+        self.router.shutdown()
+        # A warm-up already loading a model is left to finish in the background
+        self._warmup_executor.shutdown(wait=False)
+
+    @property
+    def client(self):
+        """SDK client of the default provider (kept for backward compatibility)"""
+        return self._get_provider(self.provider).client
+
+    @property
+    def api_key(self) -> Optional[str]:
+        """API key of the default provider"""
+        return self.registry.api_key_for(self.provider)
+
+    @property
+    def last_response(self) -> Optional[QueryResponse]:
+        """Timing, token usage and cost of this thread's last provider call"""
+        return getattr(self._local, "response", None)
+
+    def _get_provider(self, provider: str = None):
+        """Cached provider instance from the registry"""
+        return self.registry.get(provider or self.provider)
+
+    def _default_model(self, provider: str, vision: bool = False) -> str:
+        """Configured model for the default provider, class default otherwise"""
+        if provider == self.provider:
+            return self.vision_model if vision else self.text_model
+        provider_class = self.registry.provider_class(provider)
+        return provider_class.default_vision_model if vision else provider_class.default_model
+
+    def _call_provider(self, provider: str, method: str, *args, model: str = None,
+                       prompt_tokens: int = None, **kwargs) -> QueryResponse:
+        """Call a provider method with retries, backoff and circuit breaking
+
+        Latency and outcome are recorded per provider/model for routing. The
+        result carries wall time, time to first token, token counts (from the
+        provider's usage metadata, estimated otherwise) and the estimated cost;
+        it is also kept in ``last_response``.
+        """
+        provider_obj = self._get_provider(provider)
+        provider_obj.pop_usage()
+
+        def _log_retry(attempt, delay, error):
+            QgsMessageLog.logMessage(
+                f"⚠️ {provider} call failed ({type(error).__name__}: {str(error)[:200]}). "
+                f"Retry {attempt} in {delay:.1f}s...",
+                "GeoAI",
+                Qgis.Warning,
             )
-            if not self.text_model:
-                self.text_model = "mistralai/mistral-7b-instruct"
-            if not self.vision_model:
-                self.vision_model = "openai/gpt-4o"
-
-        elif self.provider == "anthropic":
-            import anthropic
-
-            self.api_key = os.getenv("ANTHROPIC_API_KEY")
-            if not self.api_key:
-                raise ValueError("ANTHROPIC_API_KEY not found in .env")
-            self.client = anthropic.Anthropic(api_key=self.api_key)
-            if not self.text_model:
-                self.text_model = "claude-3-5-sonnet-20241022"
-            if not self.vision_model:
-                self.vision_model = "claude-3-5-sonnet-20241022"
-
-        elif self.provider == "google":
+
+        with span("llm.call", provider=provider, model=model) as call_span:
+            start = time.time()
             try:
-                import google.generativeai as genai
-
-                self.api_key = os.getenv("GOOGLE_API_KEY")
-                if not self.api_key:
-                    raise ValueError("GOOGLE_API_KEY not found in .env")
-                genai.configure(api_key=self.api_key)
-                self.client = genai
-                if not self.text_model:
-                    self.text_model = "models/gemini-pro-latest"
-                if not self.vision_model:
-                    self.vision_model = "models/gemini-2.5-flash-image"
-            except ImportError:
-                QgsMessageLog.logMessage(
-                    "Google Generative AI SDK not installed. Install with: pip install google-generativeai",
-                    "GeoAI",
-                    Qgis.Warning,
+                content = call_with_resilience(
+                    provider, getattr(provider_obj, method), *args,
+                    model=model, on_retry=_log_retry, **kwargs
                 )
-                raise ValueError("Google Generative AI SDK not installed")
-
-        elif self.provider == "ollama":
-            self.ollama_base_url = os.getenv(
-                "OLLAMA_BASE_URL", "http://localhost:11434"
+            except CircuitOpenError as e:
+                QgsMessageLog.logMessage(str(e), "GeoAI", Qgis.Warning)
+                raise
+            except Exception as e:
+                self.latency_tracker.record(provider, model, time.time() - start, False)
+                self.metrics.record(
+                    "stage", "llm", (time.time() - start) * 1000, success=False,
+                    provider=provider, model=model,
+                )
+                message = provider_obj.friendly_error(e)
+                if message:
+                    QgsMessageLog.logMessage(message, "GeoAI", Qgis.Critical)
+                    raise ValueError(message) from e
+                raise
+            elapsed = time.time() - start
+            self.latency_tracker.record(provider, model, elapsed, True)
+
+            usage = provider_obj.pop_usage()
+            prompt_tokens = usage.get("prompt_tokens") or prompt_tokens
+            completion_tokens = usage.get("completion_tokens") or count_tokens(content, model)
+            cached_tokens = usage.get("cached_tokens")
+            response = QueryResponse(
+                content=content,
+                provider=ProviderType(provider),
+                model=model,
+                tokens_used=(prompt_tokens or 0) + completion_tokens,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                cached_tokens=cached_tokens,
+                cost=estimate_cost(
+                    provider, model, prompt_tokens or 0, completion_tokens, cached_tokens or 0
+                ),
+                response_time=elapsed,
+                time_to_first_token=usage.get("time_to_first_token"),
             )
-            if not self.text_model:
-                self.text_model = "phi3"
-            if not self.vision_model:
-                self.vision_model = "phi3"
-            self.client = None
-
-        elif self.provider == "huggingface":
-            self.api_key = os.getenv("HF_API_KEY")
-            if not self.api_key:
-                raise ValueError("HF_API_KEY not found in .env")
-            if not self.text_model:
-                self.text_model = "HuggingFaceH4/zephyr-7b-beta"
-            if not self.vision_model:
-                self.vision_model = ""
-            self.api_url = (
-                f"https://api-inference.huggingface.co/models/{self.text_model}"
+            self._local.response = response
+            call_span.set(
+                tokens=response.tokens_used, prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens, ttft=response.time_to_first_token,
             )
-            self.client = None
-
-        else:
-            raise ValueError(f"Unsupported provider: {self.provider}")
+            self.metrics.record(
+                "stage", "llm", elapsed * 1000, provider=provider, model=model,
+                tokens=response.tokens_used, cost=response.cost or 0.0,
+            )
+            ttft = f", first token {response.time_to_first_token:.2f}s" if response.time_to_first_token else ""
+            cost = f", ${response.cost:.5f}" if response.cost else ""
+            logger.info(
+                f"{provider}/{model}: {elapsed:.2f}s{ttft}, "
+                f"{prompt_tokens or '?'} prompt + {completion_tokens} completion tokens{cost}"
+            )
+            return response
 
     def _ollama_query(
         self,
@@ -131,89 +210,58 @@ class LLMHandler:
         system_prompt: str = "",
         model: str = None,
         images: Optional[List[str]] = None,
+        system_prefix: str = None,
+        **kwargs,
     ) -> str:
         """Call Ollama API"""
-        if model is None:
-            model = self.text_model
-
-        url = f"{self.ollama_base_url}/api/generate"
-        payload = {"model": model, "prompt": prompt, "stream": False}
-        if system_prompt:
-            payload["system"] = system_prompt
-        if images:
-            payload["images"] = images
-
-        QgsMessageLog.logMessage(
-            f"Calling Ollama API: {url} | Model: {model} | Prompt length: {len(prompt)} chars",
-            "GeoAI",
-            Qgis.Info,
-        )
-
         try:
-            QgsMessageLog.logMessage(
-                "Sending request to Ollama (timeout: 180s)...", "GeoAI", Qgis.Info
-            )
-            response = requests.post(
-                url, json=payload, timeout=180
-            )  # Increased timeout to 180s
-
-            QgsMessageLog.logMessage(
-                f"Ollama response status: {response.status_code}", "GeoAI", Qgis.Info
-            )
-
-            if response.status_code != 200:
-                error_text = response.text[:500]  # Limit error text
-                QgsMessageLog.logMessage(
-                    f"Ollama error response: {error_text}", "GeoAI", Qgis.Critical
-                )
-                raise Exception(
-                    f"Ollama error (status {response.status_code}): {error_text}"
-                )
-
-            data = response.json()
-            result = data.get("response", "").strip()
-
-            if result:
-                QgsMessageLog.logMessage(
-                    f"Ollama response received: {len(result)} characters",
-                    "GeoAI",
-                    Qgis.Info,
-                )
-            else:
+            return self._call_provider(
+                "ollama", "query",
+                prompt, system_prompt, model=model or self._default_model("ollama"), images=images,
+                system_prefix=system_prefix, **kwargs
+            ).content
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Ollama error: {str(e)}", "GeoAI", Qgis.Critical)
+            raise
+
+    def warm_up(self, provider: str, model: str = None):
+        """Pre-load a local model so the first query does not pay the cold load
+
+        Only Ollama loads models on demand; other providers are a no-op.
+        Returns the Future of the background load, or None when skipped.
+        """
+        if (provider or "").lower() != "ollama":
+            return None
+        model = model or self._default_model("ollama")
+        ollama = self._get_provider("ollama")
+        # Loaded recently enough to still be resident (keep_alive)
+        if time.time() - self._warm_models.get(model, 0) < 60:
+            return None
+        self._warm_models[model] = time.time()
+
+        def _load():
+            try:
+                timings = ollama.warm_up(model)
+            except Exception as e:
+                self._warm_models.pop(model, None)
                 QgsMessageLog.logMessage(
-                    "Ollama returned empty response", "GeoAI", Qgis.Warning
+                    f"Ollama warm-up of {model} failed: {str(e)[:200]}", "GeoAI", Qgis.Warning
                 )
+                return None
+            QgsMessageLog.logMessage(
+                f"🔥 Ollama {model} ready (load {timings['load']:.1f}s, keep_alive {ollama.keep_alive})",
+                "GeoAI",
+                Qgis.Info,
+            )
+            return timings
 
-            return result
-
-        except requests.exceptions.Timeout:
-            error_msg = f"Ollama request timed out after 180 seconds. Model {model} may be too slow or not responding."
-            QgsMessageLog.logMessage(error_msg, "GeoAI", Qgis.Critical)
-            raise Exception(error_msg)
-        except requests.exceptions.ConnectionError:
-            error_msg = f"Could not connect to Ollama at {self.ollama_base_url}. Make sure Ollama is running."
-            QgsMessageLog.logMessage(error_msg, "GeoAI", Qgis.Critical)
-            raise Exception(error_msg)
-        except Exception as e:
-            error_msg = f"Ollama connection error: {str(e)}"
-            QgsMessageLog.logMessage(error_msg, "GeoAI", Qgis.Critical)
-            raise Exception(error_msg)
+        return self._warmup_executor.submit(_load)
 
-    def _hf_query(self, prompt: str) -> str:
+    def _hf_query(self, prompt: str, model: str = None) -> str:
         """Call Hugging Face Inference API"""
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        response = requests.post(
-            self.api_url,
-            headers=headers,
-            json={"inputs": prompt},
-            timeout=120,
-        )
-        if response.status_code != 200:
-            raise Exception(f"Hugging Face error: {response.text}")
-        data = response.json()
-        if isinstance(data, list) and len(data) and "generated_text" in data[0]:
-            return data[0]["generated_text"]
-        return str(data)
+        return self._call_provider(
+            "huggingface", "query", prompt, model=model or self._default_model("huggingface")
+        ).content
 
     def _query_with_provider(
         self,
@@ -221,280 +269,107 @@ class LLMHandler:
         system_prompt: str = None,
         model_provider: str = None,
         model_name: str = None,
+        system_prefix: str = None,
     ) -> str:
         """Generic query method that supports dynamic provider/model selection"""
-        provider = model_provider.lower() if model_provider else self.provider
-        model = model_name if model_name else self.text_model
-
-        if provider == "ollama":
-            full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
-            return self._ollama_query(full_prompt, "", model)
-
-        elif provider == "openrouter":
-            import openai
-
-            api_key = os.getenv("OPENROUTER_API_KEY")
-            if not api_key:
-                raise ValueError("OPENROUTER_API_KEY not found in .env")
-            client = openai.OpenAI(
-                api_key=api_key,
-                base_url="https://openrouter.ai/api/v1",
-                default_headers={
-                    "HTTP-Referer": os.getenv(
-                        "OPENROUTER_SITE_URL", "https://qgis.local"
-                    ),
-                    "X-Title": os.getenv("OPENROUTER_APP_NAME", "GeoAI Assistant"),
-                },
+        return self.query(
+            prompt, system_prompt, model_provider, model_name, system_prefix=system_prefix
+        ).content
+
+    def query(
+        self,
+        prompt: str,
+        system_prompt: str = None,
+        model_provider: str = None,
+        model_name: str = None,
+        system_prefix: str = None,
+    ) -> QueryResponse:
+        """Text completion returning content plus timing, token and cost metrics
+
+        ``system_prefix`` is the static, cacheable start of the system prompt.
+        When a hedge route is configured (LLM_HEDGE_PROVIDER / LLM_HEDGE_MODEL)
+        the request is raced against it once the latency budget is exceeded.
+        """
+        provider, model = self._resolve_route(model_provider, model_name)
+
+        hedge = self._hedge_route(provider, model)
+        if hedge is None:
+            return self._complete(provider, model, prompt, system_prompt, system_prefix)
+
+        def _log_hedge(slow, fallback, budget):
+            QgsMessageLog.logMessage(
+                f"⏱️ {slow[0]}/{slow[1]} exceeded {budget:.1f}s - hedging to {fallback[0]}/{fallback[1]}",
+                "GeoAI",
+                Qgis.Info,
             )
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": prompt})
-
-            response = client.chat.completions.create(model=model, messages=messages)
-            return response.choices[0].message.content
-
-        elif provider == "openai":
-            import openai
-
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                raise ValueError("OPENAI_API_KEY not found in .env")
-            client = openai.OpenAI(api_key=api_key)
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": prompt})
-
-            response = client.chat.completions.create(model=model, messages=messages)
-            return response.choices[0].message.content
-
-        elif provider == "anthropic":
-            import anthropic
-
-            api_key = os.getenv("ANTHROPIC_API_KEY")
-            if not api_key:
-                raise ValueError("ANTHROPIC_API_KEY not found in .env")
-            client = anthropic.Anthropic(api_key=api_key)
-
-            system_msg = system_prompt if system_prompt else ""
-            response = client.messages.create(
-                model=model,
-                max_tokens=4000,
-                system=system_msg,
-                messages=[{"role": "user", "content": prompt}],
+
+        # Router threads have no open span - link their attempts to ours
+        parent = get_tracer().current_span()
+
+        def _attempt(route):
+            with span("llm.attempt", parent=parent, provider=route[0], model=route[1]):
+                return self._complete(route[0], route[1], prompt, system_prompt, system_prefix)
+
+        response, route = self.router.run([(provider, model), hedge], _attempt, on_hedge=_log_hedge)
+        # The winning call ran on a router thread
+        self._local.response = response
+        if route != (provider, model):
+            QgsMessageLog.logMessage(
+                f"Answer served by {route[0]}/{route[1]}", "GeoAI", Qgis.Info
             )
-            return response.content[0].text
+        return response
 
-        elif provider == "google":
-            try:
-                import google.generativeai as genai
-                import time
-                
-                # Try to import Google API exceptions (may not always be available)
-                try:
-                    from google.api_core import exceptions as google_exceptions
-                except ImportError:
-                    google_exceptions = None
-
-                api_key = os.getenv("GOOGLE_API_KEY")
-                if not api_key:
-                    raise ValueError("GOOGLE_API_KEY not found in .env")
-                genai.configure(api_key=api_key)
-                model_instance = genai.GenerativeModel(model)
-                
-                # Configure safety settings to be most permissive
-                # Use proper enum values from Google API
-                try:
-                    from google.generativeai.types import HarmCategory, HarmBlockThreshold
-                    safety_settings = [
-                        {
-                            "category": HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                            "threshold": HarmBlockThreshold.BLOCK_NONE,
-                        },
-                        {
-                            "category": HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                            "threshold": HarmBlockThreshold.BLOCK_NONE,
-                        },
-                        {
-                            "category": HarmCategory.HARM_CATEGORY_HARASSMENT,
-                            "threshold": HarmBlockThreshold.BLOCK_NONE,
-                        },
-                        {
-                            "category": HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                            "threshold": HarmBlockThreshold.BLOCK_NONE,
-                        },
-                    ]
-                except ImportError:
-                    # Fallback to string format if enums not available
-                    safety_settings = [
-                        {
-                            "category": "HARM_CATEGORY_HATE_SPEECH",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_HARASSMENT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                    ]
-                
-                # Retry logic for quota/rate limit errors
-                max_retries = 3
-                retry_delay = 5  # Start with 5 seconds
-                
-                for attempt in range(max_retries):
-                    try:
-                        response = model_instance.generate_content(
-                            [system_prompt, prompt] if system_prompt else [prompt],
-                            generation_config=genai.types.GenerationConfig(
-                                temperature=0.7, top_p=0.0, top_k=1, max_output_tokens=2000
-                            ),
-                            safety_settings=safety_settings,
-                        )
-                        try:
-                            return response.text
-                        except ValueError as ve:
-                            # Check if it's a safety blocking issue
-                            if hasattr(response, 'prompt_feedback'):
-                                safety_feedback = response.prompt_feedback.safety_ratings
-                                block_reason = "Content blocked due to safety policies."
-                                if safety_feedback:
-                                    block_reason += f" Feedback: {safety_feedback}"
-                                
-                                # Try to get partial response if available
-                                if hasattr(response, 'candidates') and response.candidates:
-                                    candidate = response.candidates[0]
-                                    if hasattr(candidate, 'content') and candidate.content:
-                                        # Sometimes we can get the response despite blocking
-                                        try:
-                                            return candidate.content.parts[0].text
-                                        except (AttributeError, IndexError, KeyError):
-                                            pass
-                                
-                                QgsMessageLog.logMessage(
-                                    f"⚠️ Gemini API Blocked: {block_reason}",
-                                    "GeoAI",
-                                    Qgis.Warning
-                                )
-                                
-                                # Try automatic fallback to a different model
-                                if model == "models/gemini-2.5-pro" and attempt < max_retries - 1:
-                                    QgsMessageLog.logMessage(
-                                        "🔄 Auto-fallback: Trying gemini-2.5-flash instead...",
-                                        "GeoAI",
-                                        Qgis.Info
-                                    )
-                                    # Switch to flash model
-                                    model = "models/gemini-2.5-flash"
-                                    model_instance = genai.GenerativeModel(model)
-                                    continue
-                                
-                                # If this is the last attempt, provide helpful error
-                                if attempt == max_retries - 1:
-                                    # Check if we already tried flash model
-                                    tried_flash = original_model != model and "flash" in model
-                                    
-                                    if tried_flash:
-                                        error_msg = (
-                                            f"❌ Google Gemini blocked the response (even with flash model).\n\n"
-                                            f"RECOMMENDED SOLUTIONS:\n"
-                                            f"1. ⭐ Use Ollama provider (no restrictions, local)\n"
-                                            f"2. Switch to OpenAI or Anthropic provider\n"
-                                            f"3. Rephrase query with more neutral language\n"
-                                            f"4. Break query into smaller, simpler parts\n\n"
-                                            f"Note: Google has hard-coded safety filters that cannot be disabled,\n"
-                                            f"even with BLOCK_NONE settings. This is a Google API limitation."
-                                        )
-                                    else:
-                                        error_msg = (
-                                            f"❌ Google Gemini blocked the response.\n\n"
-                                            f"QUICK FIX:\n"
-                                            f"1. ⭐ Switch to 'gemini-2.5-flash' model (less strict)\n"
-                                            f"   → Select in model dropdown\n\n"
-                                            f"OTHER OPTIONS:\n"
-                                            f"2. Use Ollama provider (no restrictions)\n"
-                                            f"3. Switch to OpenAI or Anthropic\n"
-                                            f"4. Rephrase query with neutral language\n\n"
-                                            f"Note: Safety settings are already most permissive.\n"
-                                            f"Google has hard-coded filters that cannot be disabled."
-                                        )
-                                    raise ValueError(error_msg)
-                                
-                                # Retry with current model
-                                continue
-                            else:
-                                # Not a safety issue, re-raise
-                                raise ve
-                    
-                    except Exception as quota_error:
-                        error_str = str(quota_error).lower()
-                        
-                        # Check if it's a quota/rate limit error
-                        is_quota_error = False
-                        if google_exceptions and isinstance(quota_error, google_exceptions.ResourceExhausted):
-                            is_quota_error = True
-                        elif "quota" in error_str or "429" in str(quota_error) or "rate limit" in error_str:
-                            is_quota_error = True
-                        
-                        if is_quota_error:
-                            # Extract retry delay from error if available
-                            retry_seconds = retry_delay
-                            if "retry in" in error_str or "retry_delay" in error_str:
-                                match = re.search(r'retry in ([\d.]+)s?', error_str)
-                                if match:
-                                    retry_seconds = max(int(float(match.group(1))), 5)
-                            
-                            if attempt < max_retries - 1:
-                                QgsMessageLog.logMessage(
-                                    f"⚠️ Google API quota exceeded (attempt {attempt + 1}/{max_retries}). "
-                                    f"Retrying in {retry_seconds} seconds...",
-                                    "GeoAI",
-                                    Qgis.Warning
-                                )
-                                time.sleep(retry_seconds)
-                                retry_delay *= 2  # Exponential backoff
-                                continue
-                            else:
-                                # Final attempt failed
-                                error_msg = (
-                                    f"❌ Google Gemini API quota exceeded for model '{model}'.\n\n"
-                                    f"SOLUTIONS:\n"
-                                    f"1. Wait {retry_seconds} seconds and try again\n"
-                                    f"2. Switch to a different model:\n"
-                                    f"   - models/gemini-2.5-flash (faster, better free tier)\n"
-                                    f"   - models/gemini-pro-latest (alternative)\n"
-                                    f"3. Switch to a different provider (Ollama, OpenAI, etc.)\n"
-                                    f"4. Upgrade your Google API plan\n\n"
-                                    f"Free tier limits: https://ai.google.dev/gemini-api/docs/rate-limits"
-                                )
-                                QgsMessageLog.logMessage(error_msg, "GeoAI", Qgis.Critical)
-                                raise ValueError(error_msg)
-                        else:
-                            # Not a quota error, re-raise immediately
-                            raise
-                            
-            except ImportError:
-                QgsMessageLog.logMessage(
-                    "Google Generative AI SDK not installed. Install with: pip install google-generativeai",
-                    "GeoAI",
-                    Qgis.Warning,
-                )
-                raise ValueError("Google Generative AI SDK not installed")
+    def _resolve_route(self, model_provider: str = None, model_name: str = None) -> Tuple[str, str]:
+        """(provider, model) for an optional UI selection"""
+        provider = model_provider.lower() if model_provider else self.provider
+        return provider, model_name if model_name else self._default_model(provider)
 
-        elif provider == "huggingface":
-            full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
-            return self._hf_query(full_prompt)
+    def _complete(self, provider: str, model: str, prompt: str, system_prompt: str = None,
+                  system_prefix: str = None) -> QueryResponse:
+        """Single text completion on one provider/model
 
-        else:
-            raise ValueError(f"Unsupported provider: {provider}")
+        The prompt is measured against the model's context window before
+        sending; the estimate stands in when the API reports no usage.
+        """
+        prompt_tokens = count_tokens(
+            "".join(part for part in (system_prefix, system_prompt, prompt) if part), model
+        )
+        window = context_window(provider, model)
+        if prompt_tokens > window:
+            QgsMessageLog.logMessage(
+                f"⚠️ Prompt for {provider}/{model} is ~{prompt_tokens} tokens, "
+                f"above its {window} token context window",
+                "GeoAI",
+                Qgis.Warning,
+            )
+
+        extra = {"max_tokens": self.max_output_tokens} if self.max_output_tokens else {}
+        try:
+            return self._call_provider(
+                provider, "query", prompt, system_prompt, model=model,
+                system_prefix=system_prefix, prompt_tokens=prompt_tokens, **extra
+            )
+        except Exception as e:
+            if provider == "ollama":
+                QgsMessageLog.logMessage(f"Ollama error: {str(e)}", "GeoAI", Qgis.Critical)
+            elif isinstance(e, ValueError):
+                QgsMessageLog.logMessage(str(e), "GeoAI", Qgis.Warning)
+            raise
+
+    def _hedge_route(self, provider: str, model: str) -> Optional[Tuple[str, str]]:
+        """Configured secondary route, None when hedging is off or not usable"""
+        hedge_provider = (os.getenv("LLM_HEDGE_PROVIDER") or "").lower()
+        if not hedge_provider:
+            return None
+        try:
+            hedge_model = os.getenv("LLM_HEDGE_MODEL") or self._default_model(hedge_provider)
+            if hedge_provider != "ollama" and not self.registry.api_key_for(hedge_provider):
+                return None
+        except ValueError:
+            return None
+        if (hedge_provider, hedge_model) == (provider, model):
+            return None
+        return hedge_provider, hedge_model
 
     def generate_sql(
         self,
@@ -504,21 +379,68 @@ class LLMHandler:
         model_name: str = None,
     ) -> Dict:
         """Generate SQL from natural language prompt."""
-        system_prompt = self._build_sql_system_prompt(context)
+        provider, model = self._resolve_route(model_provider, model_name)
+        with span("generate_sql", provider=provider, model=model) as trace, \
+                self.metrics.timer("generate_sql", kind="request", provider=provider, model=model) as sample:
+            with span("build_prompt", prompt_version=SQL_PROMPT_VERSION):
+                # Corrections are keyed on the full schema, not the trimmed one
+                corrections = get_fix_memory().corrections(
+                    context.get("table_fields", {}), db_type=context.get("db_type")
+                )
+                trimmed = self._fit_schema_to_budget(prompt, context, model_provider, model_name)
+                system_prefix, system_prompt = build_sql_system_prompt(trimmed)
+                # Appended after the schema, so the cached prefix is unchanged
+                system_prompt += build_corrections_section(corrections)
 
-        QgsMessageLog.logMessage(
-            f"LLM Context (generate_sql): {context}", "GeoAI", Qgis.Info
-        )
+            # The full context can be huge - only rendered when debug logging is on
+            logger.debug("LLM Context (generate_sql): %s", trimmed)
 
-        try:
-            content = self._query_with_provider(
-                prompt, system_prompt, model_provider, model_name
+            try:
+                content = self._query_with_provider(
+                    prompt, system_prompt, model_provider, model_name, system_prefix=system_prefix
+                )
+                with span("parse"), self.metrics.timer("parse"):
+                    result = self._parse_sql_response(content)
+                if result.get("sql"):
+                    # Checked against the full schema: trimmed tables may still be used
+                    with span("validate_schema"):
+                        check = QueryValidator().validate_query(result["sql"], context)
+                    if not check["valid"]:
+                        result["validation"] = check
+                        QgsMessageLog.logMessage(
+                            f"Generated SQL does not match the schema: {check['message']}", "GeoAI", Qgis.Warning
+                        )
+                if self.last_response:
+                    result["tokens_used"] = self.last_response.tokens_used
+                sample["success"] = "error" not in result
+                trace.set(success=sample["success"], tokens=result.get("tokens_used"))
+                return result
+
+            except Exception as e:
+                sample["success"] = False
+                QgsMessageLog.logMessage(f"LLM Error: {str(e)}", "GeoAI", Qgis.Critical)
+                return {"error": str(e)}
+
+    def _fit_schema_to_budget(
+        self, prompt: str, context: Dict, model_provider: str = None, model_name: str = None
+    ) -> Dict:
+        """Trim the schema so prefix + schema + question fit the model's context window"""
+        provider, model = self._resolve_route(model_provider, model_name)
+        system_prefix, _ = build_sql_system_prompt(context)
+        budget = (
+            input_budget(provider, model, self.max_output_tokens)
+            - count_tokens(system_prefix, model)
+            - count_tokens(prompt, model)
+        )
+        trimmed, dropped = trim_schema_context(context, prompt, max(budget, 0), model)
+        if trimmed is not context:
+            QgsMessageLog.logMessage(
+                f"Schema trimmed to fit {provider}/{model} context window "
+                f"({dropped} table(s) omitted)",
+                "GeoAI",
+                Qgis.Info,
             )
-            return self._parse_sql_response(content)
-
-        except Exception as e:
-            QgsMessageLog.logMessage(f"LLM Error: {str(e)}", "GeoAI", Qgis.Critical)
-            return {"error": str(e)}
+        return trimmed
 
     def fix_sql_error(
         self,
@@ -527,15 +449,14 @@ class LLMHandler:
         context: Dict,
         model_provider: str = None,
         model_name: str = None,
+        variant: int = 0,
     ) -> Dict:
-        """Fix SQL query that produced an error"""
-        # Build field list separately to avoid f-string backslash issue
-        fields_list = []
-        for layer_name, fields in context.get("table_fields", {}).items():
-            quoted_fields = [f'"{field}"' for field in fields]
-            fields_list.append(f"  - {layer_name}: {', '.join(quoted_fields)}")
-
-        fields_text = "\n".join(fields_list) if fields_list else ""
+        """Fix SQL query that produced an error
+
+        ``variant`` > 0 adds a different hint to the prompt, for drawing several
+        distinct candidate fixes.
+        """
+        fields_text = build_fix_fields_section(context)
         newline = "\n"
 
         prompt = (
@@ -546,187 +467,228 @@ class LLMHandler:
             f"All Layer Fields (use exact casing with double quotes):{newline}"
             f"{fields_text}{newline}"
         )
+        if variant:
+            prompt += f"{newline}{FIX_VARIANT_HINTS[(variant - 1) % len(FIX_VARIANT_HINTS)]}{newline}"
         system_prompt = (
             "You are a SQL expert specializing in geospatial databases (PostGIS, SpatiaLite). "
             'Fix SQL errors and explain the solution. IMPORTANT: All column names must use their exact casing and be wrapped in double quotes (e.g., SELECT "Name" FROM table).'
         )
 
         try:
-            content = self._query_with_provider(
-                prompt, system_prompt, model_provider, model_name
-            )
-            return self._parse_sql_response(content)
+            with span("llm.fix_sql_error", variant=variant):
+                content = self._query_with_provider(
+                    prompt, system_prompt, model_provider, model_name
+                )
+                with span("parse"):
+                    return self._parse_sql_response(content)
         except Exception as e:
             return {"error": str(e)}
 
-    def analyze_image_to_code(
+    def _vision_query(
         self,
         image_path: str,
-        conversion_type: str,
+        prompt: str,
         model_provider: str = None,
         model_name: str = None,
-    ) -> Dict:
-        """Analyze Model Builder image and convert to code - supports direct image analysis"""
+    ) -> str:
+        """Send an image plus prompt to a vision-capable model and return the text"""
         with open(image_path, "rb") as f:
             image_data = base64.b64encode(f.read()).decode("utf-8")
+        media_type = mimetypes.guess_type(image_path)[0] or "image/png"
 
-        extraction_prompt = (
-            "Analyze this QGIS Model Builder diagram. List all:\n"
-            "1. Input layers/data sources\n"
-            "2. Processing steps/algorithms\n"
-            "3. Parameters and settings\n"
-            "4. Output layers\n"
-            "5. Connections between steps\n"
-            "Provide detailed, structured information."
-        )
+        provider = model_provider.lower() if model_provider else self.provider
+        model = model_name if model_name else self._default_model(provider, vision=True)
 
+        return self._call_provider(
+            provider, "vision_query",
+            prompt, image_data, media_type, image_path=image_path, model=model
+        ).content
+
+    def vision_extractor(self, model_provider: str = None, model_name: str = None) -> str:
+        """"provider/model" that a vision extraction with these arguments uses"""
         provider = model_provider.lower() if model_provider else self.provider
-        model = model_name if model_name else self.vision_model
+        model = model_name if model_name else self._default_model(provider, vision=True)
+        return f"{provider}/{model}"
+
+    def extract_workflow_graph(
+        self,
+        image_path: str,
+        model_provider: str = None,
+        model_name: str = None,
+    ) -> Dict:
+        """Run the (expensive) vision pass once and return the structured workflow
 
+        Returns {"graph": WorkflowGraph, "extracted_info": str} or {"error": str}.
+        If the model ignores the JSON format the raw description is kept in
+        the graph notes so it can still drive code generation.
+        """
         try:
-            if provider == "anthropic":
-                r = self.client.messages.create(
-                    model=model,
-                    max_tokens=4000,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "image",
-                                    "source": {
-                                        "type": "base64",
-                                        "media_type": "image/png",
-                                        "data": image_data,
-                                    },
-                                },
-                                {"type": "text", "text": extraction_prompt},
-                            ],
-                        }
-                    ],
-                )
-                extracted_info = r.content[0].text
-            elif provider == "openai":
-                r = self.client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": extraction_prompt},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/png;base64,{image_data}",
-                                    },
-                                },
-                            ],
-                        }
-                    ],
+            content = self._vision_query(
+                image_path, WORKFLOW_EXTRACTION_PROMPT, model_provider, model_name
+            )
+        except Exception as e:
+            return {"error": str(e)}
+
+        graph = WorkflowGraph.from_llm_response(content)
+        if graph is None:
+            QgsMessageLog.logMessage(
+                "Vision model did not return JSON, keeping free-text extraction",
+                "GeoAI",
+                Qgis.Warning,
+            )
+            graph = WorkflowGraph(notes=content.strip())
+        graph.source = "vision"
+        graph.extracted_by = self.vision_extractor(model_provider, model_name)
+
+        QgsMessageLog.logMessage(
+            f"Extracted workflow: {len(graph.inputs)} inputs, {len(graph.steps)} steps, "
+            f"{len(graph.edges)} edges",
+            "GeoAI",
+            Qgis.Info,
+        )
+        return {"graph": graph, "extracted_info": content}
+
+    def _generate_workflow_code(
+        self,
+        graph: WorkflowGraph,
+        target: str,
+        model_provider: str = None,
+        model_name: str = None,
+    ) -> Dict:
+        """Generate one code target from the workflow graph
+
+        Recognised algorithms are emitted from templates; the LLM is only
+        called to fill in the steps the emitter could not handle.
+        """
+        emitted = CodeEmitter().emit(graph, target) if graph.steps else None
+        if emitted is not None and emitted.complete:
+            return {
+                "code": emitted.code,
+                "explanation": "Generated from algorithm templates (no LLM call)",
+                "method": "template",
+            }
+
+        if target == "python":
+            system_prompt = (
+                "You are an expert in PyQGIS and the QGIS Processing framework. "
+                "Convert the QGIS Model Builder workflow into a standalone PyQGIS script "
+                "that chains processing.run(...) calls in the given order. "
+                "Use the exact algorithm ids and parameter names provided. "
+                "Put the script in a ```python ... ``` block."
+            )
+        else:
+            system_prompt = (
+                "You are an expert in geospatial SQL (PostGIS, SpatiaLite). "
+                "Convert the QGIS Model Builder workflow into equivalent PostGIS SQL, "
+                "one CTE per processing step in the given order. "
+                "Treat model inputs as table names. Put the SQL in a ```sql ... ``` block."
+            )
+
+        if emitted is not None:
+            prompt = (
+                f"QGIS Model Builder workflow:\n\n{graph.to_prompt()}\n\n"
+                f"Draft {target} code generated from templates:\n\n{emitted.code}\n"
+                f"Replace only the TODO blocks for steps {', '.join(emitted.unresolved)} "
+                f"with working code and keep everything else unchanged. "
+                f"Return the complete {target} code with comments."
+            )
+        else:
+            prompt = (
+                f"QGIS Model Builder workflow:\n\n{graph.to_prompt()}\n\n"
+                f"Generate clean, executable {target} code with comments."
+            )
+
+        method = "template+llm" if emitted is not None else "llm"
+        try:
+            content = self._query_with_provider(
+                prompt, system_prompt, model_provider, model_name
+            )
+        except Exception as e:
+            return {"error": str(e)}
+
+        if target == "python":
+            match = re.search(r"```python\s*\n(.*?)\n```", content or "", re.DOTALL)
+            code = match.group(1).strip() if match else (content or "").strip()
+            return {"code": code, "explanation": content, "method": method}
+
+        parsed = self._parse_sql_response(content)
+        return {
+            "code": parsed.get("sql", ""),
+            "explanation": parsed.get("explanation", ""),
+            "method": method,
+        }
+
+    def generate_code_from_workflow(
+        self,
+        graph: WorkflowGraph,
+        targets: List[str],
+        model_provider: str = None,
+        model_name: str = None,
+    ) -> Dict[str, Dict]:
+        """Generate several code targets from one graph in parallel text-only calls"""
+        targets = [t.lower() for t in targets]
+        if len(targets) == 1:
+            return {
+                targets[0]: self._generate_workflow_code(
+                    graph, targets[0], model_provider, model_name
                 )
-                extracted_info = r.choices[0].message.content
-            elif provider == "google":
-                import google.generativeai as genai
-
-                # Configure safety settings to be most permissive
-                try:
-                    from google.generativeai.types import HarmCategory, HarmBlockThreshold
-                    safety_settings = [
-                        {
-                            "category": HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                            "threshold": HarmBlockThreshold.BLOCK_NONE,
-                        },
-                        {
-                            "category": HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                            "threshold": HarmBlockThreshold.BLOCK_NONE,
-                        },
-                        {
-                            "category": HarmCategory.HARM_CATEGORY_HARASSMENT,
-                            "threshold": HarmBlockThreshold.BLOCK_NONE,
-                        },
-                        {
-                            "category": HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                            "threshold": HarmBlockThreshold.BLOCK_NONE,
-                        },
-                    ]
-                except ImportError:
-                    # Fallback to string format
-                    safety_settings = [
-                        {
-                            "category": "HARM_CATEGORY_HATE_SPEECH",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_HARASSMENT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                    ]
+            }
 
-                model_instance = self.client.GenerativeModel(model)
-                response = model_instance.generate_content(
-                    [extraction_prompt, genai.upload_file(image_path)],
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.4, top_p=0.0, top_k=1, max_output_tokens=3000
-                    ),
-                    safety_settings=safety_settings,
+        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+            futures = {
+                target: pool.submit(
+                    self._generate_workflow_code, graph, target, model_provider, model_name
                 )
-                try:
-                    extracted_info = response.text
-                except ValueError:
-                    # Try to get partial response
-                    if hasattr(response, 'candidates') and response.candidates:
-                        candidate = response.candidates[0]
-                        if hasattr(candidate, 'content') and candidate.content:
-                            try:
-                                extracted_info = candidate.content.parts[0].text
-                            except (AttributeError, IndexError, KeyError):
-                                pass
-                    
-                    if 'extracted_info' not in locals() or not extracted_info:
-                        safety_feedback = response.prompt_feedback.safety_ratings if hasattr(response, 'prompt_feedback') else None
-                        block_reason = "Content blocked due to safety policies."
-                        if safety_feedback:
-                            block_reason += f" Feedback: {safety_feedback}"
-                        QgsMessageLog.logMessage(
-                            f"⚠️ Gemini API Blocked (Vision): {block_reason}",
-                            "GeoAI",
-                            Qgis.Warning,
-                        )
-                        return {"error": f"AI response blocked (Vision): {block_reason}"}
-            elif provider == "ollama":
-                extracted_info = self._ollama_query(
-                    extraction_prompt, images=[image_data], model=model
+                for target in targets
+            }
+            return {target: future.result() for target, future in futures.items()}
+
+    def analyze_image_to_code(
+        self,
+        image_path: str,
+        conversion_type: str,
+        model_provider: str = None,
+        model_name: str = None,
+        workflow_graph: Optional[WorkflowGraph] = None,
+    ) -> Dict:
+        """Analyze Model Builder image and convert to code
+
+        The image is only sent once: the extracted workflow graph is reused
+        for every requested target. Pass a previously extracted
+        ``workflow_graph`` to skip the vision call entirely.
+        """
+        try:
+            if workflow_graph is None:
+                extraction = self.extract_workflow_graph(
+                    image_path, model_provider, model_name
                 )
+                if "error" in extraction:
+                    return extraction
+                workflow_graph = extraction["graph"]
+                extracted_info = extraction["extracted_info"]
             else:
-                return {
-                    "error": f"Image analysis not supported for {provider}. Use Anthropic, OpenAI, or Google."
-                }
+                extracted_info = workflow_graph.to_prompt()
 
-            # Step 2: Convert extracted info to code using text model
-            code_prompt = (
-                f"Based on this QGIS Model Builder analysis, generate {conversion_type} code:\n\n"
-                f"{extracted_info}\n\n"
-                f"Generate clean, executable {conversion_type} code with comments."
+            conversion_type = conversion_type.lower()
+            targets = ["sql", "python"] if conversion_type == "both" else [conversion_type]
+            generated = self.generate_code_from_workflow(
+                workflow_graph, targets, model_provider, model_name
             )
 
-            code_result = self.generate_sql(code_prompt, {}, model_provider, model_name)
+            errors = [r["error"] for r in generated.values() if "error" in r]
+            if len(errors) == len(generated):
+                return {"error": errors[0], "workflow_graph": workflow_graph.to_dict()}
+
+            sql_code = generated.get("sql", {}).get("code") or None
+            python_code = generated.get("python", {}).get("code") or None
 
             return {
-                "code": (
-                    code_result.get("sql", "")
-                    if conversion_type.lower() == "sql"
-                    else extracted_info
-                ),
+                "code": sql_code or python_code or "",
+                "sql_code": sql_code,
+                "python_code": python_code,
                 "type": conversion_type,
                 "extracted_info": extracted_info,
+                "workflow_graph": workflow_graph.to_dict(),
             }
 
         except Exception as e:
@@ -912,220 +874,9 @@ Generate the code now:"""
             )
             return [f"Error getting suggestions: {str(e)}"]
 
-    def _build_sql_system_prompt(self, context: Dict) -> str:
-        """Build system prompt with proper column formatting"""
-        tables_info = []
-        table_names_list = []
-        table_formatting_info = []
-        
-        for table_name, fields in context.get("table_fields", {}).items():
-            # Determine if table name needs quotes (mixed case or special chars)
-            table_needs_quotes = table_name != table_name.lower() or not table_name.replace('_', '').isalnum()
-            table_format = f'"{table_name}"' if table_needs_quotes else table_name
-            table_names_list.append(table_format)
-            
-            # Format columns - only quote if mixed case
-            fields_formatted = []
-            for field in fields:
-                if field != field.lower() or not field.replace('_', '').isalnum():
-                    fields_formatted.append(f'"{field}"')
-                else:
-                    fields_formatted.append(field)
-            
-            fields_str = ", ".join(fields_formatted)
-            tables_info.append(f"{table_format}: {fields_str}")
-            table_formatting_info.append(f"  - {table_format} (columns: {fields_str})")
-
-        # Check if we have any tables loaded
-        has_tables = len(table_names_list) > 0
-
-        if has_tables:
-            tables_info_str = "\n".join(tables_info)
-            available_tables = ", ".join(table_names_list)
-            table_formatting_str = "\n".join(table_formatting_info)
-            
-            # Detect geometry column name (usually 'geom' not 'geometry')
-            geom_column_examples = []
-            for table_name_raw, fields in context.get("table_fields", {}).items():
-                # Get formatted table name (with or without quotes)
-                table_needs_quotes = table_name_raw != table_name_raw.lower() or not table_name_raw.replace('_', '').isalnum()
-                table_name_formatted = f'"{table_name_raw}"' if table_needs_quotes else table_name_raw
-                
-                for field in fields:
-                    if 'geom' in field.lower() and 'geometry' not in field.lower():
-                        # Format field name (with or without quotes)
-                        field_needs_quotes = field != field.lower() or not field.replace('_', '').isalnum()
-                        field_formatted = f'"{field}"' if field_needs_quotes else field
-                        geom_column_examples.append(f"  - {table_name_formatted}.{field_formatted}")
-                        break
-            
-            geom_column_note = ""
-            if geom_column_examples:
-                geom_column_note = "\n=== GEOMETRY COLUMN ===\n"
-                geom_column_note += "IMPORTANT: The geometry column is typically 'geom' NOT 'geometry'.\n"
-                geom_column_note += "Examples from your database:\n"
-                geom_column_note += "\n".join(geom_column_examples[:3]) + "\n"
-                geom_column_note += "Always use 'geom' for geometry operations unless the column is explicitly named 'geometry'.\n\n"
-            
-            return (
-                "You are an expert in geospatial SQL (PostGIS, SpatiaLite). Generate precise, EXECUTABLE SQL queries that will run successfully on the user's database.\n"
-                f"Database Type: {context.get('db_type','PostgreSQL/PostGIS')}\n"
-                f"CRS: {context.get('crs','EPSG:4326')}\n\n"
-                "=== ⚠️ CRITICAL RULES - READ CAREFULLY ⚠️ ===\n"
-                f"ONLY USE THESE DATABASE TABLES: {available_tables}\n"
-                "DO NOT invent or guess table names.\n"
-                "DO NOT use QGIS layer names (e.g., 'Example11/Buildings.shp') - these are NOT database table names.\n"
-                "DO NOT use file paths or file extensions (e.g., '.shp', '/', '\\') in table names.\n"
-                "ONLY use the exact database table names listed above (e.g., 'buildings', 'roads', 'landuse').\n"
-                "If user asks about a table not in the list, respond: 'Table not found. Available tables are: [list them]'\n"
-                "If user mentions a QGIS layer name that looks like a file path, map it to the actual database table name.\n"
-                "Example: 'Example11/Buildings.shp' → 'buildings' (check AVAILABLE TABLES above)\n"
-                "ALL queries MUST be executable - test your syntax mentally before generating.\n\n"
-                "=== 🔴 STRICT COLUMN NAME RULES - MANDATORY 🔴 ===\n"
-                "YOU MUST USE ONLY THE EXACT COLUMN NAMES LISTED BELOW.\n"
-                "NEVER guess, assume, or invent column names.\n"
-                "NEVER use column names that are NOT in the AVAILABLE TABLES list below.\n"
-                "If a user requests a column that is NOT in the list:\n"
-                "  1. First, check if a similar column exists (case-insensitive match)\n"
-                "  2. If found, use the EXACT name from the list (with correct case and quotes)\n"
-                "  3. If NOT found, generate a query to discover columns: SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' AND table_name = 'table_name';\n"
-                "  4. Or inform the user: 'Column [name] not found. Available columns for [table] are: [list from AVAILABLE TABLES]'\n\n"
-                "=== AVAILABLE TABLES AND COLUMNS (USE ONLY THESE) ===\n"
-                f"{tables_info_str}\n\n"
-                f"{geom_column_note}"
-                "=== SQL FORMATTING RULES ===\n"
-                "1. TABLE NAMES:\n"
-                "   - Lowercase table names (e.g., 'buildings'): Use WITHOUT quotes: FROM buildings\n"
-                "   - Mixed-case table names (e.g., 'Buildings'): Use WITH quotes: FROM \"Buildings\"\n"
-                "   - Check the exact table name format in AVAILABLE TABLES above\n\n"
-                "2. COLUMN NAMES (STRICT - SAVE AND REMEMBER - NO QUOTES FOR LOWERCASE):\n"
-                "   - You MUST use ONLY the exact column names from AVAILABLE TABLES above\n"
-                "   - SAVE and REMEMBER all column names from AVAILABLE TABLES for future queries\n"
-                "   - CRITICAL: If column name in AVAILABLE TABLES is lowercase (e.g., 'id', 'geom', 'area', 'owner', 'type'):\n"
-                "     * Use WITHOUT quotes: SELECT id, area, owner, type, geom\n"
-                "     * NEVER use quotes for lowercase columns: WRONG: SELECT \"id\", \"area\" - CORRECT: SELECT id, area\n"
-                "   - If column name in AVAILABLE TABLES is mixed-case (e.g., 'OWNER', 'TYPE'):\n"
-                "     * Use WITH quotes: SELECT \"OWNER\", \"TYPE\"\n"
-                "   - IMPORTANT: 99% of PostgreSQL columns are lowercase - ALWAYS use WITHOUT quotes\n"
-                "   - If a column name is requested but NOT in AVAILABLE TABLES, DO NOT use it\n"
-                "   - Instead, generate a discovery query or inform the user the column doesn't exist\n"
-                "   - Example: If AVAILABLE TABLES shows 'area', 'owner', 'type' (lowercase), use: SELECT area, owner, type\n"
-                "   - Example: NEVER write SELECT \"area\" - write SELECT area (lowercase = no quotes)\n"
-                "   - Example: NEVER write SELECT \"id\" - write SELECT id (lowercase = no quotes)\n"
-                "   - REMEMBER: Once you see column names in AVAILABLE TABLES, use them consistently in all future queries\n"
-                "   - ALWAYS check AVAILABLE TABLES above before writing any column name\n\n"
-                "3. GEOMETRY COLUMN:\n"
-                "   - Use 'geom' NOT 'geometry' unless the column is explicitly named 'geometry' in AVAILABLE TABLES\n"
-                "   - Check AVAILABLE TABLES to see the exact geometry column name\n"
-                "   - If 'geom' is lowercase in AVAILABLE TABLES, use WITHOUT quotes: SELECT geom\n"
-                "   - Example: SELECT geom FROM buildings (not SELECT geometry FROM buildings, not SELECT \"geom\")\n\n"
-                "4. QUERY STRUCTURE:\n"
-                "   - Put SQL in ```sql ... ``` block\n"
-                "   - Use proper PostgreSQL/PostGIS syntax\n"
-                "   - Include LIMIT clause for large result sets\n"
-                "   - DO NOT add comments after semicolon (-- comments)\n"
-                "   - DO NOT add explanations in the SQL code itself\n"
-                "   - Generate ONLY the SQL query, nothing else\n"
-                "   - Test that the query will execute successfully\n\n"
-                "=== EXAMPLES ===\n"
-                "CORRECT (using exact lowercase column names WITHOUT quotes - MOST COMMON - 99% OF CASES):\n"
-                "```sql\n"
-                "SELECT id, area, owner, type, geom\n"
-                "FROM buildings\n"
-                "WHERE area > 1000\n"
-                "LIMIT 10;\n"
-                "```\n"
-                "(This is correct if 'area', 'owner', 'type', 'geom' are lowercase in AVAILABLE TABLES for 'buildings')\n"
-                "NOTE: All lowercase columns = NO QUOTES. This is the standard PostgreSQL format.\n\n"
-                "WRONG (using quotes for lowercase columns - DO NOT DO THIS):\n"
-                "```sql\n"
-                "SELECT \"id\", \"area\", \"owner\", \"type\", geom\n"
-                "FROM \"buildings\"\n"
-                "WHERE \"area\" > 1000;\n"
-                "```\n"
-                "This is WRONG because lowercase columns and table names should NOT have quotes.\n\n"
-                "CORRECT (simple query - what user wants):\n"
-                "```sql\n"
-                "SELECT id, address, area, owner\n"
-                "FROM buildings;\n"
-                "```\n"
-                "Simple, clean, no quotes, no comments, just the SQL.\n\n"
-                "CORRECT (using exact mixed-case column names from AVAILABLE TABLES - LESS COMMON):\n"
-                "```sql\n"
-                "SELECT id, \"OWNER\", \"TYPE\", \"AREA\", geom\n"
-                "FROM buildings\n"
-                "WHERE \"AREA\" > 1000\n"
-                "LIMIT 10;\n"
-                "```\n"
-                "(This is correct ONLY if 'OWNER', 'TYPE', 'AREA' are mixed-case in AVAILABLE TABLES for 'buildings')\n\n"
-                "CORRECT (all lowercase columns from AVAILABLE TABLES):\n"
-                "```sql\n"
-                "SELECT id, name, geom\n"
-                "FROM cities\n"
-                "WHERE population > 10000;\n"
-                "```\n"
-                "(This is correct ONLY if 'name', 'population' are in AVAILABLE TABLES for 'cities')\n\n"
-                "INCORRECT (using column NOT in AVAILABLE TABLES or wrong format):\n"
-                "```sql\n"
-                "SELECT \"id\", \"area\" FROM buildings;  -- WRONG: lowercase columns should NOT have quotes\n"
-                "SELECT id, \"OWNER\" FROM buildings;  -- WRONG if 'OWNER' is not in AVAILABLE TABLES (check if it's 'owner' lowercase)\n"
-                "SELECT geometry FROM buildings;  -- WRONG: should be 'geom' (check AVAILABLE TABLES)\n"
-                "SELECT id, area, geom FROM \"buildings\";  -- WRONG: lowercase table should NOT have quotes\n"
-                "```\n\n"
-                "CORRECT (when column not found, generate discovery query):\n"
-                "```sql\n"
-                "SELECT column_name, data_type\n"
-                "FROM information_schema.columns\n"
-                "WHERE table_schema = 'public' AND table_name = 'buildings'\n"
-                "ORDER BY ordinal_position;\n"
-                "```\n\n"
-                "=== FINAL CHECK - MANDATORY BEFORE GENERATING SQL ===\n"
-                "Before generating ANY SQL query, you MUST:\n"
-                "1. ✅ Look at AVAILABLE TABLES above and find the exact table name (usually lowercase like 'buildings')\n"
-                "2. ✅ Verify table name matches EXACTLY (case-sensitive) from AVAILABLE TABLES\n"
-                "3. ✅ NEVER use QGIS layer names (e.g., 'Example11/Buildings.shp', 'Example11_Buildings') - use database table names only\n"
-                "4. ✅ If user mentions a layer name, map it to the actual database table from AVAILABLE TABLES\n"
-                "5. ✅ Look at AVAILABLE TABLES above and find the exact column names for that table\n"
-                "6. ✅ Verify EVERY column name matches EXACTLY (case-sensitive) from AVAILABLE TABLES\n"
-                "7. ✅ If column is lowercase in AVAILABLE TABLES, use WITHOUT quotes (e.g., area NOT \"area\")\n"
-                "8. ✅ If column is mixed-case in AVAILABLE TABLES, use WITH quotes (e.g., \"OWNER\")\n"
-                "9. ✅ Check geometry column name from AVAILABLE TABLES (usually 'geom' lowercase, no quotes)\n"
-                "10. ✅ If a requested column is NOT in AVAILABLE TABLES, generate discovery query OR inform user\n"
-                "11. ✅ Verify query syntax is valid PostgreSQL/PostGIS\n"
-                "12. ✅ Ensure query will execute successfully without errors\n\n"
-                "=== REMEMBER AND SAVE ===\n"
-                "1. SAVE all column names from AVAILABLE TABLES - remember them for all future queries\n"
-                "2. Use the EXACT column names from AVAILABLE TABLES (case-sensitive)\n"
-                "3. CRITICAL RULE: Lowercase columns = NO QUOTES, Mixed-case columns = WITH QUOTES\n"
-                "4. If you use a column name that is NOT in AVAILABLE TABLES, the query WILL FAIL\n"
-                "5. If you use quotes for lowercase columns (e.g., \"area\"), the query WILL FAIL\n"
-                "6. If you use a QGIS layer name instead of a database table name, the query WILL FAIL\n"
-                "7. Always check AVAILABLE TABLES first. When in doubt, generate a discovery query\n"
-                "8. Database table names are simple identifiers (e.g., 'buildings'), NOT file paths (e.g., 'Example11/Buildings.shp')\n"
-                "9. Most PostgreSQL columns are lowercase - ALWAYS use them WITHOUT quotes (e.g., area, owner, type, geom)\n"
-                "10. Once you see column names in AVAILABLE TABLES, use them consistently - SAVE them in your memory\n"
-                "11. Before writing any SQL, STOP and check AVAILABLE TABLES above for exact column names\n\n"
-            )
-        else:
-            # No tables loaded - always return the discovery query
-            return (
-                "You are an expert in geospatial SQL (PostGIS, SpatiaLite).\n"
-                f"Database Type: {context.get('db_type','PostgreSQL/PostGIS')}\n\n"
-                "=== NO TABLES DETECTED ===\n"
-                "There are no tables loaded in QGIS. Before answering ANY query, you MUST first provide the SQL to discover available tables.\n\n"
-                "ALWAYS respond with this SQL first:\n"
-                "```sql\n"
-                "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' ORDER BY table_name;\n"
-                "```\n\n"
-                "After running this query, the user will know what tables exist and can ask more specific questions.\n"
-                "Do NOT invent or guess table names. Always provide the discovery query above first.\n"
-            )
-
     def _parse_sql_response(self, content: str) -> Dict:
         """Parse SQL from LLM response and clean it"""
-        QgsMessageLog.logMessage(
-            f"Raw LLM content for SQL parsing: {content}", "GeoAI", Qgis.Info
-        )
+        logger.debug("Raw LLM content for SQL parsing: %s", content)
 
         sql = ""
         explanation = content
@@ -1193,7 +944,8 @@ Generate the code now:"""
 
         # Clean SQL: Remove any stray curly braces, unnecessary quotes, and comments
         if sql:
-            sql_lines = sql.split("\n")
+            # Comments are removed by the tokenizer, so "--" inside a string literal survives
+            sql_lines = strip_comments(sql).split("\n")
             cleaned_lines = []
             for line in sql_lines:
                 stripped = line.strip()
@@ -1205,35 +957,20 @@ Generate the code now:"""
                     # Very short lines with just braces are likely formatting
                     if "SELECT" not in stripped.upper() and "FROM" not in stripped.upper() and "JSON" not in stripped.upper():
                         continue
-                # Remove SQL comments (-- ...)
-                if "--" in line:
-                    # Keep the SQL part, remove comment
-                    comment_pos = line.find("--")
-                    line = line[:comment_pos].rstrip()
-                cleaned_lines.append(line)
+                cleaned_lines.append(line.rstrip())
             
             sql = "\n".join(cleaned_lines).strip()
             
             # Post-process: Remove unnecessary quotes from lowercase identifiers
-            # This fixes cases where LLM adds quotes to lowercase column/table names
-            # Pattern: "lowercase_identifier" -> lowercase_identifier (only for simple lowercase identifiers)
-            # But preserve quotes for mixed-case or special characters
-            def remove_unnecessary_quotes(match):
-                quoted = match.group(1)
-                # If it's a simple lowercase identifier, remove quotes
-                if quoted.islower() and quoted.replace('_', '').isalnum():
-                    return quoted
-                # Otherwise keep quotes (mixed-case or special chars)
-                return f'"{quoted}"'
-            
-            # Remove quotes from lowercase table names: "buildings" -> buildings
-            sql = re.sub(r'"([a-z_][a-z0-9_]*)"', remove_unnecessary_quotes, sql)
-            
-            # Remove quotes from lowercase column names in SELECT, WHERE, etc.
-            # But be careful not to break string literals
-            # Pattern: Match quoted identifiers that are lowercase
-            # This is a simplified approach - a full SQL parser would be better
-            sql = re.sub(r'\b"([a-z_][a-z0-9_]*)"\b', r'\1', sql)
+            # This fixes cases where LLM adds quotes to lowercase column/table names:
+            # "buildings" -> buildings. Mixed-case or special-character names keep
+            # their quotes, and string literals are never touched.
+            sql = "".join(
+                token.text[1:-1]
+                if token.kind == QUOTED_IDENTIFIER and SIMPLE_IDENTIFIER_RE.match(token.text[1:-1])
+                else token.text
+                for token in tokenize(sql)
+            )
             
             # Fix common syntax errors
             # Fix: 1nerous -> 1000 (common LLM typo)
@@ -1241,9 +978,7 @@ Generate the code now:"""
             # Fix: area > 1 -> area > 1000 (if it's clearly a typo)
             sql = re.sub(r'\barea\s*>\s*1\s*;', 'area > 1000;', sql, flags=re.IGNORECASE)
             
-            QgsMessageLog.logMessage(
-                f"Cleaned SQL: {sql[:200]}...", "GeoAI", Qgis.Info
-            )
+            logger.debug("Cleaned SQL: %s", sql)
             
             # Remove standalone curly braces on their own lines (formatting artifacts)
             # But preserve braces that are part of JSON functions or valid SQL
@@ -1255,10 +990,8 @@ Generate the code now:"""
         if not explanation.strip() and content.strip():
             explanation = content.strip()
 
-        QgsMessageLog.logMessage(f"Parsed SQL: {sql[:200]}...", "GeoAI", Qgis.Info)
-        QgsMessageLog.logMessage(
-            f"Parsed Explanation: {explanation[:200]}...", "GeoAI", Qgis.Info
-        )
+        logger.info("Parsed SQL: %s", sql[:200])
+        logger.debug("Parsed Explanation: %s", explanation)
 
         return {
             "sql": sql,
@@ -1,78 +1,313 @@
 """
 Query Validator - Validates SQL queries against actual database schema
+
+Column references are resolved per table / alias against a precomputed
+schema index. With sqlglot installed the query is parsed and each scope
+(subqueries, CTEs, correlated references) is checked against its own
+sources; without it, or when parsing fails, a tokenizer pass checks the
+names outside literals against the tables in FROM / JOIN. Names that can't
+be attributed to a known table (CTE or subquery columns, select aliases,
+function names) are never reported as missing, and neither are system
+catalogues (information_schema, pg_catalog, spatial_ref_sys...), which are
+not part of the layer schema. Column names follow the database's
+case-folding: on PostgreSQL a bare ``owner`` does not match ``"Owner"``.
 """
 
-from typing import Dict
+from typing import Dict, List, Optional
+
+from ..core.sql import (
+    COMMENT, QUOTED_IDENTIFIER, SQL_KEYWORDS, WHITESPACE, WORD, SchemaIndex, is_case_sensitive, quote_identifier,
+    schema_index, tokenize, unquote_identifier,
+)
+
+try:
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.optimizer.scope import traverse_scope
+except ImportError:
+    sqlglot = None
+
+# System / geometry columns that are not listed among a layer's fields
+IMPLICIT_COLUMNS = {"geom", "geometry", "wkb_geometry", "rowid", "oid", "ctid"}
+# Catalogue schemas / tables the database provides, never in the layer schema
+SYSTEM_SCHEMAS = {"information_schema", "pg_catalog", "pg_toast", "topology"}
+SYSTEM_TABLES = {
+    "spatial_ref_sys", "geometry_columns", "geography_columns", "raster_columns", "raster_overviews",
+    "sqlite_master", "sqlite_schema", "sqlite_sequence", "sqlite_stat1", "spatialite_history",
+    "views_geometry_columns", "virts_geometry_columns",
+}
+SYSTEM_PREFIXES = ("pg_", "gpkg_", "sqlite_", "rtree_")
+SQLGLOT_DIALECTS = {"PostgreSQL/PostGIS": "postgres", "SpatiaLite": "sqlite", "GeoPackage": "sqlite"}
+# Words after FROM / JOIN <table> that are not aliases
+NOT_ALIAS = {
+    "where", "on", "join", "inner", "left", "right", "full", "cross", "natural", "group", "order",
+    "limit", "having", "union", "using", "offset", "window", "except", "intersect",
+}
+# Words that continue a multi-word type name (double precision, timestamp with time zone...)
+TYPE_CONTINUATIONS = {
+    "precision", "varying", "with", "without", "time", "zone",
+    "year", "month", "day", "hour", "minute", "second", "to",
+}
+
+
+def is_system_table(table: str) -> bool:
+    """Table reference names a database catalogue rather than user data"""
+    parts = table.lower().replace('"', "").split(".")
+    if len(parts) > 1 and parts[-2] in SYSTEM_SCHEMAS:
+        return True
+    return parts[-1] in SYSTEM_TABLES or parts[-1].startswith(SYSTEM_PREFIXES)
+
+
+def quote_written(identifier) -> str:
+    """sqlglot identifier as it was written (quoted names keep their quotes)"""
+    if identifier.args.get("quoted"):
+        return '"' + identifier.name.replace('"', '""') + '"'
+    return identifier.name
 
 
 class QueryValidator:
     """Validates SQL queries against actual database schema."""
 
-    def __init__(self, sql_executor):
+    def __init__(self, sql_executor=None):
         self.sql_executor = sql_executor
 
     def validate_query(self, sql: str, context: Dict) -> Dict:
-        """Validate that query uses only existing fields."""
-
-        import re
-
-        # Extract field names from SQL
-        field_pattern = r'\b([a-zA-Z_][a-zA-Z0-9_]*)\b'
-        fields_in_query = set(re.findall(field_pattern, sql))
+        """Validate that query uses only existing tables and fields."""
 
-        # Remove SQL keywords
-        sql_keywords = {
-            'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'AS', 'JOIN',
-            'LEFT', 'RIGHT', 'INNER', 'OUTER', 'ON', 'GROUP', 'BY',
-            'ORDER', 'LIMIT', 'OFFSET', 'HAVING', 'DISTINCT', 'COUNT',
-            'SUM', 'AVG', 'MIN', 'MAX', 'ST_Area', 'ST_Distance'
-        }
-        fields_in_query = {f for f in fields_in_query if f.upper() not in sql_keywords}
+        index = schema_index(context.get("table_fields", {}))
+        case_sensitive = is_case_sensitive(context.get("db_type"))
+        scopes = None
+        if sqlglot is not None:
+            try:
+                scopes = self._scopes_from_ast(sql, SQLGLOT_DIALECTS.get(context.get("db_type")))
+            except Exception:
+                # Dialect quirks sqlglot can't parse - use the token pass
+                scopes = None
+        if scopes is None:
+            scopes = [self._scope_from_tokens(sql)]
 
-        # Get all available fields
-        available_fields = set()
-        table_fields = context.get("table_fields", {})
-        for table_name, fields in table_fields.items():
-            available_fields.update(fields)
+        missing_fields: Dict[str, List[str]] = {}
+        missing_tables: List[str] = []
+        for scope in scopes:
+            for table in scope["sources"].values():
+                if (
+                    table and index.table(table) is None and not is_system_table(table)
+                    and table not in missing_tables
+                ):
+                    missing_tables.append(table)
+            for qualifier, column in scope["columns"]:
+                # Column as written: bare, or double-quoted with its exact case
+                name = unquote_identifier(column).lower()
+                if name in IMPLICIT_COLUMNS or name in scope["aliases"]:
+                    continue
+                tables = self._candidate_tables(index, scope, qualifier)
+                if tables is None or any(index.resolves(column, case_sensitive, t) for t in tables):
+                    continue
+                missing_fields.setdefault(column, tables)
 
-        # Find missing fields
-        missing_fields = fields_in_query - available_fields - {'geom', 'geometry', 'wkb_geometry'}
-
-        if missing_fields:
+        if missing_fields or missing_tables:
             # Try to suggest alternatives
-            suggestions = self._suggest_alternatives(missing_fields, available_fields)
+            suggestions = self._suggest_alternatives(missing_fields, index)
+            for table in missing_tables:
+                matches = index.suggest_tables(table)
+                if matches:
+                    suggestions[table] = matches
 
+            problems = []
+            if missing_tables:
+                problems.append(f"Tables not found: {', '.join(missing_tables)}")
+            if missing_fields:
+                problems.append(f"Fields not found: {', '.join(missing_fields)}")
             return {
                 "valid": False,
                 "missing_fields": list(missing_fields),
+                "missing_tables": missing_tables,
                 "suggestions": suggestions,
-                "message": f"Fields not found: {', '.join(missing_fields)}"
+                "message": "; ".join(problems)
             }
 
         return {"valid": True, "message": "Query appears valid"}
 
-    def _suggest_alternatives(self, missing_fields: set, available_fields: set) -> Dict:
-        """Suggest similar field names or calculations."""
+    @staticmethod
+    def _candidate_tables(index: SchemaIndex, scope: Dict, qualifier: str) -> Optional[List[str]]:
+        """Known tables a column may come from; None when it can't be checked"""
+        while scope is not None:
+            sources = scope["sources"]
+            if qualifier:
+                if qualifier in sources:
+                    table = sources[qualifier] and index.table(sources[qualifier])
+                    return [table] if table else None
+            elif sources:
+                tables = [index.table(t) if t else None for t in sources.values()]
+                # A derived table or an unknown table could provide the column
+                return None if None in tables else tables
+            # Correlated reference to an outer query
+            scope = scope["parent"]
+        return None
+
+    @staticmethod
+    def _scopes_from_ast(sql: str, dialect: Optional[str]) -> List[Dict]:
+        """Sources, column references and select aliases of every query scope"""
+        tree = sqlglot.parse_one(sql, read=dialect)
+        scopes = list(traverse_scope(tree))
+        entries = {}
+        for scope in scopes:
+            sources = {}
+            for alias, source in scope.sources.items():
+                if isinstance(source, exp.Table) and isinstance(source.this, exp.Identifier):
+                    sources[alias.lower()] = ".".join(p for p in (source.db, source.name) if p)
+                else:
+                    # CTE, subquery or table function
+                    sources[alias.lower()] = None
+            selects = getattr(scope.expression, "selects", [])
+            entries[id(scope)] = {
+                "sources": sources,
+                "columns": [
+                    (column.table.lower(), quote_written(column.this))
+                    for column in scope.columns
+                    if not isinstance(column.this, exp.Star)
+                ],
+                "aliases": {s.alias.lower() for s in selects if isinstance(s, exp.Alias)},
+                "parent": None,
+            }
+        for scope in scopes:
+            if scope.parent is not None:
+                entries[id(scope)]["parent"] = entries.get(id(scope.parent))
+        # Statements without query scopes (UPDATE, DELETE...) use the token pass
+        return list(entries.values()) or None
+
+    @staticmethod
+    def _scope_from_tokens(sql: str) -> Dict:
+        """Single flat scope from the token stream (no parser available)"""
+        tokens = [t for t in tokenize(sql) if t.kind not in (WHITESPACE, COMMENT)]
+        names = (WORD, QUOTED_IDENTIFIER)
+
+        def text(i: int) -> str:
+            return tokens[i].text if 0 <= i < len(tokens) else ""
+
+        def is_name(i: int) -> bool:
+            return 0 <= i < len(tokens) and tokens[i].kind in names
+
+        def name(i: int) -> str:
+            return unquote_identifier(tokens[i].text)
+
+        sources: Dict[str, Optional[str]] = {}
+        ctes = set()
+        aliases = set()
+        skip = set()
+        source_ends = set()
+
+        def skip_type(j: int):
+            """Type name after :: or CAST(... AS, with its modifiers and array brackets"""
+            if is_name(j) and text(j + 1) == "." and is_name(j + 2):
+                skip.update((j, j + 1))
+                j += 2
+            if not is_name(j):
+                return
+            skip.add(j)
+            j += 1
+            while tokens[j:j + 1] and tokens[j].kind == WORD and text(j).lower() in TYPE_CONTINUATIONS:
+                skip.add(j)
+                j += 1
+            if text(j) == "(":
+                # varchar(20), geometry(Point, 4326)
+                depth = 0
+                while j < len(tokens):
+                    depth += {"(": 1, ")": -1}.get(text(j), 0)
+                    skip.add(j)
+                    j += 1
+                    if depth == 0:
+                        break
 
-        from difflib import get_close_matches
+        # One entry per open parenthesis: "call" for a function call, "cast" for CAST(, "" otherwise
+        calls: List[str] = []
+        for i, token in enumerate(tokens):
+            keyword = token.text.lower() if token.kind == WORD else ""
+            if token.text == "(":
+                if text(i - 1).lower() == "cast":
+                    calls.append("cast")
+                elif is_name(i - 1) and text(i - 1).lower() not in SQL_KEYWORDS:
+                    calls.append("call")
+                else:
+                    calls.append("")
+            elif token.text == ")" and calls:
+                calls.pop()
+            elif token.text == "::":
+                skip_type(i + 1)
+            elif keyword == "as" and calls and calls[-1] == "cast":
+                skip_type(i + 1)
+            elif keyword in ("from", "join") and calls and calls[-1] == "call":
+                # EXTRACT(year FROM ...), SUBSTRING(x FROM 1): not a source
+                skip.add(i - 1)
+            elif keyword in ("from", "join") or (token.text == "," and i - 1 in source_ends):
+                j = i + 1
+                if text(j) == "(" or (is_name(j) and text(j + 1) == "("):
+                    # Subquery or table function: its columns can't be attributed
+                    sources[f"#{i}"] = None
+                    continue
+                if not is_name(j):
+                    continue
+                table = name(j)
+                skip.add(j)
+                if text(j + 1) == "." and is_name(j + 2):
+                    table = f"{table}.{name(j + 2)}"
+                    skip.update((j + 1, j + 2))
+                    j += 2
+                alias = table.split(".")[-1]
+                if text(j + 1).lower() == "as":
+                    j += 1
+                if is_name(j + 1) and text(j + 1).lower() not in NOT_ALIAS:
+                    j += 1
+                    alias = name(j)
+                    skip.add(j)
+                sources[alias] = None if table in ctes else table
+                source_ends.add(j)
+            elif keyword == "as":
+                if text(i + 1) == "(" and is_name(i - 1):
+                    # WITH name AS (...): CTE columns are unknown
+                    ctes.add(name(i - 1))
+                    skip.add(i - 1)
+                elif is_name(i + 1):
+                    aliases.add(name(i + 1).lower())
+                    skip.add(i + 1)
+
+        columns = []
+        for i, token in enumerate(tokens):
+            if i in skip or not is_name(i) or text(i + 1) == "(" or text(i - 1) in (".", "::"):
+                continue
+            if token.kind == WORD and token.text.lower() in SQL_KEYWORDS:
+                continue
+            if text(i + 1) == "." and is_name(i + 2):
+                if text(i + 3) != ".":
+                    # schema.table.column references are left alone
+                    columns.append((name(i), QueryValidator._column_name(tokens[i + 2])))
+            else:
+                columns.append(("", QueryValidator._column_name(token)))
+        return {"sources": sources, "columns": columns, "aliases": aliases, "parent": None}
+
+    @staticmethod
+    def _column_name(token) -> str:
+        """Column as written in the SQL (quoted names keep their quotes)"""
+        return token.text
+
+    def _suggest_alternatives(self, missing_fields: Dict[str, List[str]], index: SchemaIndex) -> Dict:
+        """Suggest similar field names or calculations."""
 
         suggestions = {}
-        for missing in missing_fields:
-            # Find similar field names
-            matches = get_close_matches(missing.lower(),
-                                       [f.lower() for f in available_fields],
-                                       n=3, cutoff=0.6)
+        for missing, tables in missing_fields.items():
+            name = unquote_identifier(missing)
+            # Find similar field names (the right case first), preferring the tables in the query
+            matches = index.suggest(name, tables=tables) or index.suggest(name)
 
             if matches:
-                suggestions[missing] = matches
+                suggestions[missing] = [quote_identifier(m) for m in matches]
             else:
                 # Suggest calculations for common fields
-                if missing.lower() in ['area', 'size']:
+                if name.lower() in ['area', 'size']:
                     suggestions[missing] = ["Use ST_Area(geom) to calculate area"]
-                elif missing.lower() in ['length', 'perimeter']:
+                elif name.lower() in ['length', 'perimeter']:
                     suggestions[missing] = ["Use ST_Length(geom) or ST_Perimeter(geom)"]
-                elif missing.lower() in ['distance']:
+                elif name.lower() in ['distance']:
                     suggestions[missing] = ["Use ST_Distance(geom1, geom2)"]
 
         return suggestions
-
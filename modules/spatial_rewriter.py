@@ -0,0 +1,349 @@
+"""
+Spatial Rewriter - Rewrites spatial predicates so they can use spatial indexes
+
+Generated SQL tends to filter with forms the planner can't answer from a
+GiST / R-tree index:
+    ST_Distance(a, b) < d                  -> ST_DWithin(a, b, d)  (PostGIS)
+    ST_Intersects(ST_Transform(t.geom, n), <constant>)
+        -> ST_Intersects(t.geom, ST_Transform(<constant>, <srid of t.geom>))  (PostGIS)
+    ST_Intersects(t.geom, <constant>) on SpatiaLite / GeoPackage
+        -> ... AND t.ROWID IN (<R-tree bounding box lookup>)
+Each rewrite returns the same rows (moving ST_Transform can differ only by
+reprojection round-off on geometry boundaries). The R-tree pre-filter is only
+equivalent where the predicate must be true for a row to pass, so calls under
+NOT, inside other expressions or compared with anything but true are left
+alone.
+"""
+
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..core.sql import STRING, mask_literals, tokenize
+
+IDENT = r'(?:"(?:[^"]|"")+"|[A-Za-z_][\w$]*)'
+QUALIFIED_RE = re.compile(rf"^\s*(?:({IDENT})\s*\.\s*)?({IDENT})\s*$")
+FROM_RE = re.compile(
+    rf"\b(?:from|join)\s+((?:{IDENT}\s*\.\s*)?{IDENT})(?:\s+(?:as\s+)?({IDENT}))?",
+    re.IGNORECASE,
+)
+NUMBER_RE = r"\d+(?:\.\d+)?(?:e[+-]?\d+)?"
+BOUNDARY_BEFORE_RE = re.compile(
+    r"(?:^|[(,]|\b(?:where|on|and|or|not|having|select|when|then|else))\s*$", re.IGNORECASE
+)
+BOUNDARY_AFTER_RE = re.compile(
+    r"\s*(?:$|[),;]|(?:and|or|then|else|end|where|having|join|inner|left|right|full|cross|"
+    r"group|order|limit|offset|fetch|window|as|union|except|intersect|from)\b)",
+    re.IGNORECASE,
+)
+# Words following FROM/JOIN <table> that are not aliases
+NOT_ALIAS = {
+    "where", "on", "join", "inner", "left", "right", "full", "cross", "natural", "group",
+    "order", "limit", "having", "union", "using", "lateral", "offset", "window",
+}
+# Predicates true only where the bounding boxes interact
+TOPOLOGICAL = ("st_intersects", "st_contains", "st_within", "st_covers", "st_coveredby",
+               "st_touches", "st_overlaps", "st_crosses")
+SQLITE_INDEXABLE = ("st_intersects", "intersects", "st_within", "within", "st_contains",
+                    "contains", "st_overlaps", "overlaps", "st_touches", "touches")
+CONSTANT_GEOMETRY_RE = re.compile(
+    r"^\s*(st_geomfromtext|st_geomfromewkt|st_geomfromgeojson|st_makeenvelope|st_setsrid|"
+    r"st_makepoint|st_point|st_transform|st_buffer|st_geomfromwkb|geomfromtext|buildmbr|makepoint)\s*\(",
+    re.IGNORECASE,
+)
+
+
+def _blank_strings(sql: str) -> str:
+    """Same-length SQL with string literals blanked (quoted identifiers kept)"""
+    return mask_literals(sql)
+
+
+def _mask_quotes(sql: str) -> str:
+    """Same-length SQL with quoted text blanked, for searching outside literals"""
+    return mask_literals(sql, blank_identifiers=True)
+
+
+def _closing_paren(masked: str, open_index: int) -> int:
+    depth = 0
+    for i in range(open_index, len(masked)):
+        if masked[i] == "(":
+            depth += 1
+        elif masked[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def _split_args(sql: str, masked: str, start: int, end: int) -> List[str]:
+    """Top-level comma-separated arguments of sql[start:end]"""
+    args, depth, last = [], 0, start
+    for i in range(start, end):
+        if masked[i] == "(":
+            depth += 1
+        elif masked[i] == ")":
+            depth -= 1
+        elif masked[i] == "," and depth == 0:
+            args.append(sql[last:i].strip())
+            last = i + 1
+    args.append(sql[last:end].strip())
+    return args
+
+
+def find_calls(sql: str, names) -> List[Tuple[int, int, str, List[str]]]:
+    """(start, end, name, args) of outermost calls to any of ``names``"""
+    masked = _mask_quotes(sql)
+    pattern = re.compile(r"\b(" + "|".join(names) + r")\s*\(", re.IGNORECASE)
+    calls = []
+    position = 0
+    while True:
+        match = pattern.search(masked, position)
+        if not match:
+            return calls
+        open_index = match.end() - 1
+        close_index = _closing_paren(masked, open_index)
+        if close_index < 0:
+            return calls
+        args = _split_args(sql, masked, open_index + 1, close_index)
+        calls.append((match.start(), close_index + 1, match.group(1), args))
+        position = close_index + 1
+
+
+def _is_constant(expression: str) -> bool:
+    """Geometry constructor without column references"""
+    if not CONSTANT_GEOMETRY_RE.match(expression):
+        return False
+    code = "".join("''" if token.kind == STRING else token.text for token in tokenize(expression))
+    # Any identifier not directly followed by "(" is a column reference
+    code = re.sub(r"::\s*\w+", "", code)
+    return not re.search(r"\b[A-Za-z_][\w$]*\b(?!\s*\()", re.sub(NUMBER_RE, "0", code))
+
+
+def _unquote(identifier: str) -> str:
+    if identifier.startswith('"'):
+        return identifier[1:-1].replace('""', '"')
+    return identifier.lower()
+
+
+def table_aliases(sql: str) -> Dict[str, str]:
+    """alias (or table name) -> table reference from FROM / JOIN clauses"""
+    aliases = {}
+    for table, alias in FROM_RE.findall(_blank_strings(sql)):
+        aliases[_unquote(table.split(".")[-1].strip())] = table
+        if alias and alias.lower() not in NOT_ALIAS:
+            aliases[_unquote(alias)] = table
+    return aliases
+
+
+def _resolve_table(aliases: Dict[str, str], qualifier: str) -> Optional[str]:
+    """Table a column belongs to; unqualified columns need a single-table query"""
+    if qualifier:
+        return aliases.get(_unquote(qualifier))
+    tables = set(aliases.values())
+    return next(iter(tables)) if len(tables) == 1 else None
+
+
+# Text before a condition term (or before the parenthesis enclosing it) that keeps it positive
+POSITIVE_BEFORE_RE = re.compile(r"(?:^|\(|\b(?:where|on|having|and|or))\s*$", re.IGNORECASE)
+NOT_BEFORE_RE = re.compile(r"\bnot\s*$", re.IGNORECASE)
+IS_TRUE_AFTER_RE = re.compile(r"\s*(?:=\s*(?:1|true)|is\s+true)\b", re.IGNORECASE)
+
+
+def _enclosing_paren(masked: str, index: int) -> int:
+    """Index of the "(" enclosing position ``index``, -1 at top level"""
+    depth = 0
+    for i in range(index - 1, -1, -1):
+        if masked[i] == ")":
+            depth += 1
+        elif masked[i] == "(":
+            if depth == 0:
+                return i
+            depth -= 1
+    return -1
+
+
+def _top_level(text: str) -> str:
+    """``text`` with the contents of complete parentheses removed"""
+    kept, depth = [], 0
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0:
+            kept.append(char)
+    return "".join(kept)
+
+
+def _positive_condition(masked: str, start: int, end: int) -> bool:
+    """Call at masked[start:end] can't be negated by the filter around it
+
+    Walks out through enclosing parentheses up to the WHERE / ON / HAVING of
+    the (sub)query; a NOT, function call, CASE or comparison on the way makes
+    the context unsafe.
+    """
+    after = masked[end:]
+    is_true = IS_TRUE_AFTER_RE.match(after)
+    if is_true:
+        after = after[is_true.end():]
+    if not BOUNDARY_AFTER_RE.match(after):
+        return False
+    index = start
+    while True:
+        before = masked[:index]
+        if NOT_BEFORE_RE.search(before) or not POSITIVE_BEFORE_RE.search(before):
+            return False
+        paren = _enclosing_paren(masked, index)
+        level = _top_level(masked[paren + 1:index])
+        if re.search(r"\b(?:case|when|then|else)\b", level, re.IGNORECASE):
+            return False
+        if re.search(r"\b(?:where|on|having)\b", level, re.IGNORECASE):
+            return True
+        if paren < 0:
+            return False
+        index = paren
+
+
+def _in_filter(masked: str, index: int) -> bool:
+    """Call sits in a WHERE / ON / HAVING condition rather than a select list"""
+    keywords = re.findall(r"\b(select|where|on|having)\b", masked[:index], re.IGNORECASE)
+    return bool(keywords) and keywords[-1].lower() != "select"
+
+
+class SpatialRewriter:
+    """Index-friendly rewrites of spatial predicates"""
+
+    def __init__(self, dialect: str = "postgis",
+                 spatial_index: Callable[[str, str], Optional[str]] = None,
+                 srid: Callable[[str, str, str], Optional[int]] = None):
+        # "postgis" or "sqlite"; spatial_index(table, column) -> "gpkg" / "spatialite" / None
+        # srid(schema or "", table, column) -> SRID of a PostGIS column, None / 0 if unknown
+        self.dialect = dialect
+        self.spatial_index = spatial_index
+        self.srid = srid
+
+    def rewrite(self, sql: str) -> Tuple[str, List[str]]:
+        """Rewritten SQL plus a description of each change"""
+        changes: List[str] = []
+        if self.dialect == "postgis":
+            sql = self._distance_to_dwithin(sql, changes)
+            sql = self._push_transform(sql, changes)
+        elif self.spatial_index:
+            sql = self._rtree_prefilter(sql, changes)
+        return sql, changes
+
+    def _distance_to_dwithin(self, sql: str, changes: List[str]) -> str:
+        masked = _mask_quotes(sql)
+        for start, end, _, args in reversed(find_calls(sql, ["st_distance"])):
+            if len(args) not in (2, 3):
+                continue
+            after = re.match(rf"\s*(<=|<)\s*({NUMBER_RE})\b", masked[end:], re.IGNORECASE)
+            before = re.search(rf"\b({NUMBER_RE})\s*(>=|>)\s*$", masked[:start], re.IGNORECASE)
+            if after:
+                operator, distance = after.group(1), after.group(2)
+                span_start, span_end = start, end + after.end()
+            elif before:
+                distance, operator = before.group(1), {">=": "<=", ">": "<"}[before.group(2)]
+                span_start, span_end = before.start(), end
+            else:
+                continue
+            # Only a whole comparison can be replaced, not part of an arithmetic expression
+            if not (BOUNDARY_BEFORE_RE.search(masked[:span_start])
+                    and BOUNDARY_AFTER_RE.match(masked[span_end:])):
+                continue
+            dwithin = f"ST_DWithin({', '.join(args[:2] + [distance] + args[2:])})"
+            if operator == "<":
+                # ST_DWithin is inclusive; keep the strict bound exact
+                dwithin = f"({dwithin} AND {sql[start:end]} < {distance})"
+            sql = sql[:span_start] + dwithin + sql[span_end:]
+            changes.append(f"ST_Distance(...) {operator} {distance} -> ST_DWithin")
+        return sql
+
+    def _push_transform(self, sql: str, changes: List[str]) -> str:
+        aliases = table_aliases(sql)
+        for start, end, name, args in reversed(find_calls(sql, TOPOLOGICAL)):
+            if len(args) != 2:
+                continue
+            for i in (0, 1):
+                column = self._transformed_column(args[i])
+                if column is None or not _is_constant(args[1 - i]):
+                    continue
+                qualifier, column_name = column
+                table = _resolve_table(aliases, qualifier)
+                if table is None:
+                    continue
+                parts = [p.strip() for p in table.split(".")]
+                schema = _unquote(parts[0]) if len(parts) == 2 else ""
+                srid = self._column_srid(schema, _unquote(parts[-1]), _unquote(column_name))
+                if srid is None:
+                    continue
+                new_args = list(args)
+                new_args[i] = f"{qualifier + '.' if qualifier else ''}{column_name}"
+                new_args[1 - i] = f"ST_Transform({args[1 - i]}, {srid})"
+                sql = sql[:start] + f"{name}({', '.join(new_args)})" + sql[end:]
+                changes.append(f"{name}: ST_Transform moved to the constant side")
+                break
+        return sql
+
+    def _column_srid(self, schema: str, table: str, column: str) -> Optional[str]:
+        """SRID of the column as SQL, None when it can't be pinned down
+
+        Find_SRID('', ...) picks an arbitrary schema when the table name is
+        not unique, so unqualified tables need the ``srid`` resolver (which
+        follows the search_path). Unconstrained columns (SRID 0) are skipped.
+        """
+        if self.srid:
+            value = self.srid(schema, table, column)
+            return str(value) if value else None
+        if not schema:
+            return None
+        return f"Find_SRID('{schema}', '{table}', '{column}')"
+
+    @staticmethod
+    def _transformed_column(expression: str) -> Optional[Tuple[str, str]]:
+        """(qualifier, column) for ST_Transform(<column>, <srid>)"""
+        match = re.match(r"^\s*st_transform\s*\((.*),\s*\d+\s*\)\s*$", expression, re.IGNORECASE | re.DOTALL)
+        if not match:
+            return None
+        column = QUALIFIED_RE.match(match.group(1))
+        if not column:
+            return None
+        return column.group(1) or "", column.group(2)
+
+    def _rtree_prefilter(self, sql: str, changes: List[str]) -> str:
+        aliases = table_aliases(sql)
+        masked = _mask_quotes(sql)
+        for start, end, name, args in reversed(find_calls(sql, SQLITE_INDEXABLE)):
+            if len(args) != 2 or not _in_filter(masked, start):
+                continue
+            # NOT (NULL AND FALSE) is TRUE - negated calls would start returning rows
+            if not _positive_condition(masked, start, end):
+                continue
+            for i in (0, 1):
+                column = QUALIFIED_RE.match(args[i])
+                if not column or not _is_constant(args[1 - i]):
+                    continue
+                qualifier, column_name = column.group(1) or "", column.group(2)
+                table = _resolve_table(aliases, qualifier)
+                if table is None:
+                    continue
+                table_name = _unquote(table.split(".")[-1].strip())
+                index = self.spatial_index(table_name, _unquote(column_name))
+                rowid = f"{qualifier + '.' if qualifier else ''}ROWID"
+                frame = args[1 - i]
+                if index == "gpkg":
+                    lookup = (
+                        f'SELECT id FROM "rtree_{table_name}_{_unquote(column_name)}" '
+                        f"WHERE minx <= MbrMaxX({frame}) AND maxx >= MbrMinX({frame}) "
+                        f"AND miny <= MbrMaxY({frame}) AND maxy >= MbrMinY({frame})"
+                    )
+                elif index == "spatialite":
+                    lookup = (
+                        f"SELECT ROWID FROM SpatialIndex WHERE f_table_name = '{table_name}' "
+                        f"AND f_geometry_column = '{_unquote(column_name)}' AND search_frame = {frame}"
+                    )
+                else:
+                    continue
+                sql = sql[:start] + f"({sql[start:end]} AND {rowid} IN ({lookup}))" + sql[end:]
+                changes.append(f"{name}: R-tree pre-filter on {table_name}")
+                break
+        return sql
@@ -14,6 +14,28 @@ from qgis.core import (
 from qgis.PyQt.QtSql import QSqlDatabase, QSqlQuery
 from typing import Dict, List, Optional
 import os
+import threading
+import time
+
+from ..services.metrics_service import get_metrics_service
+from ..services.result_cache_service import (
+    get_result_cache, is_cacheable, is_write, referenced_tables, file_marker
+)
+from ..core.sql import quote_identifier, split_statements, returns_rows, statement_type
+from .cost_gate import CostGate, parse_explain_json
+from .query_validator import QueryValidator
+from .spatial_rewriter import SpatialRewriter
+from ..infrastructure.logging.logger import get_logger
+from ..infrastructure.tracing import span
+
+logger = get_logger(__name__)
+
+# SQLSTATE of a cancelled query (pg_cancel_backend or statement_timeout)
+QUERY_CANCELED = "57014"
+# Statements validate_sql() can check with EXPLAIN; anything else would have to run
+EXPLAINABLE = {"SELECT", "VALUES", "TABLE", "INSERT", "UPDATE", "DELETE", "MERGE"}
+# Seconds to wait for the server when opening the connection that cancels a query
+CANCEL_CONNECT_TIMEOUT = 3
 
 
 class SQLExecutor:
@@ -23,6 +45,25 @@ class SQLExecutor:
         self.iface = iface
         self.project = QgsProject.instance()
         self._db_credentials = None
+        self.cost_gate = CostGate()
+        self.spatial_rewrite = os.getenv("SPATIAL_REWRITE", "true").lower() == "true"
+        # Server-side limit for each statement; 0 disables it
+        timeout = os.getenv("SQL_STATEMENT_TIMEOUT_MS", "300000")
+        self.statement_timeout_ms = int(timeout) if timeout.isdigit() else 300000
+        # Running queries by worker thread, for cancel()
+        self._active: Dict[int, Dict] = {}
+        self._cancelled = set()
+        self._active_lock = threading.Lock()
+        # Per-thread flag set by validate_sql()
+        self._local = threading.local()
+        self.project.layersAdded.connect(self._watch_layer_edits)
+        self._watch_layer_edits(self.project.mapLayers().values())
+
+    def _watch_layer_edits(self, layers):
+        """Edits committed in QGIS invalidate cached query results"""
+        for layer in layers:
+            if isinstance(layer, QgsVectorLayer):
+                layer.afterCommitChanges.connect(get_result_cache().clear)
 
     def _load_db_credentials(self) -> Dict:
         """Load database credentials from .env file"""
@@ -60,6 +101,12 @@ class SQLExecutor:
         """Collect detailed QGIS layer context for accurate SQL generation.
         If no layers are loaded, fetches table info directly from database.
         """
+        with span("get_context") as trace, get_metrics_service().timer("context"):
+            context = self._collect_context()
+            trace.set(db_type=context.get("db_type"), tables=len(context.get("tables", [])))
+            return context
+
+    def _collect_context(self) -> Dict:
 
         project = QgsProject.instance()
         layers = project.mapLayers()
@@ -123,10 +170,8 @@ class SQLExecutor:
                             full_table_name = actual_table_name
                         context["tables"].append(full_table_name)
                         context["table_fields"][full_table_name] = fields
-                        QgsMessageLog.logMessage(
-                            f"PostgreSQL layer '{layer.name()}' maps to table '{full_table_name}'",
-                            "GeoAI Pro",
-                            Qgis.Info,
+                        logger.debug(
+                            "PostgreSQL layer '%s' maps to table '%s'", layer.name(), full_table_name
                         )
                     else:
                         # Fallback: use layer name if table extraction fails
@@ -230,11 +275,7 @@ class SQLExecutor:
                 while query.next():
                     table_name = query.value(0)  # Get exact case as stored in database
                     context["tables"].append(table_name)
-                    QgsMessageLog.logMessage(
-                        f"Found table: '{table_name}' (exact case from database)",
-                        "GeoAI Pro",
-                        Qgis.Info,
-                    )
+                    logger.debug("Found table: '%s' (exact case from database)", table_name)
 
             # Get columns for each table
             for table_name in context["tables"]:
@@ -259,16 +300,13 @@ class SQLExecutor:
                         columns.append(column_name)
                     context["table_fields"][table_name] = columns
                     
-                    QgsMessageLog.logMessage(
-                        f"Fetched {len(columns)} columns for table '{table_name}': {', '.join(columns[:5])}{'...' if len(columns) > 5 else ''}",
-                        "GeoAI Pro",
-                        Qgis.Info,
+                    logger.debug(
+                        "Fetched %d columns for table '%s': %s",
+                        len(columns), table_name, ", ".join(columns),
                     )
 
-            QgsMessageLog.logMessage(
-                f"Fetched {len(context['tables'])} tables from database: {', '.join(context['tables'][:5])}{'...' if len(context['tables']) > 5 else ''}",
-                "GeoAI Pro",
-                Qgis.Info,
+            logger.info(
+                f"Fetched {len(context['tables'])} tables from database: {', '.join(context['tables'][:5])}{'...' if len(context['tables']) > 5 else ''}"
             )
 
         except Exception as e:
@@ -304,6 +342,68 @@ class SQLExecutor:
 
     def execute_sql(self, sql: str, layer_name: Optional[str] = None) -> Dict:
         """Execute SQL query on specified layer or database."""
+        with span("execute_sql", layer=layer_name) as trace, \
+                get_metrics_service().timer("execute") as sample:
+            thread_id = threading.get_ident()
+            self._cancelled.discard(thread_id)
+            result = self._execute_sql(sql, layer_name)
+            if "error" in result and thread_id in self._cancelled:
+                result = {"error": "Query cancelled", "cancelled": True, "sql": sql}
+            elif "statement timeout" in result.get("error", ""):
+                result["error"] = (
+                    f"Query stopped after {self.statement_timeout_ms / 1000:g}s "
+                    f"(SQL_STATEMENT_TIMEOUT_MS). {result['error']}"
+                )
+            self._cancelled.discard(thread_id)
+            sample["success"] = "error" not in result
+            sample["rows"] = result.get("row_count", 0)
+            trace.set(success=sample["success"], rows=sample["rows"])
+            return result
+
+    def validate_sql(self, sql: str, layer_name: Optional[str] = None, context: Dict = None) -> Dict:
+        """Check that ``sql`` would run on the target database, without running it
+
+        With ``context`` (from get_context(), which must not run off the GUI
+        thread) tables and columns are first checked against its schema,
+        saving a round trip for the usual mistakes. Every statement is
+        EXPLAINed on PostgreSQL or SQLite; SQL with a
+        statement EXPLAIN can't check (DDL, transaction control) and layers
+        that aren't backed by one of those databases are reported as
+        "cannot validate" (``unvalidated`` set) instead. Safe to call from
+        several threads at once.
+        """
+        with span("validate_sql", layer=layer_name) as trace:
+            other = next(
+                (t or "statement" for t in map(statement_type, split_statements(sql)) if t not in EXPLAINABLE),
+                None,
+            )
+            if other:
+                trace.set(success=False)
+                return self._cannot_validate(sql, f"{other} can't be checked without running it")
+            if context:
+                check = QueryValidator(self).validate_query(sql, context)
+                if not check["valid"]:
+                    trace.set(success=False)
+                    return {"error": check["message"], "suggestions": check["suggestions"], "sql": sql}
+            self._local.validating = True
+            try:
+                result = self._execute_sql(sql, layer_name)
+            finally:
+                self._local.validating = False
+            trace.set(success="error" not in result)
+            return result
+
+    def _validating(self) -> bool:
+        return getattr(self._local, "validating", False)
+
+    def _cannot_validate(self, sql: str, reason: str) -> Dict:
+        return {"error": f"Cannot validate: {reason}", "unvalidated": True, "sql": sql}
+
+    def _connection_name(self, name: str) -> str:
+        """Validation runs in parallel, so each thread needs its own connection"""
+        return f"{name}_{threading.get_ident()}" if self._validating() else name
+
+    def _execute_sql(self, sql: str, layer_name: Optional[str] = None) -> Dict:
 
         try:
             # CRITICAL: Check .env for PostgreSQL credentials FIRST
@@ -344,11 +444,7 @@ class SQLExecutor:
             source_lower = source.lower()
             
             # Log detection info for debugging
-            QgsMessageLog.logMessage(
-                f"SQL Executor - Provider: {provider_type}, Source: {source[:100]}...",
-                "GeoAI Pro",
-                Qgis.Info
-            )
+            logger.debug("SQL Executor - Provider: %s, Source: %s...", provider_type, source[:100])
 
             # PRIORITY 1: Check PostgreSQL FIRST (most common for your use case)
             # Check multiple indicators of PostgreSQL connection
@@ -362,10 +458,8 @@ class SQLExecutor:
                 if uri.host():
                     is_postgres = True
                     postgres_reason = f"URI host detected: {uri.host()}"
-                    QgsMessageLog.logMessage(
-                        f"✅ Detected PostgreSQL via URI host: {uri.host()}, Database: {uri.database()}",
-                        "GeoAI Pro",
-                        Qgis.Info
+                    logger.debug(
+                        "Detected PostgreSQL via URI host: %s, Database: %s", uri.host(), uri.database()
                     )
             except Exception as e:
                 QgsMessageLog.logMessage(
@@ -379,11 +473,7 @@ class SQLExecutor:
                 if "postgres" in provider_type:
                     is_postgres = True
                     postgres_reason = f"Provider type: {provider_type}"
-                    QgsMessageLog.logMessage(
-                        f"✅ Detected PostgreSQL via provider type: {provider_type}",
-                        "GeoAI Pro",
-                        Qgis.Info
-                    )
+                    logger.debug("Detected PostgreSQL via provider type: %s", provider_type)
             
             # Method 3: Check source string for PostgreSQL indicators
             if not is_postgres:
@@ -398,11 +488,7 @@ class SQLExecutor:
                 if any(postgres_indicators):
                     is_postgres = True
                     postgres_reason = "PostgreSQL indicators in source string"
-                    QgsMessageLog.logMessage(
-                        f"✅ Detected PostgreSQL via source string indicators",
-                        "GeoAI Pro",
-                        Qgis.Info
-                    )
+                    logger.debug("Detected PostgreSQL via source string indicators")
             
             # Method 4: If we have .env credentials and no layer connection, assume PostgreSQL
             if not is_postgres and not layer:
@@ -410,11 +496,7 @@ class SQLExecutor:
                 if env_creds.get("database"):
                     is_postgres = True
                     postgres_reason = "Using .env PostgreSQL credentials"
-                    QgsMessageLog.logMessage(
-                        f"✅ Using PostgreSQL from .env credentials",
-                        "GeoAI Pro",
-                        Qgis.Info
-                    )
+                    logger.debug("Using PostgreSQL from .env credentials")
             
             if is_postgres:
                 QgsMessageLog.logMessage(
@@ -474,6 +556,9 @@ class SQLExecutor:
                     return result
             
             # PRIORITY 4: Last resort - try attribute query for non-database layers
+            if self._validating():
+                # selectByExpression would change the live layer's selection
+                return self._cannot_validate(sql, "the layer is not in a PostgreSQL or SQLite database")
             QgsMessageLog.logMessage(
                 f"PostgreSQL connection failed, trying attribute query",
                 "GeoAI Pro",
@@ -502,13 +587,12 @@ class SQLExecutor:
         password = env_creds.get("password", "")
 
         # Log connection details for debugging
-        QgsMessageLog.logMessage(
-            f"Direct PostgreSQL connection - Host: {host}, Port: {port}, Database: {database}, User: {username}",
-            "GeoAI Pro",
-            Qgis.Info
+        logger.debug(
+            "Direct PostgreSQL connection - Host: %s, Port: %s, Database: %s, User: %s",
+            host, port, database, username,
         )
 
-        connection_name = f"GeoAI_Direct_{database}_{username}"
+        connection_name = self._connection_name(f"GeoAI_Direct_{database}_{username}")
         if QSqlDatabase.contains(connection_name):
             QSqlDatabase.removeDatabase(connection_name)
 
@@ -536,24 +620,103 @@ class SQLExecutor:
                         f"Connection details: Host={host}, Port={port}, Database={database}, User={username}"
             }
 
-        # Split multiple statements and execute each
-        statements = [s.strip() for s in sql.split(";") if s.strip()]
+        self._begin_pg_session(db, host, port, database, username, password)
+        try:
+            if self._validating():
+                return self._validate_pg(db, sql)
+            return self._run_cached(
+                f"postgresql://{username}@{host}:{port}/{database}", sql,
+                lambda: self._pg_version_marker(db, sql),
+                lambda: self._run_pg_gated(db, sql, self._run_pg_statements),
+            )
+        finally:
+            self._end_session()
+            db.close()
+            QSqlDatabase.removeDatabase(connection_name)
+
+    def _begin_pg_session(self, db: QSqlDatabase, host: str, port: int, database: str,
+                          username: str, password: str):
+        """Apply statement_timeout and remember the backend so it can be cancelled"""
+        query = QSqlQuery(db)
+        if self.statement_timeout_ms:
+            query.exec_(f"SET statement_timeout = {self.statement_timeout_ms}")
+        pid = None
+        if query.exec_("SELECT pg_backend_pid()") and query.next():
+            pid = int(query.value(0))
+        with self._active_lock:
+            self._active[threading.get_ident()] = {
+                "kind": "postgres", "pid": pid, "host": host, "port": port,
+                "database": database, "user": username, "password": password,
+            }
+
+    def _end_session(self):
+        with self._active_lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def cancel(self) -> bool:
+        """Stop running queries (pg_cancel_backend / sqlite interrupt)
+
+        Safe to call from the GUI thread while a worker is executing; the
+        PostgreSQL cancel connects from a background thread, so an unreachable
+        server can't freeze the UI.
+        """
+        with self._active_lock:
+            active = dict(self._active)
+            self._cancelled.update(active)
+        if not active:
+            return False
+
+        for info in active.values():
+            if info["kind"] == "sqlite":
+                info["conn"].interrupt()
+            elif info["pid"] is not None:
+                threading.Thread(
+                    target=self._cancel_pg_backend, args=(info,), name="geoai-cancel", daemon=True
+                ).start()
+        QgsMessageLog.logMessage(
+            f"Cancelling {len(active)} running quer{'y' if len(active) == 1 else 'ies'}",
+            "GeoAI Pro",
+            Qgis.Info,
+        )
+        return True
+
+    def _cancel_pg_backend(self, info: Dict):
+        """Ask the server to cancel a backend's statement over a separate connection"""
+        connection_name = f"GeoAI_Cancel_{threading.get_ident()}"
+        db = QSqlDatabase.addDatabase("QPSQL", connection_name)
+        db.setHostName(info["host"])
+        db.setPort(int(info["port"]))
+        db.setDatabaseName(info["database"])
+        db.setUserName(info["user"])
+        db.setPassword(info["password"])
+        db.setConnectOptions(f"connect_timeout={CANCEL_CONNECT_TIMEOUT}")
+        try:
+            if not db.open():
+                QgsMessageLog.logMessage(
+                    f"Could not connect to cancel query: {db.lastError().text()}",
+                    "GeoAI Pro",
+                    Qgis.Warning,
+                )
+                return
+            QSqlQuery(db).exec_(f"SELECT pg_cancel_backend({int(info['pid'])})")
+        finally:
+            db.close()
+            QSqlDatabase.removeDatabase(connection_name)
+
+    def _run_pg_statements(self, db: QSqlDatabase, sql: str) -> Dict:
+        """Execute each statement of ``sql`` on an open connection"""
+        # Split multiple statements (semicolons in literals/comments don't count) and execute each
         all_results = []
         total_affected = 0
 
-        for stmt in statements:
-            if not stmt:
-                continue
-
+        for stmt in split_statements(sql):
             query = QSqlQuery(db)
             if not query.exec_(stmt):
-                error = query.lastError().text()
-                db.close()
-                QSqlDatabase.removeDatabase(connection_name)
-                return {"error": error, "sql": stmt}
+                error = query.lastError()
+                return {"error": error.text(), "sqlstate": error.nativeErrorCode(), "sql": stmt}
 
-            # Check if it's a SELECT query
-            if stmt.strip().upper().startswith("SELECT"):
+            # Check if it's a query (SELECT, WITH ... SELECT, VALUES...)
+            if returns_rows(stmt):
                 record = query.record()
                 field_names = [record.fieldName(i) for i in range(record.count())]
 
@@ -564,9 +727,6 @@ class SQLExecutor:
                 # For INSERT, UPDATE, DELETE, CREATE, DROP, etc.
                 total_affected += query.numRowsAffected()
 
-        db.close()
-        QSqlDatabase.removeDatabase(connection_name)
-
         if all_results:
             return {"success": True, "rows": all_results, "row_count": len(all_results)}
         else:
@@ -608,7 +768,7 @@ class SQLExecutor:
             Qgis.Info
         )
 
-        connection_name = f"GeoAI_{database}_{username}"
+        connection_name = self._connection_name(f"GeoAI_{database}_{username}")
         if QSqlDatabase.contains(connection_name):
             QSqlDatabase.removeDatabase(connection_name)
 
@@ -636,12 +796,35 @@ class SQLExecutor:
                         f"Connection details: Host={host}, Port={port}, Database={database}, User={username}"
             }
 
-        query = QSqlQuery(db)
-        if not query.exec_(sql):
-            error = query.lastError().text()
+        self._begin_pg_session(db, host, port, database, username, password)
+        try:
+            if self._validating():
+                return self._validate_pg(db, sql)
+            return self._run_cached(
+                f"postgresql://{username}@{host}:{port}/{database}", sql,
+                lambda: self._pg_version_marker(db, sql),
+                lambda: self._run_pg_gated(db, sql, self._run_pg_query),
+            )
+        finally:
+            self._end_session()
             db.close()
             QSqlDatabase.removeDatabase(connection_name)
-            return {"error": error, "sql": sql}
+
+    def _validate_pg(self, db: QSqlDatabase, sql: str) -> Dict:
+        """EXPLAIN every statement (validate_sql() only lets EXPLAINABLE ones through)"""
+        query = QSqlQuery(db)
+        for statement in split_statements(sql):
+            if not query.exec_(f"EXPLAIN {statement}"):
+                error = query.lastError()
+                return {"error": error.text(), "sqlstate": error.nativeErrorCode(), "sql": sql}
+        return {"success": True, "validated": True}
+
+    def _run_pg_query(self, db: QSqlDatabase, sql: str) -> Dict:
+        """Execute ``sql`` as one query and collect its rows"""
+        query = QSqlQuery(db)
+        if not query.exec_(sql):
+            error = query.lastError()
+            return {"error": error.text(), "sqlstate": error.nativeErrorCode(), "sql": sql}
 
         # Collect query results
         results = []
@@ -652,11 +835,141 @@ class SQLExecutor:
             row = {name: query.value(i) for i, name in enumerate(field_names)}
             results.append(row)
 
-        db.close()
-        QSqlDatabase.removeDatabase(connection_name)
-
         return {"success": True, "rows": results, "row_count": len(results)}
 
+    def _run_pg_gated(self, db: QSqlDatabase, sql: str, run) -> Dict:
+        """Run ``sql`` through the spatial rewrite and the EXPLAIN cost gate"""
+        rewritten = self._rewrite_spatial_pg(db, sql)
+        if rewritten != sql:
+            result = self._run_pg_checked(db, rewritten, run)
+            if "error" not in result or self._stopped(result):
+                return result
+            QgsMessageLog.logMessage(
+                f"Rewritten query failed ({result['error']}), running the original",
+                "GeoAI Pro",
+                Qgis.Warning,
+            )
+        return self._run_pg_checked(db, sql, run)
+
+    def _stopped(self, result: Dict) -> bool:
+        """Query was cancelled or hit the statement timeout - don't run it again"""
+        error = result.get("error", "")
+        return (
+            threading.get_ident() in self._cancelled
+            or result.get("sqlstate") == QUERY_CANCELED
+            or "canceling statement" in error
+            or "statement timeout" in error
+        )
+
+    def _rewrite_spatial_pg(self, db: QSqlDatabase, sql: str) -> str:
+        """Index-friendly form of ``sql`` when the planner agrees it is cheaper"""
+        if not self.spatial_rewrite or is_write(sql):
+            return sql
+        rewritten, changes = SpatialRewriter(
+            "postgis", srid=lambda schema, table, column: self._pg_column_srid(db, schema, table, column)
+        ).rewrite(sql)
+        if not changes:
+            return sql
+        before = self._explain_pg(db, sql)
+        after = self._explain_pg(db, rewritten)
+        if after is None:
+            return sql
+        cost_before = before.get("Total Cost") if before else None
+        cost_after = after.get("Total Cost", 0)
+        QgsMessageLog.logMessage(
+            f"Spatial rewrite ({'; '.join(changes)}): estimated cost "
+            f"{'?' if cost_before is None else f'{cost_before:,.0f}'} -> {cost_after:,.0f}",
+            "GeoAI Pro",
+            Qgis.Info,
+        )
+        if cost_before is not None and cost_after > cost_before:
+            return sql
+        return rewritten
+
+    def _pg_column_srid(self, db: QSqlDatabase, schema: str, table: str, column: str) -> Optional[int]:
+        """SRID of a geometry column, resolving an unqualified table through the search_path"""
+        relation = f"{quote_identifier(schema)}.{quote_identifier(table)}" if schema else quote_identifier(table)
+        query = QSqlQuery(db)
+        query.prepare(
+            "SELECT srid FROM geometry_columns "
+            "WHERE f_table_name = ? AND f_geometry_column = ? "
+            "AND to_regclass(format('%I.%I', f_table_schema, f_table_name)) = to_regclass(?)"
+        )
+        query.addBindValue(table)
+        query.addBindValue(column)
+        query.addBindValue(relation)
+        if not query.exec_() or not query.next():
+            return None
+        srid = query.value(0)
+        return int(srid) if srid else None
+
+    def _run_pg_checked(self, db: QSqlDatabase, sql: str, run) -> Dict:
+        """Run ``sql`` through the EXPLAIN cost gate first"""
+        gate = self.cost_gate.check(sql, lambda stmt: self._explain_pg(db, stmt))
+        if "error" in gate:
+            QgsMessageLog.logMessage(gate["error"], "GeoAI Pro", Qgis.Warning)
+            return {"error": gate["error"], "plan": gate["plan"], "sql": sql}
+
+        result = run(db, gate["sql"])
+        if "warning" in gate:
+            QgsMessageLog.logMessage(
+                f"⚠️ {gate['warning']}\n{gate['plan']}", "GeoAI Pro", Qgis.Warning
+            )
+            result.update(warning=gate["warning"], plan=gate["plan"], executed_sql=gate["sql"])
+        if "estimate" in gate:
+            result["estimate"] = gate["estimate"]
+        return result
+
+    def _explain_pg(self, db: QSqlDatabase, sql: str) -> Optional[Dict]:
+        """Root node of the planner's JSON plan, None if it can't be explained"""
+        query = QSqlQuery(db)
+        if not query.exec_(f"EXPLAIN (FORMAT JSON) {sql}") or not query.next():
+            return None
+        return parse_explain_json(query.value(0))
+
+    def _pg_version_marker(self, db: QSqlDatabase, sql: str) -> Optional[tuple]:
+        """Modification counters of the tables a query reads
+
+        Falls back to the counters of all user tables when a relation is not
+        a plain table (views, functions) or can't be resolved.
+        """
+        tables = referenced_tables(sql)
+        counters = (
+            "SELECT count(*), coalesce(sum(n_tup_ins + n_tup_upd + n_tup_del), 0), "
+            "coalesce(sum(n_live_tup), 0) FROM "
+        )
+        if tables:
+            names = ", ".join("'" + t.replace("'", "''") + "'" for t in tables)
+            query = QSqlQuery(db)
+            if query.exec_(
+                counters + "pg_stat_all_tables WHERE relid IN "
+                f"(SELECT to_regclass(t) FROM unnest(ARRAY[{names}]) AS t)"
+            ) and query.next() and int(query.value(0)) == len(tables):
+                return ("tables", query.value(1), query.value(2))
+
+        query = QSqlQuery(db)
+        if query.exec_(counters + "pg_stat_user_tables") and query.next():
+            return ("database", query.value(0), query.value(1), query.value(2))
+        return None
+
+    def _run_cached(self, connection: str, sql: str, marker_fn, execute) -> Dict:
+        """Serve read-only queries from the result cache; writes invalidate it"""
+        cache = get_result_cache()
+        marker = marker_fn() if cache.enabled and is_cacheable(sql) else None
+        if marker is not None:
+            cached = cache.get(connection, sql, marker)
+            get_metrics_service().record_cache("sql", cached is not None)
+            if cached:
+                logger.debug("Result cache hit (%d rows)", cached.get("row_count", 0))
+                return cached
+        elif is_write(sql):
+            cache.invalidate(connection)
+
+        result = execute()
+        if marker is not None:
+            cache.put(connection, sql, marker, result)
+        return result
+
     def _execute_spatialite(self, sql: str, layer: QgsVectorLayer) -> Dict:
         """Execute SQL on SpatiaLite or GeoPackage."""
         import sqlite3
@@ -695,25 +1008,78 @@ class SQLExecutor:
                 "sql": sql
             }
 
+        if self._validating():
+            return self._validate_sqlite(source, sql)
+        return self._run_cached(
+            f"sqlite://{os.path.abspath(source)}", sql,
+            lambda: file_marker(source),
+            lambda: self._run_sqlite(source, sql),
+        )
+
+    def _connect_sqlite(self, source: str):
+        """Connection with SpatiaLite loaded, registered for cancel()"""
+        import sqlite3
+
+        conn = sqlite3.connect(source)
+        conn.enable_load_extension(True)
         try:
-            conn = sqlite3.connect(source)
-            conn.enable_load_extension(True)
-            try:
-                conn.load_extension("mod_spatialite")
-            except Exception:
-                pass
+            conn.load_extension("mod_spatialite")
+        except Exception:
+            pass
+
+        # SQLite has no statement_timeout - abort from the progress handler instead
+        if self.statement_timeout_ms:
+            deadline = time.monotonic() + self.statement_timeout_ms / 1000
+            conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+        with self._active_lock:
+            self._active[threading.get_ident()] = {"kind": "sqlite", "conn": conn}
+        return conn
+
+    def _validate_sqlite(self, source: str, sql: str) -> Dict:
+        """EXPLAIN every statement (validate_sql() only lets EXPLAINABLE ones through)"""
+        import sqlite3
+
+        conn = None
+        try:
+            conn = self._connect_sqlite(source)
+            for statement in split_statements(sql):
+                conn.execute(f"EXPLAIN {statement}")
+            return {"success": True, "validated": True}
+        except sqlite3.Error as e:
+            return {"error": f"SQLite error: {str(e)}", "sql": sql}
+        finally:
+            if conn is not None:
+                conn.close()
+            self._end_session()
+
+    def _run_sqlite(self, source: str, sql: str) -> Dict:
+        """Execute ``sql`` on a SQLite/GeoPackage file"""
+        import sqlite3
+
+        conn = None
+        try:
+            conn = self._connect_sqlite(source)
 
+            rewritten = self._rewrite_spatial_sqlite(conn, sql)
             cursor = conn.cursor()
-            cursor.execute(sql)
+            try:
+                cursor.execute(rewritten)
+            except sqlite3.OperationalError as e:
+                if str(e) == "interrupted" and threading.get_ident() not in self._cancelled:
+                    return {"error": "SQLite error: statement timeout exceeded", "sql": sql}
+                if rewritten == sql or str(e) == "interrupted":
+                    raise
+                QgsMessageLog.logMessage(
+                    f"Rewritten query failed ({e}), running the original", "GeoAI Pro", Qgis.Warning
+                )
+                cursor.execute(sql)
 
-            if sql.strip().upper().startswith("SELECT"):
+            if returns_rows(sql):
                 columns = [desc[0] for desc in cursor.description]
                 rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
-                conn.close()
                 return {"success": True, "rows": rows, "row_count": len(rows)}
 
             conn.commit()
-            conn.close()
             return {"success": True, "message": "Query executed successfully"}
 
         except sqlite3.Error as e:
@@ -726,6 +1092,48 @@ class SQLExecutor:
                 "error": f"Error executing query: {str(e)}. Source: {source}",
                 "sql": sql
             }
+        finally:
+            if conn is not None:
+                conn.close()
+            self._end_session()
+
+    def _rewrite_spatial_sqlite(self, conn, sql: str) -> str:
+        """Add R-tree pre-filters where the table has a spatial index"""
+        if not self.spatial_rewrite or is_write(sql):
+            return sql
+
+        def spatial_index(table: str, column: str) -> Optional[str]:
+            names = {
+                row[0].lower()
+                for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE lower(name) IN (?, ?, 'spatialindex')",
+                    (f"rtree_{table}_{column}".lower(), f"idx_{table}_{column}".lower()),
+                )
+            }
+            if f"rtree_{table}_{column}".lower() in names:
+                return "gpkg"
+            if f"idx_{table}_{column}".lower() in names and "spatialindex" in names:
+                return "spatialite"
+            return None
+
+        try:
+            rewritten, changes = SpatialRewriter("sqlite", spatial_index).rewrite(sql)
+            if not changes:
+                return sql
+
+            def plan(statement):
+                rows = conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+                return "; ".join(row[-1] for row in rows)
+
+            QgsMessageLog.logMessage(
+                f"Spatial rewrite ({'; '.join(changes)}): plan [{plan(sql)}] -> [{plan(rewritten)}]",
+                "GeoAI Pro",
+                Qgis.Info,
+            )
+            return rewritten
+        except Exception as e:
+            logger.debug("Spatial rewrite skipped: %s", e)
+            return sql
 
     def _execute_attribute_query(self, sql: str, layer: QgsVectorLayer) -> Dict:
         """Execute simple attribute queries on in-memory or shapefile layers."""
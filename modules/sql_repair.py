@@ -0,0 +1,395 @@
+"""
+SQL Repair - Rule-based fixes for SQL errors the schema can explain
+
+The database error is parsed into a kind (from the PostgreSQL SQLSTATE or
+the SQLite message), the offending identifier and its position. Rules then
+resolve that identifier against the schema index of the current context:
+    undefined column   PostgreSQL's "Perhaps you meant" hint, wrong case or
+                       missing quotes, a close unique match, the right alias
+    undefined table    missing schema prefix, wrong case, a close unique match
+    ambiguous column   qualified with the only table in FROM that has it
+Anything else - or a rule that finds no single answer - is left to the LLM.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..core.sql import (
+    COMMENT, RESERVED_WORDS, SQL_KEYWORDS, STRING, WHITESPACE, WORD, QUOTED_IDENTIFIER, quote_identifier,
+    schema_index, tokenize, unquote_identifier,
+)
+from .spatial_rewriter import table_aliases
+
+SQLSTATE_KINDS = {
+    "42703": "undefined_column",
+    "42P01": "undefined_table",
+    "42702": "ambiguous_column",
+    "42883": "undefined_function",
+    "42601": "syntax_error",
+    "42804": "datatype_mismatch",
+}
+NAME = r'("(?:[^"]|"")+"|[^\s"]+)'
+# (kind, pattern capturing the identifier) - PostgreSQL first, then SQLite
+MESSAGE_PATTERNS = [
+    ("undefined_column", re.compile(rf"column {NAME} does not exist")),
+    ("undefined_table", re.compile(rf"relation {NAME} does not exist")),
+    ("missing_from", re.compile(rf"missing FROM-clause entry for table {NAME}")),
+    ("ambiguous_column", re.compile(rf"column reference {NAME} is ambiguous")),
+    ("undefined_function", re.compile(r"function ([\w$.]+)\(.*?\) does not exist")),
+    ("undefined_column", re.compile(r"no such column: (\S+)")),
+    ("undefined_table", re.compile(r"no such table: (\S+)")),
+    ("ambiguous_column", re.compile(r"ambiguous column name: (\S+)")),
+    ("undefined_function", re.compile(r"no such function: (\S+)")),
+    ("syntax_error", re.compile(r'near "(.*?)": syntax error')),
+]
+SQLSTATE_RE = re.compile(r"\(([0-9A-Z]{5})\)")
+HINT_RE = re.compile(r'Perhaps you meant to reference the column "([^"]+)"\.')
+LINE_RE = re.compile(r"LINE (\d+): (.*)\n(\s*)\^")
+# Fuzzy matches below this similarity are left to the LLM
+FUZZY_CUTOFF = 0.8
+
+
+@dataclass
+class SqlError:
+    """A database error reduced to what the rules need"""
+    kind: str
+    message: str
+    sqlstate: str = ""
+    identifier: str = ""
+    qualifier: str = ""
+    position: Optional[int] = None  # offset into the SQL, when the server reported it
+    hint: str = ""
+
+
+@dataclass
+class Repair:
+    """A fixed statement and the rule that produced it"""
+    sql: str
+    rule: str
+    description: str
+
+
+def _split_name(name: str) -> Tuple[str, str]:
+    """(qualifier, name) of a possibly qualified, possibly quoted identifier"""
+    parts = [unquote_identifier(p) if p.startswith('"') else p
+             for p in re.findall(r'"(?:[^"]|"")+"|[^.]+', name)]
+    if len(parts) > 1:
+        return ".".join(parts[:-1]), parts[-1]
+    return "", parts[0] if parts else ""
+
+
+def _error_position(message: str, sql: str) -> Optional[int]:
+    """Offset of PostgreSQL's caret ("LINE n: ... ^") in ``sql``"""
+    match = LINE_RE.search(message)
+    if not match or match.group(2).startswith("..."):
+        return None
+    line_number = int(match.group(1))
+    column = len(match.group(3)) - len(f"LINE {line_number}: ")
+    lines = sql.split("\n")
+    if column < 0 or line_number > len(lines):
+        return None
+    return sum(len(line) + 1 for line in lines[:line_number - 1]) + column
+
+
+def parse_sql_error(message: str, sql: str = "", sqlstate: str = "") -> SqlError:
+    """Kind, identifier and position of a PostgreSQL or SQLite error message"""
+    if not sqlstate:
+        match = SQLSTATE_RE.search(message)
+        sqlstate = match.group(1) if match else ""
+    kind = SQLSTATE_KINDS.get(sqlstate, "")
+    identifier = qualifier = ""
+    for pattern_kind, pattern in MESSAGE_PATTERNS:
+        match = pattern.search(message)
+        if match and (not kind or pattern_kind == kind or pattern_kind == "missing_from"):
+            kind = pattern_kind
+            qualifier, identifier = _split_name(match.group(1))
+            if kind == "undefined_table" and not qualifier and "." in identifier:
+                # PostgreSQL quotes the whole "schema.table"
+                qualifier, identifier = identifier.rsplit(".", 1)
+            break
+    hint = HINT_RE.search(message)
+    return SqlError(
+        kind=kind or "unknown",
+        message=message,
+        sqlstate=sqlstate,
+        identifier=identifier,
+        qualifier=qualifier,
+        position=_error_position(message, sql) if sql else None,
+        hint=hint.group(1) if hint else "",
+    )
+
+
+def error_signature(error: SqlError) -> str:
+    """Normalised identity of an error, stable across queries and runs
+
+    Known kinds reduce to kind + identifier (aliases vary between queries,
+    so the qualifier is left out); other messages drop the position report,
+    literals and numbers.
+    """
+    if error.identifier:
+        return f"{error.kind}:{error.identifier.lower()}"
+    message = LINE_RE.sub("", error.message).split("\n")[0]
+    message = re.sub(r'"(?:[^"]|"")*"|\'(?:[^\']|\'\')*\'', "?", message)
+    message = re.sub(r"\d+", "N", message)
+    return f"{error.kind}:{' '.join(message.lower().split())}"
+
+
+def _code_tokens(sql: str):
+    return [t for t in tokenize(sql) if t.kind not in (WHITESPACE, COMMENT)]
+
+
+def _matches(token, name: str) -> bool:
+    return token.kind in (WORD, QUOTED_IDENTIFIER) and unquote_identifier(token.text).lower() == name.lower()
+
+
+def _is_name(token) -> bool:
+    """Identifier token that isn't a keyword"""
+    if token.kind == QUOTED_IDENTIFIER:
+        return True
+    return token.kind == WORD and token.upper not in RESERVED_WORDS and token.text.lower() not in SQL_KEYWORDS
+
+
+def _alias_definitions(tokens) -> Set[int]:
+    """Indexes of the tokens that define an alias: after AS, or bare in a select list
+
+    ``SELECT area2 AS area`` and ``SELECT area2 area`` name an output column;
+    renaming that token would change what the query returns.
+    """
+    definitions = set()
+    select_depths = set()
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token.text == "(":
+            depth += 1
+        elif token.text == ")":
+            select_depths.discard(depth)
+            depth -= 1
+        elif token.kind == WORD and token.upper == "SELECT":
+            select_depths.add(depth)
+        elif token.kind == WORD and token.upper in ("FROM", "INTO"):
+            select_depths.discard(depth)
+        if i == 0 or token.kind not in (WORD, QUOTED_IDENTIFIER):
+            continue
+        previous = tokens[i - 1]
+        if previous.kind == WORD and previous.upper == "AS":
+            definitions.add(i)
+            continue
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+        if (
+            depth in select_depths and _is_name(token)
+            and (previous.text == ")" or previous.kind == STRING or _is_name(previous)
+                 or previous.text.replace(".", "").isdigit())
+            and (following is None or following.text in (",", ")", ";") or following.upper == "FROM")
+        ):
+            definitions.add(i)
+    return definitions
+
+
+def defined_aliases(sql: str) -> Set[str]:
+    """Lower-case table and output column aliases the statement defines"""
+    tokens = _code_tokens(sql)
+    names = {unquote_identifier(tokens[i].text).lower() for i in _alias_definitions(tokens)}
+    names.update(alias.lower() for alias, table in table_aliases(sql).items()
+                 if alias != unquote_identifier(table.split(".")[-1].strip()))
+    return names
+
+
+def replace_identifier(sql: str, name: str, replacement: str, qualifier: str = None,
+                       new_qualifier: str = None) -> str:
+    """SQL with references to ``name`` replaced (not function calls or literals)
+
+    ``qualifier`` "" matches only unqualified references, None any reference;
+    ``new_qualifier`` replaces / adds the qualifier. Alias definitions
+    (``AS name``, a bare select-list alias) are never renamed.
+    """
+    tokens = _code_tokens(sql)
+    aliases = _alias_definitions(tokens)
+    edits = []
+    for i, token in enumerate(tokens):
+        if not _matches(token, name) or (i + 1 < len(tokens) and tokens[i + 1].text in ("(", ".")):
+            continue
+        if i in aliases:
+            continue
+        qualified = i >= 2 and tokens[i - 1].text == "."
+        if qualifier is not None:
+            if qualifier == "" and qualified:
+                continue
+            if qualifier and not (qualified and _matches(tokens[i - 2], qualifier)):
+                continue
+        end = token.start + len(token.text)
+        if new_qualifier is None:
+            start, text = token.start, replacement
+        else:
+            start = tokens[i - 2].start if qualified else token.start
+            text = f"{new_qualifier}.{replacement}"
+        edits.append((start, end, text))
+    for start, end, text in reversed(edits):
+        sql = sql[:start] + text + sql[end:]
+    return sql
+
+
+def one_edit_apart(a: str, b: str) -> bool:
+    """One insertion, deletion, substitution or adjacent transposition apart"""
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return a[i + 1:] == b[i + 1:] or (a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i:i + 2][::-1])
+
+
+def format_table(table: str) -> str:
+    """Schema-qualified table key written as SQL"""
+    return ".".join(quote_identifier(part) for part in table.split("."))
+
+
+class SqlRepairEngine:
+    """Deterministic repairs resolved against the catalogue in ``context``"""
+
+    def __init__(self, context: Dict):
+        self.index = schema_index(context.get("table_fields", {}))
+
+    def repair(self, sql: str, error: SqlError) -> Optional[Repair]:
+        """First rule that changes ``sql`` for this error, None to escalate"""
+        rules = {
+            "undefined_column": (self._column_from_hint, self._column_from_catalogue),
+            "undefined_table": (self._table_from_catalogue,),
+            "ambiguous_column": (self._qualify_ambiguous,),
+        }.get(error.kind, ())
+        for rule in rules:
+            repair = rule(sql, error)
+            if repair and repair.sql != sql:
+                return repair
+        return None
+
+    def _sources(self, sql: str) -> List[Tuple[str, Optional[str]]]:
+        """(alias, table key) in FROM / JOIN order; key None for unknown relations"""
+        aliases = table_aliases(sql)
+        aliased = {table for alias, table in aliases.items()
+                   if alias != unquote_identifier(table.split(".")[-1].strip())}
+        return [
+            (alias, self.index.table(table.replace('"', "")))
+            for alias, table in aliases.items()
+            # An aliased table can only be referred to by its alias
+            if table not in aliased or alias != unquote_identifier(table.split(".")[-1].strip())
+        ]
+
+    def _qualifier_at(self, sql: str, error: SqlError) -> str:
+        """Qualifier of the reference at the error position"""
+        if error.qualifier or error.position is None:
+            return error.qualifier
+        tokens = _code_tokens(sql)
+        for i, token in enumerate(tokens):
+            if token.start <= error.position < token.start + len(token.text):
+                if i >= 2 and tokens[i - 1].text == ".":
+                    return unquote_identifier(tokens[i - 2].text)
+                break
+        return ""
+
+    def _column_from_hint(self, sql: str, error: SqlError) -> Optional[Repair]:
+        if not error.hint:
+            return None
+        qualifier, column = _split_name(error.hint)
+        fixed = replace_identifier(
+            sql, error.identifier, quote_identifier(column), self._qualifier_at(sql, error) or None,
+            new_qualifier=qualifier or None,
+        )
+        return Repair(fixed, "column_hint", f"{error.identifier} -> {error.hint} (server hint)")
+
+    def _column_from_catalogue(self, sql: str, error: SqlError) -> Optional[Repair]:
+        name = error.identifier
+        qualifier = self._qualifier_at(sql, error)
+        sources = self._sources(sql)
+        aliases = {alias: table for alias, table in sources}
+        if qualifier:
+            tables = [aliases.get(qualifier.lower()) or self.index.table(qualifier)]
+        else:
+            tables = [table for _, table in sources]
+        tables = [t for t in tables if t]
+        if not tables:
+            return None
+
+        # Exists with different case: only the quoting is wrong
+        for table in tables:
+            actual = self.index.columns[table].get(name.lower())
+            if actual:
+                fixed = replace_identifier(sql, name, quote_identifier(actual), qualifier)
+                if fixed != sql:
+                    return Repair(fixed, "column_case", f"{name} -> {quote_identifier(actual)}")
+
+        # Exists in exactly one other table of the query: wrong alias
+        if qualifier:
+            owners = [alias for alias, table in sources
+                      if table and alias != qualifier.lower() and self.index.has_column(name, table)]
+            if len(owners) == 1:
+                actual = self.index.columns[aliases[owners[0]]][name.lower()]
+                fixed = replace_identifier(sql, name, quote_identifier(actual), qualifier,
+                                           new_qualifier=owners[0])
+                return Repair(fixed, "column_alias", f"{qualifier}.{name} -> {owners[0]}.{actual}")
+
+        # A single typo (transposed or missing letter) next to exactly one column;
+        # an alias of the query (area2 next to column area) is not a typo
+        if not qualifier and name.lower() in defined_aliases(sql):
+            return None
+        typos = [m for m in self.index.suggest(name, n=10, cutoff=0.5, tables=tables)
+                 if one_edit_apart(name.lower(), m.lower())]
+        matches = typos if typos else self.index.suggest(name, n=2, cutoff=FUZZY_CUTOFF, tables=tables)
+        if len(matches) == 1:
+            fixed = replace_identifier(sql, name, quote_identifier(matches[0]), qualifier)
+            return Repair(fixed, "column_fuzzy", f"{name} -> {matches[0]}")
+        return None
+
+    def _table_from_catalogue(self, sql: str, error: SqlError) -> Optional[Repair]:
+        schema = error.qualifier
+        if schema.lower() in ("main", "temp"):
+            # SQLite names the database, not a schema written in the query
+            schema = ""
+        name = f"{schema}.{error.identifier}" if schema else error.identifier
+        table = self.index.table(name)
+        rule = "table_name"
+        if table is None:
+            matches = self.index.suggest_tables(name, n=2, cutoff=FUZZY_CUTOFF)
+            if len(matches) != 1:
+                return None
+            table, rule = matches[0], "table_fuzzy"
+        if format_table(table) == format_table(name):
+            return None
+        fixed = self._replace_table(sql, schema, error.identifier, format_table(table))
+        return Repair(fixed, rule, f"{name} -> {format_table(table)}")
+
+    @staticmethod
+    def _replace_table(sql: str, schema: str, name: str, replacement: str) -> str:
+        """Replace the relation after FROM / JOIN (and INTO / UPDATE)"""
+        tokens = _code_tokens(sql)
+        edits = []
+        for i, token in enumerate(tokens):
+            if token.kind != WORD or token.text.lower() not in ("from", "join", "into", "update"):
+                continue
+            j = i + 1
+            start = tokens[j].start if j < len(tokens) else None
+            if schema:
+                if not (j + 2 < len(tokens) and _matches(tokens[j], schema) and tokens[j + 1].text == "."):
+                    continue
+                j += 2
+            if j < len(tokens) and _matches(tokens[j], name):
+                edits.append((start, tokens[j].start + len(tokens[j].text)))
+        for start, end in reversed(edits):
+            sql = sql[:start] + replacement + sql[end:]
+        return sql
+
+    def _qualify_ambiguous(self, sql: str, error: SqlError) -> Optional[Repair]:
+        name = error.identifier
+        owners = [(alias, table) for alias, table in self._sources(sql)
+                  if table and self.index.has_column(name, table)]
+        # Several tables have it: which one was meant is for the LLM to decide
+        if len(owners) != 1:
+            return None
+        alias, table = owners[0]
+        fixed = replace_identifier(sql, name, quote_identifier(self.index.columns[table][name.lower()]),
+                                   "", new_qualifier=quote_identifier(alias))
+        return Repair(fixed, "column_qualify", f"{name} -> {alias}.{name}")
@@ -0,0 +1,276 @@
+"""
+Fix Memory Service - Persistent cache of error signature -> successful fix
+
+When a fixed statement finally runs, the identifiers that changed on the way
+(``"Area"`` -> ``area``, ``geometry`` -> ``geom``) are stored under the
+normalised error signature and a fingerprint of the schema, together with the
+exact failing statement. The next time the same error shows up on the same
+schema the fix is replayed without asking the LLM, and the most frequent
+corrections are added to the SQL system prompt so the model stops making them.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..core.sql import (
+    COMMENT, QUOTED_IDENTIFIER, RESERVED_WORDS, SQL_KEYWORDS, WHITESPACE, WORD, SchemaIndex, is_case_sensitive,
+    normalize, schema_index, tokenize,
+)
+from ..core.sql.schema_index import schema_fingerprint
+from ..infrastructure.logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(__file__))
+
+# kind "identifier": mistake / correction are token texts; "query": normalised SQL / fixed SQL
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fixes (
+    schema TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    mistake TEXT NOT NULL,
+    correction TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 1,
+    used REAL NOT NULL,
+    PRIMARY KEY (schema, signature, kind, mistake)
+);
+CREATE INDEX IF NOT EXISTS fixes_used ON fixes (used);
+"""
+
+
+def schema_key(table_fields: Dict[str, Iterable[str]]) -> str:
+    """Short stable hash of a schema"""
+    return hashlib.sha1(repr(schema_fingerprint(table_fields)).encode("utf-8")).hexdigest()[:16]
+
+
+def _code_tokens(sql: str):
+    return [t for t in tokenize(sql) if t.kind not in (WHITESPACE, COMMENT)]
+
+
+def _same_name(token, text: str) -> bool:
+    """Token spells ``text`` (bare words ignore case, quoted names don't)"""
+    if token.kind == WORD:
+        return token.text.lower() == text.lower()
+    return token.kind == QUOTED_IDENTIFIER and token.text == text
+
+
+def _is_keyword(text: str) -> bool:
+    return text.upper() in RESERVED_WORDS or text.lower() in SQL_KEYWORDS
+
+
+def _is_name_fix(index: SchemaIndex, wrong: str, right: str, case_sensitive: bool) -> bool:
+    """``wrong`` names nothing in the schema and ``right`` does
+
+    A swap between two existing names (``name`` -> ``owner``) changes what
+    the query asks for; replaying it on another query would be wrong.
+    """
+    return index.resolves(right, case_sensitive) and not index.resolves(wrong, case_sensitive)
+
+
+def identifier_changes(before: str, after: str, index: SchemaIndex,
+                       case_sensitive: bool = False) -> List[Tuple[str, str]]:
+    """(wrong, right) identifier tokens that were swapped one for one
+
+    Only swaps from a name the database can't resolve (under its own
+    case-folding) to a column or table of the schema count; keyword changes
+    (INNER -> LEFT, ASC -> DESC) are part of the rewrite, not a name fix.
+    """
+    old, new = _code_tokens(before), _code_tokens(after)
+    matcher = SequenceMatcher(a=[t.text for t in old], b=[t.text for t in new], autojunk=False)
+    changes = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "replace" or i2 - i1 != j2 - j1:
+            continue
+        for wrong, right in zip(old[i1:i2], new[j1:j2]):
+            names = (WORD, QUOTED_IDENTIFIER)
+            if (
+                wrong.kind in names and right.kind in names
+                and not (wrong.kind == WORD and _is_keyword(wrong.text))
+                and _is_name_fix(index, wrong.text, right.text, case_sensitive)
+                and (wrong.text, right.text) not in changes
+            ):
+                changes.append((wrong.text, right.text))
+    return changes
+
+
+def apply_identifier_changes(sql: str, changes: Iterable[Tuple[str, str]]) -> str:
+    """SQL with each ``wrong`` identifier token replaced (not function calls)"""
+    changes = list(changes)
+    tokens = _code_tokens(sql)
+    edits = []
+    for i, token in enumerate(tokens):
+        if i + 1 < len(tokens) and tokens[i + 1].text == "(":
+            continue
+        for wrong, right in changes:
+            if _same_name(token, wrong):
+                edits.append((token.start, token.start + len(token.text), right))
+                break
+    for start, end, text in reversed(edits):
+        sql = sql[:start] + text + sql[end:]
+    return sql
+
+
+class FixMemoryService:
+    """SQLite-backed store of fixes that made a statement run"""
+
+    def __init__(self, db_path: str = None, enabled: bool = True, max_entries: int = 2000):
+        self.db_path = db_path or os.path.join(PLUGIN_DIR, "fix_memory.db")
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def remember(self, table_fields: Dict[str, Iterable[str]], signature: str, failed_sql: str,
+                 fixed_sql: str, db_type: str = None):
+        """Store the fix that turned ``failed_sql`` into ``fixed_sql``, which got past the error"""
+        if not self.enabled or normalize(failed_sql) == normalize(fixed_sql):
+            return
+        schema = schema_key(table_fields)
+        changes = identifier_changes(failed_sql, fixed_sql, schema_index(table_fields), is_case_sensitive(db_type))
+        entries = [("query", normalize(failed_sql), fixed_sql)]
+        entries += [("identifier", wrong, right) for wrong, right in changes]
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.executemany(
+                    "INSERT INTO fixes (schema, signature, kind, mistake, correction, used) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (schema, signature, kind, mistake) "
+                    "DO UPDATE SET correction = excluded.correction, hits = hits + 1, used = excluded.used",
+                    [(schema, signature, kind, wrong, right, now) for kind, wrong, right in entries],
+                )
+                conn.execute(
+                    "DELETE FROM fixes WHERE rowid NOT IN "
+                    "(SELECT rowid FROM fixes ORDER BY used DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not store fix: {e}")
+
+    def lookup(self, schema: str, signature: str, sql: str, table_fields: Dict[str, Iterable[str]] = None,
+               db_type: str = None) -> Optional[Tuple[str, str]]:
+        """(fixed SQL, description) of a remembered fix for this error, if any
+
+        With ``table_fields`` identifier fixes are filtered as in :meth:`corrections`.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            try:
+                rows = self._connection().execute(
+                    "SELECT kind, mistake, correction FROM fixes WHERE schema = ? AND signature = ? "
+                    "ORDER BY hits DESC, used DESC",
+                    (schema, signature),
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read fix memory: {e}")
+                return None
+
+        statement = normalize(sql)
+        for kind, wrong, right in rows:
+            if kind == "query" and wrong == statement:
+                self._touch(schema, signature, kind, [wrong])
+                return right, "same statement fixed before"
+        changes = [
+            (wrong, right) for kind, wrong, right in rows
+            if kind == "identifier" and (wrong.startswith('"') or not _is_keyword(wrong))
+        ]
+        if table_fields:
+            index, case_sensitive = schema_index(table_fields), is_case_sensitive(db_type)
+            changes = [(wrong, right) for wrong, right in changes
+                       if _is_name_fix(index, wrong, right, case_sensitive)]
+        tokens = _code_tokens(sql)
+        applied = [(wrong, right) for wrong, right in changes if any(_same_name(t, wrong) for t in tokens)]
+        fixed = apply_identifier_changes(sql, applied)
+        if fixed == sql:
+            return None
+        self._touch(schema, signature, "identifier", [wrong for wrong, _ in applied])
+        return fixed, ", ".join(f"{wrong} -> {right}" for wrong, right in applied)
+
+    def _touch(self, schema: str, signature: str, kind: str, mistakes: List[str]):
+        """Count a replayed fix"""
+        now = time.time()
+        with self._lock:
+            try:
+                self._connection().executemany(
+                    "UPDATE fixes SET hits = hits + 1, used = ? "
+                    "WHERE schema = ? AND signature = ? AND kind = ? AND mistake = ?",
+                    [(now, schema, signature, kind, mistake) for mistake in mistakes],
+                )
+                self._connection().commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not update fix memory: {e}")
+
+    def corrections(self, table_fields: Dict[str, Iterable[str]], limit: int = 10,
+                    db_type: str = None) -> List[Tuple[str, str]]:
+        """Most frequent (wrong, right) identifier fixes learned on this schema
+
+        Only corrections from a name that doesn't resolve to one that does are
+        kept, as when they were learned.
+        """
+        if not self.enabled or not table_fields:
+            return []
+        with self._lock:
+            try:
+                rows = self._connection().execute(
+                    "SELECT mistake, correction, SUM(hits) AS total FROM fixes "
+                    "WHERE schema = ? AND kind = 'identifier' "
+                    "GROUP BY mistake, correction ORDER BY total DESC, MAX(used) DESC",
+                    (schema_key(table_fields),),
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read fix memory: {e}")
+                return []
+
+        index = schema_index(table_fields)
+        case_sensitive = is_case_sensitive(db_type)
+        known = []
+        for wrong, right, _ in rows:
+            if _is_name_fix(index, wrong, right, case_sensitive):
+                known.append((wrong, right))
+            if len(known) >= limit:
+                break
+        return known
+
+    def clear(self):
+        """Forget every learned fix"""
+        with self._lock:
+            try:
+                self._connection().execute("DELETE FROM fixes")
+                self._connection().commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not clear fix memory: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_fix_memory = None
+_fix_memory_lock = threading.Lock()
+
+
+def get_fix_memory() -> FixMemoryService:
+    """Shared fix memory configured from .env"""
+    global _fix_memory
+    with _fix_memory_lock:
+        if _fix_memory is None:
+            _fix_memory = FixMemoryService(
+                enabled=os.getenv("FIX_MEMORY_ENABLED", "true").lower() == "true",
+            )
+        return _fix_memory
@@ -0,0 +1,308 @@
+"""
+Health Check Service - Cheap provider/model availability checks
+
+Uses model-listing endpoints (Ollama /api/tags, OpenAI/OpenRouter /models...)
+instead of real completions, caches results with a TTL and runs checks on a
+small bounded thread pool with cooperative cancellation.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import requests
+
+from ..core.llm.providers import get_registry
+from ..infrastructure.logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+# A rate-limited listing still proves the key and provider work
+RATE_LIMITED = "Quota exceeded (rate limited)"
+
+
+@dataclass
+class HealthStatus:
+    """Availability of one provider/model"""
+    provider: str
+    model: str
+    available: bool
+    message: str = ""
+    checked_at: float = 0.0
+    latency_ms: float = 0.0
+
+
+class HealthCheckService:
+    """Service for checking provider and model availability"""
+
+    def __init__(self, config=None, ttl: float = None, failure_ttl: float = None,
+                 max_workers: int = 4, timeout: Tuple[float, float] = (3.05, 10)):
+        get = config.get if config is not None else (lambda key, default=None: default)
+        self.ttl = ttl if ttl is not None else get("health_check_ttl", 300)
+        # Failures are retried sooner than successes
+        self.failure_ttl = failure_ttl if failure_ttl is not None else get("health_check_failure_ttl", 60)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="geoai-health")
+        self._lock = threading.Lock()
+        self._statuses: Dict[str, HealthStatus] = {}
+        self._listings: Dict[str, Tuple[float, Optional[Set[str]], str]] = {}
+        self._cancel_events: Dict[str, threading.Event] = {}
+
+    # ------------------------------------------------------------------ cache
+
+    def _key(self, provider: str, model: str) -> str:
+        return f"{provider}:{model}"
+
+    def _is_fresh(self, status: HealthStatus) -> bool:
+        ttl = self.ttl if status.available else self.failure_ttl
+        return time.time() - status.checked_at < ttl
+
+    def get_cached(self, provider: str, model: str) -> Optional[HealthStatus]:
+        """Last known status (may be stale), None if never checked"""
+        with self._lock:
+            return self._statuses.get(self._key(provider, model))
+
+    def invalidate(self, provider: str = None):
+        """Drop cached results for one or all providers"""
+        with self._lock:
+            if provider is None:
+                self._statuses.clear()
+                self._listings.clear()
+                return
+            self._listings.pop(provider, None)
+            for key in [k for k in self._statuses if k.startswith(f"{provider}:")]:
+                del self._statuses[key]
+
+    # ----------------------------------------------------------------- checks
+
+    def _list_models(self, provider: str) -> Tuple[Optional[Set[str]], str]:
+        """Fetch the model ids a provider serves; (None, error) on failure"""
+        # Same lookup (and fallback variables) as the providers themselves
+        api_key = get_registry().api_key_for(provider) or ""
+        if provider != "ollama" and not api_key:
+            return None, "API key not found"
+
+        if provider == "ollama":
+            base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+            response = requests.get(f"{base_url}/api/tags", timeout=self.timeout)
+            response.raise_for_status()
+            names = set()
+            for model in response.json().get("models", []):
+                name = model.get("name", "")
+                names.add(name)
+                if name.endswith(":latest"):
+                    names.add(name[: -len(":latest")])
+            return names, ""
+
+        if provider == "openai":
+            response = requests.get(
+                "https://api.openai.com/v1/models",
+                headers={"Authorization": f"Bearer {api_key}"},
+                timeout=self.timeout,
+            )
+        elif provider == "openrouter":
+            response = requests.get(
+                "https://openrouter.ai/api/v1/models",
+                headers={"Authorization": f"Bearer {api_key}"},
+                timeout=self.timeout,
+            )
+        elif provider == "anthropic":
+            response = requests.get(
+                "https://api.anthropic.com/v1/models",
+                headers={"x-api-key": api_key, "anthropic-version": "2023-06-01"},
+                params={"limit": 1000},
+                timeout=self.timeout,
+            )
+        elif provider == "google":
+            response = requests.get(
+                "https://generativelanguage.googleapis.com/v1beta/models",
+                params={"key": api_key, "pageSize": 1000},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            return {m.get("name", "") for m in response.json().get("models", [])}, ""
+        else:
+            return None, ""
+
+        response.raise_for_status()
+        return {m.get("id", "") for m in response.json().get("data", [])}, ""
+
+    def _provider_listing(self, provider: str, force: bool = False) -> Tuple[Optional[Set[str]], str]:
+        """Cached model listing - one request per provider, not per model"""
+        with self._lock:
+            cached = self._listings.get(provider)
+        if cached and not force:
+            checked_at, models, error = cached
+            ttl = self.ttl if models is not None else self.failure_ttl
+            if time.time() - checked_at < ttl:
+                return models, error
+
+        try:
+            models, error = self._list_models(provider)
+        except requests.exceptions.Timeout:
+            models, error = None, "Health check timeout"
+        except requests.exceptions.ConnectionError:
+            models, error = None, "Provider not reachable"
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else "?"
+            if status == 429:
+                models, error = None, RATE_LIMITED
+            else:
+                models, error = None, "Invalid API key" if status in (401, 403) else f"HTTP {status}"
+        except Exception as e:
+            models, error = None, str(e)
+
+        with self._lock:
+            self._listings[provider] = (time.time(), models, error)
+        return models, error
+
+    def _check_huggingface(self, model: str) -> Tuple[bool, str]:
+        """HuggingFace has no usable listing - query the model card metadata"""
+        api_key = get_registry().api_key_for("huggingface")
+        if not api_key:
+            return False, "API key not found"
+        try:
+            response = requests.get(
+                f"https://huggingface.co/api/models/{model}",
+                headers={"Authorization": f"Bearer {api_key}"},
+                timeout=self.timeout,
+            )
+        except requests.exceptions.RequestException as e:
+            return False, str(e)
+        if response.status_code == 200:
+            return True, ""
+        if response.status_code in (401, 403):
+            return False, "Invalid API key"
+        if response.status_code == 429:
+            return True, RATE_LIMITED
+        return False, f"HTTP {response.status_code}"
+
+    def check_model(self, provider: str, model: str, force: bool = False) -> HealthStatus:
+        """Check one model, using the cache unless force is set"""
+        provider = provider.lower()
+        cached = self.get_cached(provider, model)
+        if cached and not force and self._is_fresh(cached):
+            return cached
+
+        start = time.time()
+        if provider == "huggingface":
+            available, message = self._check_huggingface(model)
+        else:
+            models, error = self._provider_listing(provider, force=force)
+            if models is None:
+                available, message = error == RATE_LIMITED, error or "Unsupported provider"
+            elif model in models:
+                available, message = True, ""
+            else:
+                available, message = False, "Model not found on provider"
+
+        status = HealthStatus(
+            provider=provider,
+            model=model,
+            available=available,
+            message=message,
+            checked_at=time.time(),
+            latency_ms=(time.time() - start) * 1000,
+        )
+        with self._lock:
+            self._statuses[self._key(provider, model)] = status
+        return status
+
+    def refresh_async(
+        self,
+        provider: str,
+        models: List[str],
+        callback: Callable[[HealthStatus], None],
+        force: bool = False,
+        group: str = "background",
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> Future:
+        """Check models in the background, calling callback for each result
+
+        A new refresh for the same provider and group cancels the previous
+        one; the callback is never called after cancellation. Background
+        refreshes and user-requested checks use different groups so the
+        periodic refresh cannot swallow a pending manual check. on_done is
+        called once the refresh ends, whether it completed, failed or was
+        cancelled.
+        """
+        provider = provider.lower()
+        cancel_event = threading.Event()
+        cancel_key = f"{provider}:{group}"
+        with self._lock:
+            previous = self._cancel_events.get(cancel_key)
+            if previous:
+                previous.set()
+            self._cancel_events[cancel_key] = cancel_event
+        if force:
+            self.invalidate(provider)
+
+        if provider == "huggingface" and models:
+            # Per-model checks: spread over the bounded pool
+            remaining = [len(models)]
+            remaining_lock = threading.Lock()
+
+            def job_done():
+                with remaining_lock:
+                    remaining[0] -= 1
+                    finished = remaining[0] == 0
+                if finished and on_done:
+                    on_done()
+
+            futures = [
+                self._executor.submit(
+                    self._check_and_report, provider, [model], callback, cancel_event, job_done
+                )
+                for model in models
+            ]
+            return futures[-1]
+
+        # One listing request covers every model of the provider
+        return self._executor.submit(
+            self._check_and_report, provider, models, callback, cancel_event, on_done
+        )
+
+    def _check_and_report(self, provider: str, models: List[str],
+                          callback: Callable[[HealthStatus], None],
+                          cancel_event: threading.Event,
+                          on_done: Optional[Callable[[], None]] = None):
+        try:
+            for model in models:
+                if cancel_event.is_set():
+                    return
+                try:
+                    status = self.check_model(provider, model)
+                except Exception as e:
+                    logger.warning(f"Health check for {provider}/{model} failed: {e}")
+                    status = HealthStatus(
+                        provider=provider,
+                        model=model,
+                        available=False,
+                        message=str(e),
+                        checked_at=time.time(),
+                    )
+                if not cancel_event.is_set():
+                    callback(status)
+        finally:
+            if on_done:
+                on_done()
+
+    def cancel(self, provider: str = None):
+        """Cooperatively cancel pending refreshes of one or all providers"""
+        provider = provider.lower() if provider else None
+        with self._lock:
+            events = [
+                event for key, event in self._cancel_events.items()
+                if provider is None or key.startswith(f"{provider}:")
+            ]
+        for event in events:
+            event.set()
+
+    def shutdown(self):
+        """Cancel pending checks and stop the worker pool"""
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
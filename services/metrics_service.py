@@ -0,0 +1,345 @@
+"""
+Metrics Service - Local time-series store for request metrics
+
+Samples (stage latencies, success, tokens, cost, SQL row counts, cache hits)
+are buffered in memory and flushed to a small SQLite database. Each flush
+also folds the samples into hourly rollups holding a log-spaced latency
+histogram, so p50/p95/p99 over any window are read from a few rows. Raw
+samples are kept for a short time, rollups for longer.
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..infrastructure.logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(__file__))
+
+# Pipeline stages timed for every SQL request
+STAGES = ("context", "llm", "parse", "execute")
+# Histogram resolution: 4 buckets per doubling (~19% wide)
+BUCKETS_PER_OCTAVE = 4
+ROLLUP_SECONDS = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    provider TEXT NOT NULL DEFAULT '',
+    model TEXT NOT NULL DEFAULT '',
+    value REAL NOT NULL DEFAULT 0,
+    success INTEGER NOT NULL DEFAULT 1,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    rows INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+CREATE TABLE IF NOT EXISTS rollups (
+    bucket INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    total REAL NOT NULL,
+    tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    rows INTEGER NOT NULL,
+    histogram TEXT NOT NULL,
+    PRIMARY KEY (bucket, kind, name, provider, model)
+);
+"""
+
+
+def histogram_bucket(value_ms: float) -> int:
+    """Log-spaced histogram bucket of a latency in milliseconds"""
+    if value_ms <= 1:
+        return 0
+    return int(math.ceil(math.log2(value_ms) * BUCKETS_PER_OCTAVE))
+
+
+def bucket_upper_bound(index: int) -> float:
+    return 2 ** (index / BUCKETS_PER_OCTAVE)
+
+
+def histogram_percentile(histogram: Dict[int, int], q: float) -> Optional[float]:
+    """Approximate percentile (upper bound of the bucket holding it)"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for index in sorted(histogram):
+        seen += histogram[index]
+        if seen >= rank:
+            return bucket_upper_bound(index)
+    return bucket_upper_bound(max(histogram))
+
+
+@dataclass
+class Sample:
+    """One measured event"""
+    kind: str
+    name: str
+    value: float = 0.0  # milliseconds for timings, 1/0 for cache hit/miss
+    success: bool = True
+    provider: str = ""
+    model: str = ""
+    tokens: int = 0
+    cost: float = 0.0
+    rows: int = 0
+    ts: float = field(default_factory=time.time)
+
+
+@dataclass
+class LatencySummary:
+    """Latency distribution of one group"""
+    kind: str
+    name: str
+    provider: str
+    model: str
+    count: int
+    failures: int
+    p50: Optional[float]
+    p95: Optional[float]
+    p99: Optional[float]
+    avg: float
+    tokens: int
+    cost: float
+    rows: int
+
+
+class MetricsService:
+    """Buffered SQLite time-series store with hourly rollups"""
+
+    def __init__(self, db_path: str = None, flush_interval: float = 5.0, max_buffer: int = 50,
+                 raw_retention_days: float = 2, rollup_retention_days: float = 90):
+        self.db_path = db_path or os.path.join(PLUGIN_DIR, "metrics.db")
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.raw_retention = raw_retention_days * 86400
+        self.rollup_retention = rollup_retention_days * 86400
+        self._buffer: List[Sample] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    # --------------------------------------------------------------- recording
+
+    def record(self, kind: str, name: str, value: float = 0.0, success: bool = True,
+               provider: str = "", model: str = "", tokens: int = 0, cost: float = 0.0,
+               rows: int = 0):
+        """Buffer one sample; flushed in batches"""
+        sample = Sample(
+            kind=kind, name=name, value=value, success=success, provider=provider or "",
+            model=model or "", tokens=tokens or 0, cost=cost or 0.0, rows=rows or 0,
+        )
+        with self._lock:
+            self._buffer.append(sample)
+            due = (
+                len(self._buffer) >= self.max_buffer
+                or time.time() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def record_cache(self, name: str, hit: bool):
+        """Cache lookup outcome"""
+        self.record("cache", name, value=1.0 if hit else 0.0)
+
+    @contextmanager
+    def timer(self, name: str, kind: str = "stage", **labels) -> Iterator[Dict]:
+        """Time a block; the yielded dict can set success/rows/tokens/cost/provider/model
+
+        An exception marks the sample as failed.
+        """
+        sample = {"success": True, **labels}
+        start = time.perf_counter()
+        try:
+            yield sample
+        except Exception:
+            sample["success"] = False
+            raise
+        finally:
+            self.record(kind, name, value=(time.perf_counter() - start) * 1000, **sample)
+
+    def flush(self):
+        """Write buffered samples and fold them into the hourly rollups"""
+        with self._lock:
+            samples, self._buffer = self._buffer, []
+            self._last_flush = time.time()
+            if not samples:
+                return
+            try:
+                self._write(samples)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not store metrics: {e}")
+
+    def _write(self, samples: List[Sample]):
+        conn = self._connection()
+        groups: Dict[Tuple, Dict] = {}
+        for s in samples:
+            key = (int(s.ts // ROLLUP_SECONDS * ROLLUP_SECONDS), s.kind, s.name, s.provider, s.model)
+            group = groups.setdefault(key, {
+                "count": 0, "failures": 0, "total": 0.0, "tokens": 0, "cost": 0.0, "rows": 0,
+                "histogram": {},
+            })
+            group["count"] += 1
+            group["failures"] += 0 if s.success else 1
+            group["total"] += s.value
+            group["tokens"] += s.tokens
+            group["cost"] += s.cost
+            group["rows"] += s.rows
+            if s.kind != "cache":
+                index = histogram_bucket(s.value)
+                group["histogram"][index] = group["histogram"].get(index, 0) + 1
+
+        with conn:
+            conn.executemany(
+                "INSERT INTO samples (ts, kind, name, provider, model, value, success, tokens, cost, rows) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(s.ts, s.kind, s.name, s.provider, s.model, s.value, int(s.success),
+                  s.tokens, s.cost, s.rows) for s in samples],
+            )
+            for key, group in groups.items():
+                row = conn.execute(
+                    "SELECT count, failures, total, tokens, cost, rows, histogram FROM rollups "
+                    "WHERE bucket = ? AND kind = ? AND name = ? AND provider = ? AND model = ?",
+                    key,
+                ).fetchone()
+                if row:
+                    histogram = {int(k): v for k, v in json.loads(row[6]).items()}
+                    for index, count in group["histogram"].items():
+                        histogram[index] = histogram.get(index, 0) + count
+                    group = {
+                        "count": row[0] + group["count"],
+                        "failures": row[1] + group["failures"],
+                        "total": row[2] + group["total"],
+                        "tokens": row[3] + group["tokens"],
+                        "cost": row[4] + group["cost"],
+                        "rows": row[5] + group["rows"],
+                        "histogram": histogram,
+                    }
+                conn.execute(
+                    "INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    key + (group["count"], group["failures"], group["total"], group["tokens"],
+                           group["cost"], group["rows"], json.dumps(group["histogram"])),
+                )
+
+    def prune(self):
+        """Drop raw samples and rollups past their retention"""
+        now = time.time()
+        with self._lock:
+            try:
+                with self._connection() as conn:
+                    conn.execute("DELETE FROM samples WHERE ts < ?", (now - self.raw_retention,))
+                    conn.execute("DELETE FROM rollups WHERE bucket < ?", (now - self.rollup_retention,))
+            except sqlite3.Error as e:
+                logger.warning(f"Could not prune metrics: {e}")
+
+    # ----------------------------------------------------------------- queries
+
+    def _rollups(self, since: float, kind: str = None):
+        self.flush()
+        query = ("SELECT kind, name, provider, model, count, failures, total, tokens, cost, rows, histogram "
+                 "FROM rollups WHERE bucket >= ?")
+        params = [int(since // ROLLUP_SECONDS * ROLLUP_SECONDS)]
+        if kind:
+            query += " AND kind = ?"
+            params.append(kind)
+        with self._lock:
+            try:
+                return self._connection().execute(query, params).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read metrics: {e}")
+                return []
+
+    def latency_summary(self, since: float, kind: str = "stage",
+                        by_model: bool = True) -> List[LatencySummary]:
+        """p50/p95/p99 per name (and provider/model) since a timestamp"""
+        groups: Dict[Tuple, Dict] = {}
+        for kind_, name, provider, model, count, failures, total, tokens, cost, rows, hist in self._rollups(since, kind):
+            key = (kind_, name, provider, model) if by_model else (kind_, name, "", "")
+            group = groups.setdefault(key, {
+                "count": 0, "failures": 0, "total": 0.0, "tokens": 0, "cost": 0.0, "rows": 0,
+                "histogram": {},
+            })
+            group["count"] += count
+            group["failures"] += failures
+            group["total"] += total
+            group["tokens"] += tokens
+            group["cost"] += cost
+            group["rows"] += rows
+            for index, n in json.loads(hist).items():
+                group["histogram"][int(index)] = group["histogram"].get(int(index), 0) + n
+
+        return [
+            LatencySummary(
+                kind=key[0], name=key[1], provider=key[2], model=key[3],
+                count=group["count"], failures=group["failures"],
+                p50=histogram_percentile(group["histogram"], 0.50),
+                p95=histogram_percentile(group["histogram"], 0.95),
+                p99=histogram_percentile(group["histogram"], 0.99),
+                avg=group["total"] / group["count"] if group["count"] else 0.0,
+                tokens=group["tokens"], cost=group["cost"], rows=group["rows"],
+            )
+            for key, group in sorted(groups.items())
+        ]
+
+    def totals(self, since: float) -> Dict:
+        """Headline numbers for the dashboard"""
+        requests = self.latency_summary(since, kind="request", by_model=False)
+        llm = [s for s in self.latency_summary(since, by_model=False) if s.name == "llm"]
+        cache = self._rollups(since, kind="cache")
+        cache_lookups = sum(row[4] for row in cache)
+        cache_hits = sum(row[6] for row in cache)
+
+        count = sum(s.count for s in requests)
+        failures = sum(s.failures for s in requests)
+        return {
+            "requests": count,
+            "success_rate": (count - failures) / count if count else None,
+            "avg_latency_ms": sum(s.avg * s.count for s in requests) / count if count else None,
+            "cost": sum(s.cost for s in llm),
+            "tokens": sum(s.tokens for s in llm),
+            "cache_hit_rate": cache_hits / cache_lookups if cache_lookups else None,
+        }
+
+    def close(self):
+        """Flush and close the database"""
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics_service() -> MetricsService:
+    """Shared metrics store"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsService()
+            _metrics.prune()
+        return _metrics
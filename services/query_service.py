@@ -5,6 +5,8 @@ Query Service - Orchestrates SQL generation and execution
 from typing import Dict, Optional
 from qgis.core import QgsMessageLog, Qgis
 from ..infrastructure.logging.logger import get_logger
+from ..infrastructure.tracing import span
+from .metrics_service import get_metrics_service
 
 logger = get_logger(__name__)
 
@@ -21,9 +23,17 @@ class QueryService:
     def generate_and_execute(self, prompt: str, provider: str, model: str, 
                             use_cache: bool = True) -> Dict:
         """Generate SQL and execute it"""
+        with span("generate_and_execute", provider=provider, model=model) as trace:
+            result = self._generate_and_execute(prompt, provider, model, use_cache)
+            trace.set(success="error" not in result)
+            return result
+
+    def _generate_and_execute(self, prompt: str, provider: str, model: str,
+                              use_cache: bool) -> Dict:
         # Check cache first
         if use_cache and self.cache_service:
             cached = self.cache_service.get(prompt)
+            get_metrics_service().record_cache("query", cached is not None)
             if cached:
                 logger.info("Using cached query result")
                 return cached
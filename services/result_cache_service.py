@@ -0,0 +1,179 @@
+"""
+Result Cache Service - In-memory cache of read-only query results
+
+Entries are keyed by connection + normalised SQL and remember the version
+marker of the tables the query read (PostgreSQL modification counters, file
+mtime/size for SQLite/GeoPackage). A lookup with a different marker is a miss,
+so repeated analytics return instantly and still see edits. Writes made
+through the executor drop the connection's entries outright; a TTL bounds
+staleness when the database reports changes late.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+
+from ..core.sql import STRING, normalize, tokenize
+from ..infrastructure.logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Results depending on these are never cached
+VOLATILE_RE = re.compile(
+    r"\b(?:random|now|clock_timestamp|statement_timestamp|timeofday|current_timestamp|"
+    r"current_date|current_time|localtimestamp|nextval|setval|txid_current|uuid_generate_v\d|"
+    r"gen_random_uuid|pg_sleep)\b|'now'",
+    re.IGNORECASE,
+)
+WRITE_RE = re.compile(
+    r"\b(insert|update|delete|merge|create|alter|drop|truncate|grant|revoke|vacuum|copy|into)\b",
+    re.IGNORECASE,
+)
+TABLE_RE = re.compile(
+    r"\b(?:from|join)\s+((?:\"(?:[^\"]|\"\")+\"|[A-Za-z_][\w$]*)(?:\.(?:\"(?:[^\"]|\"\")+\"|[A-Za-z_][\w$]*))?)",
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """Whitespace-collapsed SQL without comments or a trailing semicolon"""
+    return normalize(sql)
+
+
+def _unquoted(sql: str) -> str:
+    """SQL with string literals blanked out (keywords inside strings ignored)"""
+    return "".join("''" if token.kind == STRING else token.text for token in tokenize(sql))
+
+
+def is_cacheable(sql: str) -> bool:
+    """Single read-only SELECT without volatile functions"""
+    statement = normalize_sql(sql)
+    code = _unquoted(statement)
+    if not code or ";" in code:
+        return False
+    if not re.match(r"(select|with)\b", code, re.IGNORECASE):
+        return False
+    return not WRITE_RE.search(code) and not VOLATILE_RE.search(statement)
+
+
+def is_write(sql: str) -> bool:
+    """Anything but a plain query - may change data or schema"""
+    code = _unquoted(normalize_sql(sql))
+    return bool(code) and (
+        not re.match(r"(select|with)\b", code, re.IGNORECASE) or bool(WRITE_RE.search(code))
+    )
+
+
+def referenced_tables(sql: str) -> List[str]:
+    """Relations named after FROM / JOIN (CTE names excluded)"""
+    code = _unquoted(normalize_sql(sql))
+    ctes = {
+        name.lower()
+        for name in re.findall(r"(?:\bwith(?:\s+recursive)?|,)\s*([A-Za-z_]\w*)\s+as\s*\(", code, re.IGNORECASE)
+    }
+    tables = []
+    for name in TABLE_RE.findall(code):
+        if name.lower() not in ctes and name not in tables:
+            tables.append(name)
+    return tables
+
+
+def file_marker(path: str) -> Optional[tuple]:
+    """Version marker of a file database (includes the WAL file if present)"""
+    marker = []
+    for candidate in (path, path + "-wal"):
+        try:
+            stat = os.stat(candidate)
+        except OSError:
+            if candidate == path:
+                return None
+            continue
+        marker.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(marker)
+
+
+class ResultCacheService:
+    """LRU cache of query results bounded by entries and total rows"""
+
+    def __init__(self, enabled: bool = True, max_entries: int = 128, max_rows: int = 50000,
+                 ttl: float = 300):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def get(self, connection: str, sql: str, marker: Hashable) -> Optional[Dict]:
+        """Cached result, None on a miss or when the tables changed"""
+        if not self.enabled or marker is None:
+            return None
+        key = (connection, normalize_sql(sql))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["marker"] != marker or time.time() - entry["stored"] > self.ttl:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            result = entry["result"]
+        return dict(result, rows=[dict(row) for row in result.get("rows", [])], cached=True)
+
+    def put(self, connection: str, sql: str, marker: Hashable, result: Dict):
+        """Store a successful result unless it is too large to be worth keeping"""
+        if not self.enabled or marker is None or not result.get("success"):
+            return
+        rows = len(result.get("rows", []))
+        if rows > self.max_rows // 4:
+            return
+        key = (connection, normalize_sql(sql))
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {"marker": marker, "stored": time.time(), "result": result, "rows": rows}
+            self._rows += rows
+            while self._entries and (len(self._entries) > self.max_entries or self._rows > self.max_rows):
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: tuple):
+        entry = self._entries.pop(key)
+        self._rows -= entry["rows"]
+
+    def invalidate(self, connection: str = None):
+        """Drop the entries of one connection (all when None)"""
+        with self._lock:
+            for key in [k for k in self._entries if connection is None or k[0] == connection]:
+                self._drop(key)
+        logger.debug("Result cache invalidated for %s", connection or "all connections")
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "rows": self._rows}
+
+
+_result_cache = None
+
+
+def get_result_cache() -> ResultCacheService:
+    """Shared result cache configured from .env"""
+    global _result_cache
+    if _result_cache is None:
+        def _int(name, default):
+            value = os.getenv(name, "")
+            return int(value) if value.isdigit() else default
+
+        _result_cache = ResultCacheService(
+            enabled=os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true",
+            max_entries=_int("RESULT_CACHE_MAX_ENTRIES", 128),
+            max_rows=_int("RESULT_CACHE_MAX_ROWS", 50000),
+            ttl=_int("RESULT_CACHE_TTL", 300),
+        )
+    return _result_cache
@@ -30,6 +30,8 @@ def discover_and_run_tests():
         'tests.test_sql_queries',
         'tests.test_integration',
         'tests.test_edge_cases',
+        'tests.test_sql_tokenizer',
+        'tests.test_schema_index',
     ]
     
     for module_name in test_modules:
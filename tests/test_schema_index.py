@@ -0,0 +1,42 @@
+"""
+Tests for the schema index
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.sql.schema_index import SchemaIndex, is_case_sensitive  # noqa: E402
+
+
+class TestResolves(unittest.TestCase):
+    """Identifiers resolve under the database's case-folding rules"""
+
+    def setUp(self):
+        self.index = SchemaIndex({"public.parcels": ["id", "name", "Owner"]})
+
+    def test_postgres_folds_bare_names(self):
+        self.assertTrue(self.index.resolves("NAME", case_sensitive=True))
+        self.assertFalse(self.index.resolves("owner", case_sensitive=True))
+        self.assertTrue(self.index.resolves('"Owner"', case_sensitive=True))
+        self.assertFalse(self.index.resolves('"Name"', case_sensitive=True))
+
+    def test_sqlite_ignores_case(self):
+        self.assertTrue(self.index.resolves("owner"))
+        self.assertTrue(self.index.resolves('"NAME"'))
+
+    def test_tables_and_table_scope(self):
+        self.assertTrue(self.index.resolves("parcels", case_sensitive=True))
+        self.assertTrue(self.index.resolves("name", case_sensitive=True, table="public.parcels"))
+        self.assertFalse(self.index.resolves("parcels", table="public.parcels"))
+
+    def test_case_sensitivity_from_db_type(self):
+        self.assertTrue(is_case_sensitive("PostgreSQL/PostGIS"))
+        self.assertFalse(is_case_sensitive("GeoPackage"))
+        self.assertFalse(is_case_sensitive(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
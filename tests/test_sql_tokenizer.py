@@ -0,0 +1,42 @@
+"""
+Tests for the shared SQL tokenizer
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.sql.tokenizer import mask_literals, split_statements, statement_type  # noqa: E402
+
+
+class TestDollarQuotedStrings(unittest.TestCase):
+    """$$...$$ and $tag$...$tag$ literals end at their own delimiter"""
+
+    def test_untagged_dollar_string_closes(self):
+        self.assertEqual(
+            split_statements("select $$a$$; select 2"), ["select $$a$$", "select 2"]
+        )
+
+    def test_do_block_does_not_hide_following_statements(self):
+        statements = split_statements("DO $$ BEGIN NULL; END $$; COMMIT")
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(statement_type(statements[1]), "COMMIT")
+
+    def test_tagged_dollar_string_closes_on_its_own_tag(self):
+        sql = "create function f() returns int as $fn$ select $$;$$; $fn$ language sql; select 1"
+        self.assertEqual(len(split_statements(sql)), 2)
+
+    def test_unterminated_dollar_string_runs_to_end(self):
+        self.assertEqual(len(split_statements("select $$a; select 2")), 1)
+
+    def test_mask_literals_blanks_only_the_literal(self):
+        masked = mask_literals("select $$x$$ as a")
+        self.assertEqual(len(masked), len("select $$x$$ as a"))
+        self.assertTrue(masked.endswith(" as a"))
+        self.assertNotIn("x", masked)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,53 +2,118 @@
 Analytics Dashboard - Performance metrics and usage statistics
 """
 
+import time
+
 from qgis.PyQt.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame, QGridLayout
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame, QGridLayout,
+    QComboBox, QPushButton, QTableWidget, QTableWidgetItem
 )
+from qgis.PyQt.QtCore import QTimer
 from qgis.core import QgsMessageLog, Qgis
 
+from ...services.metrics_service import get_metrics_service, STAGES
+
+
+PERIODS = [
+    ("Last hour", 3600),
+    ("Last 24 hours", 86400),
+    ("Last 7 days", 7 * 86400),
+    ("Last 30 days", 30 * 86400),
+]
+
+
+def _format_ms(value):
+    if value is None:
+        return "-"
+    return f"{value / 1000:.2f}s" if value >= 1000 else f"{value:.0f}ms"
+
 
 class AnalyticsDashboard(QWidget):
     """Analytics dashboard with metrics and charts"""
-    
+
     def __init__(self, iface, config):
         super().__init__()
         self.iface = iface
         self.config = config
+        self.metrics = get_metrics_service()
+        self.metric_labels = {}
         self.setup_ui()
-    
+
+        # Refresh while the tab is visible
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.setInterval(30000)
+
     def setup_ui(self):
         """Setup UI"""
         layout = QVBoxLayout()
         self.setLayout(layout)
-        
-        # Title
+
+        # Title and period selector
+        header = QHBoxLayout()
         title = QLabel("📊 Analytics Dashboard")
         title.setStyleSheet("font-size: 20px; font-weight: 700; color: #61afef;")
-        layout.addWidget(title)
-        
+        header.addWidget(title)
+        header.addStretch()
+
+        self.period_combo = QComboBox()
+        for label, _ in PERIODS:
+            self.period_combo.addItem(label)
+        self.period_combo.setCurrentIndex(1)
+        self.period_combo.currentIndexChanged.connect(self.refresh)
+        header.addWidget(self.period_combo)
+
+        refresh_btn = QPushButton("🔄 Refresh")
+        refresh_btn.clicked.connect(self.refresh)
+        header.addWidget(refresh_btn)
+        layout.addLayout(header)
+
         # Metrics grid
         metrics_grid = QGridLayout()
-        
+
         # Metric cards
         metrics = [
-            ("Total Queries", "1,234", "#61afef"),
-            ("Success Rate", "98.5%", "#98c379"),
-            ("Avg Response", "2.3s", "#e5c07b"),
-            ("Cost Today", "$0.45", "#e06c75")
+            ("Total Queries", "#61afef"),
+            ("Success Rate", "#98c379"),
+            ("Avg Response", "#e5c07b"),
+            ("Cost", "#e06c75"),
+            ("Tokens", "#c678dd"),
+            ("Cache Hit Rate", "#56b6c2"),
         ]
-        
-        for i, (label, value, color) in enumerate(metrics):
-            card = self.create_metric_card(label, value, color)
-            metrics_grid.addWidget(card, i // 2, i % 2)
-        
+
+        for i, (label, color) in enumerate(metrics):
+            card = self.create_metric_card(label, "-", color)
+            metrics_grid.addWidget(card, i // 3, i % 3)
+
         layout.addLayout(metrics_grid)
-        
-        # Charts placeholder
-        charts_label = QLabel("📈 Charts and graphs will be displayed here")
-        charts_label.setStyleSheet("padding: 40px; color: #abb2bf;")
-        layout.addWidget(charts_label)
-    
+
+        # Latency per provider/model
+        layout.addWidget(QLabel("⏱️ LLM latency by provider / model"))
+        self.model_table = self._create_table(
+            ["Provider", "Model", "Calls", "Errors", "p50", "p95", "p99", "Tokens", "Cost"]
+        )
+        layout.addWidget(self.model_table)
+
+        # Latency per pipeline stage
+        layout.addWidget(QLabel("🔀 Latency by stage"))
+        self.stage_table = self._create_table(
+            ["Stage", "Count", "Errors", "p50", "p95", "p99", "Rows"]
+        )
+        layout.addWidget(self.stage_table)
+
+        # Error fixes: local rules vs LLM
+        layout.addWidget(QLabel("🛠️ SQL error fixes"))
+        self.fix_table = self._create_table(["Fixed by", "Fixes", "Worked", "Success", "p50 to fix"])
+        layout.addWidget(self.fix_table)
+
+    def _create_table(self, columns):
+        table = QTableWidget()
+        table.setColumnCount(len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.verticalHeader().setVisible(False)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        return table
+
     def create_metric_card(self, label, value, color):
         """Create a metric card"""
         card = QFrame()
@@ -60,17 +125,75 @@ class AnalyticsDashboard(QWidget):
                 padding: 20px;
             }}
         """)
-        
+
         layout = QVBoxLayout()
         card.setLayout(layout)
-        
+
         value_label = QLabel(value)
         value_label.setStyleSheet(f"font-size: 32px; font-weight: 700; color: {color};")
         layout.addWidget(value_label)
-        
+        self.metric_labels[label] = value_label
+
         label_widget = QLabel(label)
         label_widget.setStyleSheet("font-size: 14px; color: #abb2bf;")
         layout.addWidget(label_widget)
-        
+
         return card
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.refresh_timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.refresh_timer.stop()
+
+    def refresh(self):
+        """Reload numbers from the metrics store"""
+        since = time.time() - PERIODS[self.period_combo.currentIndex()][1]
+        try:
+            totals = self.metrics.totals(since)
+            stages = self.metrics.latency_summary(since, by_model=False)
+            models = [s for s in self.metrics.latency_summary(since) if s.name == "llm"]
+            fixes = self.metrics.latency_summary(since, kind="fix", by_model=False)
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Analytics refresh failed: {str(e)}", "GeoAI Pro", Qgis.Warning)
+            return
+
+        def _percent(value):
+            return "-" if value is None else f"{value * 100:.1f}%"
+
+        self.metric_labels["Total Queries"].setText(f"{totals['requests']:,}")
+        self.metric_labels["Success Rate"].setText(_percent(totals["success_rate"]))
+        self.metric_labels["Avg Response"].setText(_format_ms(totals["avg_latency_ms"]))
+        self.metric_labels["Cost"].setText(f"${totals['cost']:.2f}")
+        self.metric_labels["Tokens"].setText(f"{totals['tokens']:,}")
+        self.metric_labels["Cache Hit Rate"].setText(_percent(totals["cache_hit_rate"]))
+
+        self._fill_table(self.model_table, [
+            [s.provider, s.model, s.count, s.failures, _format_ms(s.p50), _format_ms(s.p95),
+             _format_ms(s.p99), f"{s.tokens:,}", f"${s.cost:.4f}"]
+            for s in sorted(models, key=lambda s: (s.provider, s.model))
+        ])
+
+        by_stage = {s.name: s for s in stages}
+        self._fill_table(self.stage_table, [
+            [name, s.count, s.failures, _format_ms(s.p50), _format_ms(s.p95), _format_ms(s.p99),
+             f"{s.rows:,}" if name == "execute" else "-"]
+            for name, s in ((name, by_stage[name]) for name in STAGES if name in by_stage)
+        ])
+
+        fix_labels = {"rule": "Rules (local)", "llm": "LLM"}
+        self._fill_table(self.fix_table, [
+            [fix_labels.get(s.name, s.name), s.count, s.count - s.failures,
+             _percent((s.count - s.failures) / s.count if s.count else None), _format_ms(s.p50)]
+            for s in sorted(fixes, key=lambda s: s.name != "rule")
+        ])
+
+    def _fill_table(self, table, rows):
+        table.setRowCount(len(rows))
+        for row_idx, row in enumerate(rows):
+            for col_idx, value in enumerate(row):
+                table.setItem(row_idx, col_idx, QTableWidgetItem(str(value)))
+        table.resizeColumnsToContents()
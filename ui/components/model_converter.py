@@ -26,6 +26,8 @@ from qgis.core import QgsMessageLog, Qgis, QgsRasterLayer, QgsProject
 import os
 import requests
 
+from ...core.workflow import is_model_file, parse_model3_file
+
 
 class WorkerThread(QThread):
     """Worker thread for image processing"""
@@ -86,6 +88,7 @@ class ModelConverter(QWidget):
         self.image_processor = image_processor
         self.llm_handler = llm_handler
         self.image_path = None
+        self.output_type = "sql"
         self.setup_ui()
 
     def setup_ui(self):
@@ -112,7 +115,8 @@ class ModelConverter(QWidget):
         layout.addWidget(title)
 
         desc = QLabel(
-            "Upload a screenshot of your QGIS Model Builder and convert it to executable code."
+            "Upload a screenshot of your QGIS Model Builder (or the .model3 file itself) "
+            "and convert it to executable code."
         )
         desc.setStyleSheet("color: #abb2bf;")
         desc.setWordWrap(True)
@@ -176,6 +180,11 @@ class ModelConverter(QWidget):
         self.convert_btn.clicked.connect(self.convert_model_image)
         layout.addWidget(self.convert_btn)
 
+        clear_cache_btn = QPushButton("🧹 Clear Extraction Cache")
+        clear_cache_btn.setToolTip("Forget workflows extracted from images so they are analysed again")
+        clear_cache_btn.clicked.connect(self.clear_extraction_cache)
+        layout.addWidget(clear_cache_btn)
+
         # Output section with tabs and flexible layout
         output_group = QGroupBox("📊 Generated Output")
         output_group.setStyleSheet("""
@@ -346,9 +355,11 @@ class ModelConverter(QWidget):
         """Browse for image"""
         file_path, _ = QFileDialog.getOpenFileName(
             self,
-            "Select Model Builder Image",
+            "Select Model Builder Image or Model",
             "",
-            "Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff)",
+            "Images and Models (*.png *.jpg *.jpeg *.bmp *.tif *.tiff *.model3);;"
+            "Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff);;"
+            "QGIS Models (*.model3)",
         )
 
         if file_path:
@@ -358,6 +369,19 @@ class ModelConverter(QWidget):
 
     def display_image_preview(self, file_path):
         """Display image preview"""
+        if is_model_file(file_path):
+            # Model files are parsed, not rendered - show a short summary instead
+            try:
+                graph = parse_model3_file(file_path)
+                self.image_preview_label.setText(
+                    f"QGIS model: {graph.name}\n"
+                    f"{len(graph.inputs)} inputs · {len(graph.steps)} steps · "
+                    f"{len(graph.outputs)} outputs"
+                )
+            except Exception as e:
+                self.image_preview_label.setText(f"Failed to read model: {str(e)}")
+            return
+
         pixmap = QPixmap(file_path)
         if not pixmap.isNull():
             # Scale to fit
@@ -374,6 +398,12 @@ class ModelConverter(QWidget):
             QMessageBox.warning(self, "Warning", "No image selected")
             return
 
+        if is_model_file(self.image_path):
+            QMessageBox.information(
+                self, "Info", "A .model3 file is not an image and cannot be added to the map"
+            )
+            return
+
         try:
             layer = QgsRasterLayer(self.image_path, "Model Builder Image")
             if layer.isValid():
@@ -397,9 +427,9 @@ class ModelConverter(QWidget):
             QMessageBox.critical(self, "Error", "Image processor not initialized")
             return
 
+        # "both" is generated from a single extraction (one vision call at most)
         output_type = self.conversion_type.currentText().lower()
-        if output_type == "both":
-            output_type = "sql"  # Default, can be enhanced
+        self.output_type = output_type
 
         provider = self.main_window.model_selector.get_provider()
         
@@ -531,6 +561,20 @@ class ModelConverter(QWidget):
                     output_parts.append("# 💻 Generated Code:")
                     output_parts.append("")
 
+            elif method == "model3":
+                output_parts.append("# ✅ Analysis Method: .model3 File Parsing")
+                output_parts.append(
+                    "# Workflow read directly from the model file - no image analysis needed"
+                )
+                output_parts.append("")
+
+            elif method == "local_ocr":
+                output_parts.append("# ✅ Analysis Method: Local OCR + LLM")
+                output_parts.append(
+                    "# Diagram read on this machine (Tesseract/OpenCV), then LLM generated code"
+                )
+                output_parts.append("")
+
             elif method == "llm_direct":
                 output_parts.append("# ⚠️ Analysis Method: LLM Direct Processing")
                 output_parts.append(
@@ -642,6 +686,7 @@ class ModelConverter(QWidget):
             self.output_tabs.setTabText(3, f"📋 All Output ({len(final_output)} chars)")
             
             # Switch to appropriate tab based on output type
+            output_type = getattr(self, "output_type", "sql")
             if output_type == "sql" and sql_code:
                 self.output_tabs.setCurrentIndex(0)
                 self.sql_output.moveCursor(self.sql_output.textCursor().Start)  # Scroll to top
@@ -827,6 +872,16 @@ class ModelConverter(QWidget):
             self.output_tabs.setTabText(2, "🔍 Analysis")
             self.output_tabs.setTabText(3, "📋 All Output")
     
+    def clear_extraction_cache(self):
+        """Drop cached workflow extractions"""
+        if not self.image_processor:
+            return
+        removed = self.image_processor.clear_workflow_cache()
+        QgsMessageLog.logMessage(
+            f"Cleared {removed} cached workflow extraction(s)", "GeoAI Pro", Qgis.Info
+        )
+        QMessageBox.information(self, "Cache Cleared", f"Removed {removed} cached extraction(s)")
+
     def update_font_size(self, size):
         """Update font size for all output widgets"""
         font = QFont("Courier New", size)
@@ -5,58 +5,12 @@ Model Selector Component - Enhanced with provider status and health
 from qgis.PyQt.QtWidgets import (
     QWidget, QHBoxLayout, QLabel, QComboBox, QPushButton
 )
-from qgis.PyQt.QtCore import pyqtSignal, QThread, QTimer
+from qgis.PyQt.QtCore import pyqtSignal, QTimer
 from qgis.PyQt.QtGui import QColor
 from qgis.core import QgsMessageLog, Qgis
 import os
 
-
-class ModelTester(QThread):
-    """Thread to test model availability with timeout"""
-    model_tested = pyqtSignal(str, bool, str)  # model_name, is_working, error_message
-    
-    def __init__(self, llm_handler, provider, model, timeout=10):
-        super().__init__()
-        self.llm_handler = llm_handler
-        self.provider = provider
-        self.model = model
-        self.timeout = timeout
-    
-    def run(self):
-        """Test if model works with timeout"""
-        try:
-            # Simple test prompt
-            test_prompt = "OK"
-            
-            # For Google, check API key first
-            if self.provider == "google":
-                api_key = os.getenv("GOOGLE_API_KEY")
-                if not api_key:
-                    self.model_tested.emit(self.model, False, "API key not found")
-                    return
-                # Use minimal prompt for Google
-                test_prompt = "OK"
-            
-            result = self.llm_handler._query_with_provider(
-                test_prompt,
-                system_prompt=None,
-                model_provider=self.provider,
-                model_name=self.model
-            )
-            
-            if result and len(result) > 0:
-                self.model_tested.emit(self.model, True, "")
-            else:
-                self.model_tested.emit(self.model, False, "Empty response")
-        except Exception as e:
-            error_msg = str(e)
-            # Don't fail on quota errors - model works but quota exceeded
-            if "quota" in error_msg.lower() or "429" in error_msg:
-                self.model_tested.emit(self.model, True, "Quota exceeded (model works)")
-            elif "timeout" in error_msg.lower():
-                self.model_tested.emit(self.model, False, "Test timeout")
-            else:
-                self.model_tested.emit(self.model, False, error_msg)
+from ...services.health_check_service import HealthCheckService
 
 
 class ModelSelector(QWidget):
@@ -64,14 +18,35 @@ class ModelSelector(QWidget):
     
     provider_changed = pyqtSignal(str)
     model_changed = pyqtSignal(str)
+    # Health results arrive from worker threads; signals marshal them to the UI thread
+    model_checked = pyqtSignal(object)
+    single_model_checked = pyqtSignal(object)
+    single_check_finished = pyqtSignal()
     
     def __init__(self, config, llm_handler=None):
         super().__init__()
         self.config = config
         self.llm_handler = llm_handler
         self.model_status = {}  # Track which models work: {model_name: (is_working, error)}
-        self.testers = []  # Keep track of test threads
+        self.health_service = HealthCheckService(config)
+        self.model_checked.connect(self.on_model_tested)
+        self.single_model_checked.connect(self.on_single_test_complete)
+        self.single_check_finished.connect(self.on_single_test_finished)
         self.setup_ui()
+        
+        # Background refresh - served from cache until the TTL expires
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.test_all_models)
+        self.refresh_timer.start(int(self.health_service.ttl * 1000))
+        QTimer.singleShot(0, self.test_all_models)
+        
+        # Pre-load the selected local model; debounced while the combo is repopulated
+        self.warm_up_timer = QTimer(self)
+        self.warm_up_timer.setSingleShot(True)
+        self.warm_up_timer.setInterval(500)
+        self.warm_up_timer.timeout.connect(self.warm_up_model)
+        self.model_changed.connect(lambda _: self.warm_up_timer.start())
+        self.warm_up_timer.start()
     
     def set_llm_handler(self, llm_handler):
         """Set LLM handler for testing"""
@@ -134,28 +109,8 @@ class ModelSelector(QWidget):
         # Check provider health (synchronous, fast - just checks env vars)
         self.check_provider_health()
         
-        # For Google, skip all testing and mark as ready immediately
-        if provider_lower == "google":
-            # Immediately mark all models as available
-            for i in range(self.model_combo.count()):
-                model = self.model_combo.itemText(i)
-                key = f"{provider_lower}:{model}"
-                self.model_status[key] = (True, "Available (not tested)")
-            
-            # Update UI immediately
-            self.apply_model_status()
-            
-            QgsMessageLog.logMessage(
-                "Google provider selected - models available (use Test button to verify)",
-                "GeoAI Pro",
-                Qgis.Info
-            )
-            return  # Exit early, no testing
-        
-        # For other providers, test models (async, non-blocking)
-        if self.llm_handler:
-            # Use QTimer.singleShot to test models after UI updates
-            QTimer.singleShot(500, self.test_all_models)  # Test after 500ms
+        # Check models against the provider's model listing (async, non-blocking)
+        QTimer.singleShot(0, self.test_all_models)
     
     def update_models(self):
         """Update available models"""
@@ -224,90 +179,43 @@ class ModelSelector(QWidget):
             else:
                 # Not tested yet, enable by default
                 item.setEnabled(True)
-                item.setToolTip("🔄 Testing...")
+                item.setToolTip("🔄 Checking...")
                 item.setForeground(QColor())  # Default color
     
     def test_all_models(self):
-        """Test all models for current provider"""
-        if not self.llm_handler:
-            return
-        
+        """Check all models for current provider (one cheap listing request)"""
         provider = self.provider_combo.currentText().lower()
+        models = [self.model_combo.itemText(i) for i in range(self.model_combo.count())]
         
-        # Skip automatic testing for Google (can be slow/hang)
-        # User can manually test if needed
-        if provider == "google":
-            QgsMessageLog.logMessage(
-                "Skipping automatic model testing for Google (use Test button to verify)",
-                "GeoAI Pro",
-                Qgis.Info
-            )
-            # Mark all models as available by default for Google
-            for i in range(self.model_combo.count()):
-                model = self.model_combo.itemText(i)
-                key = f"{provider}:{model}"
-                self.model_status[key] = (True, "Not tested (use Test button)")
-            self.apply_model_status()
-            return
-        
-        # Cancel any existing testers
-        for tester in self.testers:
-            if tester.isRunning():
-                tester.terminate()
-                tester.wait(1000)  # Wait up to 1 second
-        self.testers.clear()
-        
-        # Test each model with shorter timeout for cloud providers
-        timeout = 15 if provider in ["openai", "anthropic", "openrouter"] else 10
-        
-        # Test each model
-        for i in range(self.model_combo.count()):
-            model = self.model_combo.itemText(i)
-            
-            # Create tester thread with timeout
-            tester = ModelTester(self.llm_handler, provider, model, timeout=timeout)
-            tester.model_tested.connect(self.on_model_tested)
-            tester.finished.connect(tester.deleteLater)
-            self.testers.append(tester)
-            tester.start()
-            
-            # Update UI to show testing
-            item = self.model_combo.model().item(i)
-            if item:
-                item.setToolTip("🔄 Testing...")
+        # Show cached results right away, stale ones are refreshed below
+        for model in models:
+            cached = self.health_service.get_cached(provider, model)
+            if cached:
+                self.model_status[f"{provider}:{model}"] = (cached.available, cached.message)
+        self.apply_model_status()
         
-        # Set a timeout to mark as failed if still testing after timeout
-        QTimer.singleShot((timeout + 5) * 1000, self.mark_timeout_models)
-    
-    def mark_timeout_models(self):
-        """Mark models that are still testing as timeout"""
-        provider = self.provider_combo.currentText().lower()
-        for i in range(self.model_combo.count()):
-            model = self.model_combo.itemText(i)
-            key = f"{provider}:{model}"
-            if key not in self.model_status:
-                # Still testing, mark as timeout
-                self.model_status[key] = (False, "Test timeout")
-                self.apply_model_status()
+        # Cancels any refresh still running for this provider
+        self.health_service.refresh_async(provider, models, self.model_checked.emit)
     
-    def on_model_tested(self, model_name, is_working, error_message):
-        """Handle model test result"""
-        provider = self.provider_combo.currentText().lower()
-        key = f"{provider}:{model_name}"
-        
-        # Store status
-        self.model_status[key] = (is_working, error_message)
+    def on_model_tested(self, status):
+        """Handle model health result"""
+        # Ignore late results for a provider that is no longer selected
+        if status.provider != self.provider_combo.currentText().lower():
+            return
         
-        # Update UI
+        key = f"{status.provider}:{status.model}"
+        previous = self.model_status.get(key)
+        self.model_status[key] = (status.available, status.message)
         self.apply_model_status()
         
-        # Log result
-        status = "✅" if is_working else "❌"
-        QgsMessageLog.logMessage(
-            f"{status} Model {model_name} ({provider}): {'Working' if is_working else error_message}",
-            "GeoAI Pro",
-            Qgis.Info if is_working else Qgis.Warning
-        )
+        # Log only changes - background refreshes would otherwise spam the log
+        if previous != self.model_status[key]:
+            result = "Available" if status.available else status.message
+            QgsMessageLog.logMessage(
+                f"{'✅' if status.available else '❌'} Model {status.model} ({status.provider}): {result}",
+                "GeoAI Pro",
+                Qgis.Info if status.available else Qgis.Warning
+            )
     
     def check_provider_health(self):
         """Check provider health status"""
@@ -359,18 +267,10 @@ class ModelSelector(QWidget):
                 self.status_indicator.setToolTip("HuggingFace API key not found")
     
     def test_connection(self):
-        """Test connection to provider and selected model"""
-        provider = self.provider_combo.currentText()
+        """Re-check provider and selected model, bypassing the cache"""
+        provider = self.provider_combo.currentText().lower()
         model = self.model_combo.currentText()
         
-        if not self.llm_handler:
-            QgsMessageLog.logMessage(
-                "LLM handler not available for testing", 
-                "GeoAI Pro", 
-                Qgis.Warning
-            )
-            return
-        
         QgsMessageLog.logMessage(
             f"Testing connection to {provider}/{model}", 
             "GeoAI Pro", 
@@ -379,32 +279,51 @@ class ModelSelector(QWidget):
         
         self.status_indicator.setText("🟡")
         self.test_btn.setEnabled(False)
-        
-        # Test the selected model
-        tester = ModelTester(self.llm_handler, provider.lower(), model)
-        tester.model_tested.connect(self.on_single_test_complete)
-        tester.finished.connect(tester.deleteLater)
-        tester.start()
+        self.health_service.refresh_async(
+            provider, [model], self.single_model_checked.emit, force=True,
+            group="single", on_done=self.single_check_finished.emit
+        )
     
-    def on_single_test_complete(self, model_name, is_working, error_message):
+    def on_single_test_complete(self, status):
         """Handle single model test completion"""
         self.test_btn.setEnabled(True)
+        self.model_status[f"{status.provider}:{status.model}"] = (status.available, status.message)
+        self.apply_model_status()
         
-        if is_working:
+        if status.available:
             self.status_indicator.setText("🟢")
             QgsMessageLog.logMessage(
-                f"✅ {model_name} is working", 
+                f"✅ {status.model} is available ({status.latency_ms:.0f} ms)", 
                 "GeoAI Pro", 
                 Qgis.Success
             )
         else:
             self.status_indicator.setText("🔴")
             QgsMessageLog.logMessage(
-                f"❌ {model_name} failed: {error_message}", 
+                f"❌ {status.model} failed: {status.message}", 
                 "GeoAI Pro", 
                 Qgis.Warning
             )
     
+    def on_single_test_finished(self):
+        """Re-enable the Test button, also when the check was cancelled"""
+        self.test_btn.setEnabled(True)
+        if self.status_indicator.text() == "🟡":
+            self.check_provider_health()
+    
+    def warm_up_model(self):
+        """Load the selected model in the background (Ollama only)"""
+        model = self.model_combo.currentText()
+        if self.llm_handler is None or not model:
+            return
+        self.llm_handler.warm_up(self.get_provider(), model)
+    
+    def shutdown(self):
+        """Stop background health checks"""
+        self.refresh_timer.stop()
+        self.warm_up_timer.stop()
+        self.health_service.shutdown()
+    
     def get_provider(self) -> str:
         """Get selected provider"""
         return self.provider_combo.currentText().lower()
@@ -20,6 +20,9 @@ from qgis.PyQt.QtWidgets import (
 from qgis.PyQt.QtCore import Qt, QThread, pyqtSignal
 from qgis.core import QgsMessageLog, Qgis
 
+from ...core.sql import strip_comments
+from ...infrastructure.tracing import span
+
 
 class QueryEditor(QWidget):
     """Enhanced query editor with modern features"""
@@ -167,6 +170,12 @@ class QueryEditor(QWidget):
         self.execute_btn.setEnabled(True)  # Always enabled for direct SQL mode
         button_layout.addWidget(self.execute_btn)
 
+        self.cancel_btn = QPushButton("⏹️ Cancel")
+        self.cancel_btn.setObjectName("danger")
+        self.cancel_btn.clicked.connect(self.cancel_execution)
+        self.cancel_btn.setEnabled(False)
+        button_layout.addWidget(self.cancel_btn)
+
         self.auto_fix_btn = QPushButton("🔧 Auto-Fix")
         self.auto_fix_btn.setObjectName("warning")
         self.auto_fix_btn.clicked.connect(self.auto_fix)
@@ -287,11 +296,12 @@ class QueryEditor(QWidget):
             f"Generating SQL with {provider}/{model}", "GeoAI Pro", Qgis.Info
         )
 
-        # Get context
-        context = self.sql_executor.get_context()
+        with span("ui.generate_sql", category="ui", provider=provider, model=model):
+            # Get context
+            context = self.sql_executor.get_context()
 
-        # Generate SQL
-        result = self.llm_handler.generate_sql(prompt, context, provider, model)
+            # Generate SQL
+            result = self.llm_handler.generate_sql(prompt, context, provider, model)
 
         if "error" in result:
             QMessageBox.critical(self, "Error", result["error"])
@@ -315,12 +325,15 @@ class QueryEditor(QWidget):
         sql = re.sub(r'"""[\s\S]*?"""', "", sql)
         sql = re.sub(r"'''[\s\S]*?'''", "", sql)
 
-        # Remove lines that are just comments or headers
+        # Drop SQL comments (the tokenizer leaves "--" inside string literals alone)
+        sql = strip_comments(sql)
+
+        # Remove lines that are just headers or other non-SQL content
         lines = sql.split("\n")
         cleaned_lines = []
         for line in lines:
             line = line.strip()
-            # Skip empty lines, comment-only lines, and markdown headers
+            # Skip empty lines and markdown headers
             if not line:
                 continue
             if line.startswith("#") and (
@@ -330,7 +343,7 @@ class QueryEditor(QWidget):
                 or "Generated Code" in line
             ):
                 continue
-            if line.startswith("//") or line.startswith("--") and len(line) < 5:
+            if line.startswith("//"):
                 continue
             # Keep the line
             cleaned_lines.append(line)
@@ -389,10 +402,12 @@ class QueryEditor(QWidget):
                 super().__init__()
                 self.sql_executor = sql_executor
                 self.sql = sql
+                self.trace = None
 
             def run(self):
                 try:
-                    result = self.sql_executor.execute_sql(self.sql)
+                    with span("ui.execute", category="ui") as self.trace:
+                        result = self.sql_executor.execute_sql(self.sql)
                     self.finished.emit(result)
                 except Exception as e:
                     self.error.emit(str(e))
@@ -403,13 +418,29 @@ class QueryEditor(QWidget):
         self.execute_worker.start()
 
         self.execute_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
         self.status_label.setText("Executing SQL...")
 
+    def cancel_execution(self):
+        """Cancel the running query"""
+        if self.sql_executor and self.sql_executor.cancel():
+            self.cancel_btn.setEnabled(False)
+            self.status_label.setText("Cancelling...")
+            self.status_label.setStyleSheet(
+                "color: #e5c07b; font-size: 12px; padding: 8px;"
+            )
+
     def on_sql_executed(self, result):
         """Handle SQL execution result"""
         self.execute_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
 
-        if "error" in result:
+        if result.get("cancelled"):
+            self.status_label.setText("Query cancelled")
+            self.status_label.setStyleSheet(
+                "color: #e5c07b; font-size: 12px; padding: 8px;"
+            )
+        elif "error" in result:
             QMessageBox.critical(self, "Error", result["error"])
             self.status_label.setText(f"Error: {result['error']}")
             self.status_label.setStyleSheet(
@@ -417,12 +448,27 @@ class QueryEditor(QWidget):
             )
         else:
             rows = result.get("rows", [])
-            self.display_results(rows)
+            # Rendering happens on the GUI thread - link it to the worker's span
+            with span("display_results", category="ui", parent=self.execute_worker.trace,
+                      rows=len(rows) if rows else 0):
+                self.display_results(rows)
             row_count = len(rows) if rows else 0
-            self.status_label.setText(f"Query executed: {row_count} rows")
-            self.status_label.setStyleSheet(
-                "color: #98c379; font-size: 12px; padding: 8px;"
-            )
+            cached = " (cached)" if result.get("cached") else ""
+            if result.get("warning"):
+                # Planner estimate crossed the cost gate - show why, plan on hover
+                self.status_label.setText(
+                    f"Query executed: {row_count} rows{cached} ⚠️ {result['warning']}"
+                )
+                self.status_label.setToolTip(result.get("plan", ""))
+                self.status_label.setStyleSheet(
+                    "color: #e5c07b; font-size: 12px; padding: 8px;"
+                )
+            else:
+                self.status_label.setText(f"Query executed: {row_count} rows{cached}")
+                self.status_label.setToolTip("")
+                self.status_label.setStyleSheet(
+                    "color: #98c379; font-size: 12px; padding: 8px;"
+                )
             QgsMessageLog.logMessage(
                 f"SQL executed: {row_count} rows", "GeoAI Pro", Qgis.Info
             )
@@ -430,6 +476,7 @@ class QueryEditor(QWidget):
     def on_execute_error(self, error_msg):
         """Handle execution error"""
         self.execute_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
         QMessageBox.critical(self, "Error", error_msg)
         self.status_label.setText(f"Error: {error_msg}")
         self.status_label.setStyleSheet(
@@ -502,13 +549,14 @@ class QueryEditor(QWidget):
 
             def run(self):
                 try:
-                    result = self.error_fixer.fix_sql_error(
-                        self.sql,
-                        self.error_msg,
-                        self.context,
-                        self.provider,
-                        self.model,
-                    )
+                    with span("ui.fix_sql", category="ui"):
+                        result = self.error_fixer.fix_sql_error(
+                            self.sql,
+                            self.error_msg,
+                            self.context,
+                            self.provider,
+                            self.model,
+                        )
                     self.finished.emit(result)
                 except Exception as e:
                     self.error.emit(str(e))
@@ -114,6 +114,13 @@ class ThemeManager:
             color: white;
         }
         
+        QPushButton#danger {
+            background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+                stop:0 #e06c75, stop:1 #c75a63);
+            border: none;
+            color: white;
+        }
+        
         QTableWidget {
             background-color: #1e2227;
             border: 2px solid #3e4451;